@@ -0,0 +1,80 @@
+"""
+Gunicorn configuration.
+
+Gunicorn loads this file from the working directory. Everything can be
+tuned from the environment:
+
+- SERVER_MODE: ``wsgi`` (the default) serves neverforgotten.wsgi with
+  threaded workers, so a request waiting on Cloudinary or Stripe only
+  ties up one thread. ``asgi`` serves neverforgotten.asgi with uvicorn
+  workers; sync views then each cost a thread handoff, so it pays off
+  for the async views (uploads, checkout, contact), which wait on
+  Cloudinary, Stripe or SMTP without holding a thread.
+- WEB_CONCURRENCY: worker processes. Defaults to 2 x CPU cores + 1; set
+  it explicitly on hosts where the CPU count is not the dyno's own.
+- GUNICORN_THREADS: threads per WSGI worker (default 4). With persistent
+  database connections (CONN_MAX_AGE) each thread keeps one open, so the
+  dyno needs up to WEB_CONCURRENCY x GUNICORN_THREADS of them.
+- GUNICORN_WORKER_CLASS: overrides the worker class picked by SERVER_MODE.
+- GUNICORN_PRELOAD: load the app before forking (default on) so workers
+  share its memory copy-on-write.
+- GUNICORN_MAX_REQUESTS / GUNICORN_MAX_REQUESTS_JITTER: recycle workers
+  after this many requests, staggered so they do not restart together.
+- GUNICORN_TIMEOUT: seconds before a silent worker is restarted.
+
+``manage.py load_test_server`` compares the modes.
+"""
+
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi').lower()
+if SERVER_MODE not in ('wsgi', 'asgi'):
+    raise ValueError(
+        f"SERVER_MODE must be 'wsgi' or 'asgi', not {SERVER_MODE!r}"
+    )
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'neverforgotten.asgi:application'
+    # Deprecated upstream in favour of the separate uvicorn-worker package
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'neverforgotten.wsgi:application'
+    worker_class = 'gthread'
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', worker_class)
+
+workers = _env_int('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)
+threads = _env_int('GUNICORN_THREADS', 4)
+
+preload_app = _env_bool('GUNICORN_PRELOAD', True)
+
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+
+def post_fork(server, worker):
+    # Database connections must not be shared with the master process;
+    # make sure any opened while preloading are dropped in each worker
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+    connections.close_all()
@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.contrib.admin import SimpleListFilter
 from django.utils.html import format_html
-from .models import Memorial, Tribute, GalleryImage, ContactMessage, Story
+from .models import (
+    Memorial, Tribute, GalleryImage, ContactMessage, Story, MediaUploadJob,
+    MediaCleanupJob
+)
 
 
 # --- Admin Registrations ---
@@ -238,3 +241,29 @@ class ContactMessageAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
     list_editable = ('is_read',)
     date_hierarchy = 'created_at'
+
+
+@admin.register(MediaUploadJob)
+class MediaUploadJobAdmin(admin.ModelAdmin):
+    """Admin interface for monitoring queued media uploads."""
+    list_display = (
+        'memorial', 'kind', 'status', 'attempts', 'original_name',
+        'created_at', 'updated_at'
+    )
+    list_filter = ('status', 'kind')
+    search_fields = ('original_name', 'memorial__first_name',
+                     'memorial__last_name')
+    readonly_fields = ('created_at', 'updated_at', 'result', 'error')
+    list_select_related = ('memorial',)
+
+
+@admin.register(MediaCleanupJob)
+class MediaCleanupJobAdmin(admin.ModelAdmin):
+    """Admin interface for monitoring media cleanup of deleted memorials."""
+    list_display = (
+        'memorial_id', 'prefix', 'status', 'attempts', 'deleted_count',
+        'next_attempt_at', 'updated_at'
+    )
+    list_filter = ('status',)
+    search_fields = ('prefix',)
+    readonly_fields = ('created_at', 'updated_at', 'deleted_count', 'error')
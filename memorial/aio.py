@@ -0,0 +1,79 @@
+"""
+Helpers for async views.
+
+Async views keep the event loop free while they wait on Cloudinary,
+Stripe or the mail server. Database access goes through Django's async
+ORM (or ``sync_to_async`` where Django has no async API yet), and
+blocking SDK calls go through ``offload``, which runs them in a thread.
+Each service has its own limit on calls in flight (ASYNC_IO_LIMITS), so
+a burst of slow uploads cannot take every thread and hold up checkouts.
+
+Limits apply per event loop, which under the ASGI profile is one per
+worker process. Under WSGI each request gets its own loop and the
+gunicorn thread count bounds concurrency instead.
+"""
+
+import asyncio
+import functools
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404
+from django.shortcuts import render
+
+# Semaphores per event loop, as {loop: {service: Semaphore}}
+_semaphores = weakref.WeakKeyDictionary()
+
+# Limit for services missing from ASYNC_IO_LIMITS
+DEFAULT_LIMIT = 8
+
+
+def _semaphore(service):
+    loop = asyncio.get_running_loop()
+    semaphores = _semaphores.setdefault(loop, {})
+    if service not in semaphores:
+        limit = settings.ASYNC_IO_LIMITS.get(service, DEFAULT_LIMIT)
+        semaphores[service] = asyncio.Semaphore(limit)
+    return semaphores[service]
+
+
+async def offload(service, func, *args, **kwargs):
+    """
+    Run a blocking call in a thread, bounded by the service's limit.
+
+    ``func`` must not touch the database: it runs outside the request's
+    thread, where connections are never cleaned up.
+    """
+    async with _semaphore(service):
+        return await sync_to_async(func, thread_sensitive=False)(
+            *args, **kwargs
+        )
+
+
+async def aget_object_or_404(model, **kwargs):
+    """Async counterpart of ``get_object_or_404`` for a model."""
+    try:
+        return await model.objects.aget(**kwargs)
+    except model.DoesNotExist:
+        raise Http404(f"No {model._meta.object_name} matches the query.")
+
+
+async def arender(request, template_name, context=None):
+    """Render a template off the event loop; templates may query."""
+    return await sync_to_async(render)(request, template_name, context)
+
+
+def login_required(view):
+    """``login_required`` for async views."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # The lazy user loads the session and user from the database
+        is_authenticated = await sync_to_async(
+            lambda: request.user.is_authenticated
+        )()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,78 @@
+"""
+Cache helpers for NeverForgotten.
+
+Values are stored under a namespace (for example ``memorial:42`` or
+``browse``) and a per-namespace version number. Invalidating a namespace
+bumps its version, which makes every key written under the old version stale
+at once without having to know which keys exist; stale entries simply age
+out of the backend configured in ``settings.CACHES``.
+
+A version key can itself be evicted while keys written under it are still
+alive, so a missing version is reseeded from the clock rather than
+restarting at 1, which could serve those stale keys again.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+FRAGMENT_TIMEOUT = getattr(settings, 'MEMORIAL_FRAGMENT_CACHE_TIMEOUT', 3600)
+
+
+def _version_key(namespace):
+    return f"{namespace}:version"
+
+
+def _new_version():
+    # Never repeats a version handed out before the key was evicted
+    return time.time_ns()
+
+
+def get_version(namespace):
+    """Return the current version number of a namespace."""
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        version = _new_version()
+        cache.add(_version_key(namespace), version, None)
+        version = cache.get(_version_key(namespace), version)
+    return version
+
+
+def invalidate(namespace):
+    """Invalidate every key stored under a namespace."""
+    try:
+        cache.incr(_version_key(namespace))
+    except ValueError:
+        cache.set(_version_key(namespace), _new_version(), None)
+
+
+def make_key(namespace, key):
+    """Build the versioned cache key for ``key`` within a namespace."""
+    return f"{namespace}:v{get_version(namespace)}:{key}"
+
+
+def cache_get(namespace, key, default=None):
+    """Fetch a value from a namespace."""
+    return cache.get(make_key(namespace, key), default)
+
+
+def cache_set(namespace, key, value, timeout=DEFAULT_TIMEOUT):
+    """
+    Store a value in a namespace.
+
+    ``timeout`` follows Django: omitted means the backend's default and
+    ``None`` means the value never expires.
+    """
+    cache.set(make_key(namespace, key), value, timeout)
+
+
+def memorial_namespace(memorial_id):
+    """Namespace holding everything cached for one memorial."""
+    return f"memorial:{memorial_id}"
+
+
+def invalidate_memorial(memorial_id):
+    """Invalidate every cached fragment for a memorial."""
+    invalidate(memorial_namespace(memorial_id))
@@ -0,0 +1,130 @@
+"""
+Server-side image pre-processing for memorial uploads.
+
+Phone photos arrive as multi-megabyte JPEGs with EXIF orientation and GPS
+metadata. Before they are sent to Cloudinary they are auto-oriented,
+stripped of metadata, downscaled to ``IMAGE_MAX_EDGE`` and re-encoded as
+``IMAGE_FORMAT``. Output is written to a ``SpooledTemporaryFile`` so large
+results spill to disk instead of sitting in worker memory.
+"""
+
+import logging
+import os
+import time
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+class InvalidImage(ValueError):
+    """Raised for images that are truncated, corrupt or too large."""
+
+
+def _file_size(file):
+    size = getattr(file, 'size', None)
+    if size is None:
+        position = file.tell()
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(position)
+    return size
+
+
+def _passthrough(file, original_bytes):
+    file.seek(0)
+    return file, {
+        'original_bytes': original_bytes,
+        'processed_bytes': original_bytes,
+        'bytes_saved': 0,
+        'processing_ms': 0,
+    }
+
+
+def prepare_image(file, max_edge=None, image_format=None, quality=None):
+    """
+    Normalise an uploaded image for upload.
+
+    Animated images, and formats Pillow cannot decode (such as HEIC),
+    are passed through untouched for Cloudinary to handle.
+
+    Args:
+        file: Uploaded image (any readable, seekable file)
+        max_edge: Longest allowed side in pixels (IMAGE_MAX_EDGE)
+        image_format: 'WEBP' or 'JPEG' (IMAGE_FORMAT)
+        quality: Encoder quality, 1-100 (IMAGE_QUALITY)
+
+    Returns:
+        tuple: (File ready to upload, dict of processing stats)
+
+    Raises:
+        InvalidImage: If the image is truncated or a decompression bomb
+    """
+    max_edge = max_edge or settings.IMAGE_MAX_EDGE
+    image_format = (image_format or settings.IMAGE_FORMAT).upper()
+    quality = quality or settings.IMAGE_QUALITY
+    started = time.perf_counter()
+    original_bytes = _file_size(file)
+    file.seek(0)
+
+    try:
+        image = Image.open(file)
+        if getattr(image, 'is_animated', False):
+            return _passthrough(file, original_bytes)
+        # Let the JPEG decoder skip detail we are about to throw away
+        image.draft('RGB', (max_edge, max_edge))
+        image.load()
+    except UnidentifiedImageError:
+        return _passthrough(file, original_bytes)
+    except (Image.DecompressionBombError, OSError) as e:
+        raise InvalidImage(f"Invalid image: {e}") from e
+
+    icc_profile = image.info.get('icc_profile')
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    if image_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        # Palette and greyscale images may carry a transparency key
+        # instead of an alpha band
+        transparent = (
+            'A' in image.getbands() or 'transparency' in image.info
+        )
+        mode = 'RGBA' if image_format == 'WEBP' and transparent else 'RGB'
+        if image.mode not in ('RGB', 'RGBA', 'P', 'PA'):
+            # A CMYK or greyscale profile does not describe RGB output
+            icc_profile = None
+        image = image.convert(mode)
+
+    # Only the colour profile is carried over; EXIF and XMP are dropped
+    options = {'quality': quality, 'icc_profile': icc_profile}
+    if image_format == 'WEBP':
+        options['method'] = 4
+    else:
+        options.update(optimize=True, progressive=True)
+
+    output = SpooledTemporaryFile(max_size=settings.IMAGE_SPOOL_MAX_SIZE)
+    image.save(output, format=image_format, **options)
+    processed_bytes = output.tell()
+    output.seek(0)
+
+    base_name = os.path.splitext(os.path.basename(file.name or 'image'))[0]
+    stats = {
+        'original_bytes': original_bytes,
+        'processed_bytes': processed_bytes,
+        'bytes_saved': original_bytes - processed_bytes,
+        'processing_ms': round((time.perf_counter() - started) * 1000),
+        'width': image.width,
+        'height': image.height,
+        'format': image_format,
+    }
+    logger.info(
+        f"Pre-processed {base_name}: {original_bytes} -> "
+        f"{processed_bytes} bytes in {stats['processing_ms']}ms"
+    )
+    name = f"{base_name}.{EXTENSIONS[image_format]}"
+    return File(output, name=name), stats
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from memorial import phonetics
+from memorial.models import Memorial
+
+
+class Command(BaseCommand):
+    """Compute fuzzy search keys for memorials saved before they existed."""
+
+    help = "Backfill folded and phonetic name keys in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Number of memorials updated per query.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        memorials = Memorial.objects.only(
+            'pk', *phonetics.FOLDED_FIELDS
+        ).order_by('pk')
+        last_pk = 0
+        total = 0
+
+        while True:
+            batch = list(memorials.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            for memorial in batch:
+                memorial.refresh_name_keys()
+            # bulk_update skips save() and its signals on purpose
+            Memorial.objects.bulk_update(batch, phonetics.KEY_FIELDS)
+            last_pk = batch[-1].pk
+            total += len(batch)
+            self.stdout.write(f"Updated {total} memorials...")
+
+        self.stdout.write(self.style.SUCCESS(f"Updated {total} memorials."))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+
+from memorial import media
+from memorial.cache import invalidate_memorial
+from memorial.models import Memorial
+
+# Cloudinary returns at most 100 resources per lookup
+MAX_BATCH_SIZE = 100
+
+
+class Command(BaseCommand):
+    """Store Cloudinary versions for profile pictures uploaded before them."""
+
+    help = "Backfill profile picture versions from Cloudinary in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=MAX_BATCH_SIZE,
+            help="Number of memorials looked up per Cloudinary request.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = min(options['batch_size'], MAX_BATCH_SIZE)
+        memorials = Memorial.objects.filter(
+            profile_version__isnull=True, profile_public_id__isnull=False
+        ).exclude(profile_public_id='').only(
+            'pk', 'profile_public_id'
+        ).order_by('pk')
+        last_pk = 0
+        total = 0
+
+        while True:
+            batch = list(memorials.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            resources = media.lookup(
+                [memorial.profile_public_id for memorial in batch]
+            )
+            versions = {
+                resource['public_id']: resource['version']
+                for resource in resources
+            }
+            found = [
+                memorial for memorial in batch
+                if memorial.profile_public_id in versions
+            ]
+            for memorial in found:
+                memorial.profile_version = versions[memorial.profile_public_id]
+            # bulk_update skips save() and its signals, so clear the cached
+            # pages that still link the unversioned URL
+            Memorial.objects.bulk_update(found, ['profile_version'])
+            for memorial in found:
+                invalidate_memorial(memorial.pk)
+            last_pk = batch[-1].pk
+            total += len(found)
+            self.stdout.write(f"Updated {total} memorials...")
+
+        self.stdout.write(self.style.SUCCESS(f"Updated {total} memorials."))
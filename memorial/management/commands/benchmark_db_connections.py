@@ -0,0 +1,101 @@
+import statistics
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+
+class Command(BaseCommand):
+    """Compare request latency with and without database connection reuse."""
+
+    help = (
+        "Send requests through the full WSGI handler with CONN_MAX_AGE=0 "
+        "and with persistent connections, and report latency for each. "
+        "Run it against the Postgres deployment to be tuned."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default='/plans/',
+            help="Path requested; pick a page that queries the database.",
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help="Requests sent in each mode.",
+        )
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=600,
+            help="CONN_MAX_AGE used for the persistent mode.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write(self.style.WARNING(
+                f"The database is {connection.vendor}; connection setup "
+                f"there is not representative of Postgres."
+            ))
+
+        handler = WSGIHandler()
+        environ = RequestFactory().get(
+            options['path'], HTTP_HOST='localhost'
+        ).environ
+        original = (
+            connection.settings_dict['CONN_MAX_AGE'],
+            connection.settings_dict['CONN_HEALTH_CHECKS'],
+        )
+        try:
+            for label, max_age, health_checks in (
+                ('New connection per request', 0, False),
+                (f'Persistent (CONN_MAX_AGE={options["max_age"]})',
+                 options['max_age'], False),
+                ('Persistent with health checks', options['max_age'], True),
+            ):
+                connection.close()
+                connection.settings_dict['CONN_MAX_AGE'] = max_age
+                connection.settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+                timings = self.measure(handler, environ, options['requests'])
+                self.report(label, timings)
+        finally:
+            connection.close()
+            (connection.settings_dict['CONN_MAX_AGE'],
+             connection.settings_dict['CONN_HEALTH_CHECKS']) = original
+
+    def measure(self, handler, environ, count):
+        statuses = set()
+
+        def start_response(status, headers, exc_info=None):
+            statuses.add(status)
+
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            # The handler fires request_started/request_finished, which is
+            # where Django closes or keeps the connection
+            response = handler(dict(environ), start_response)
+            for _chunk in response:
+                pass
+            response.close()
+            timings.append(time.perf_counter() - start)
+
+        if not any(status.startswith('200') for status in statuses):
+            raise CommandError(
+                f"The path answered {', '.join(sorted(statuses))}; "
+                f"choose one that returns 200."
+            )
+        return timings
+
+    def report(self, label, timings):
+        timings = sorted(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f"{label}: mean {statistics.mean(timings) * 1000:.2f} ms, "
+            f"p50 {statistics.median(timings) * 1000:.2f} ms, "
+            f"p95 {p95 * 1000:.2f} ms"
+        )
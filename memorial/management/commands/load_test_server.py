@@ -0,0 +1,146 @@
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Environment for each serving profile in gunicorn.conf.py
+PROFILES = {
+    # The previous Procfile: one request at a time per worker
+    'sync': {'SERVER_MODE': 'wsgi', 'GUNICORN_WORKER_CLASS': 'sync'},
+    'gthread': {'SERVER_MODE': 'wsgi'},
+    'asgi': {'SERVER_MODE': 'asgi'},
+}
+
+
+class Command(BaseCommand):
+    """Load test the gunicorn serving profiles against each other."""
+
+    help = (
+        "Start gunicorn with each serving profile from gunicorn.conf.py, "
+        "send concurrent requests to it and report throughput and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile',
+            action='append',
+            choices=sorted(PROFILES),
+            help="Profile to test; repeat for several. Defaults to all.",
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            help="Path requested; repeat to mix pages. Defaults to /plans/.",
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help="Requests sent to each profile.",
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=32,
+            help="Requests in flight at once.",
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help="WEB_CONCURRENCY for the server under test.",
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8765,
+            help="Port the server under test listens on.",
+        )
+
+    def handle(self, *args, **options):
+        paths = options['path'] or ['/plans/']
+        for profile in options['profile'] or sorted(PROFILES):
+            env = {
+                **os.environ,
+                **PROFILES[profile],
+                'PORT': str(options['port']),
+                'WEB_CONCURRENCY': str(options['workers']),
+            }
+            # A file rather than a pipe, so a chatty server never blocks
+            log = tempfile.TemporaryFile()
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '--config',
+                 os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')],
+                cwd=settings.BASE_DIR,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=log,
+            )
+            try:
+                self.wait_until_ready(server, log, options['port'])
+                self.run_profile(profile, paths, options)
+            except CommandError as e:
+                self.stderr.write(f"{profile}: {e}")
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+                log.close()
+
+    def wait_until_ready(self, server, log, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                log.seek(0)
+                lines = log.read().decode(errors='replace').splitlines()
+                raise CommandError(
+                    f"gunicorn exited: {lines[-1] if lines else 'no output'}"
+                )
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError("gunicorn did not start listening")
+
+    def run_profile(self, profile, paths, options):
+        base = f"http://127.0.0.1:{options['port']}"
+        urls = [
+            base + paths[i % len(paths)] for i in range(options['requests'])
+        ]
+
+        def fetch(url):
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=60) as response:
+                    response.read()
+                    ok = response.status == 200
+            except (urllib.error.URLError, OSError):
+                ok = False
+            return ok, time.perf_counter() - start
+
+        # Warm up every worker before measuring
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            list(pool.map(fetch, urls[:options['concurrency']]))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            results = list(pool.map(fetch, urls))
+        elapsed = time.perf_counter() - start
+
+        timings = sorted(duration for ok, duration in results)
+        errors = sum(1 for ok, duration in results if not ok)
+        p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+        self.stdout.write(
+            f"{profile}: {len(results) / elapsed:,.1f} req/s, "
+            f"p50 {statistics.median(timings) * 1000:.1f} ms, "
+            f"p95 {p95 * 1000:.1f} ms, {errors} errors"
+        )
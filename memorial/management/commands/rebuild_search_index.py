@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from memorial import search
+from memorial.models import Memorial
+
+
+class Command(BaseCommand):
+    """Rebuild the memorial full-text search index from scratch."""
+
+    help = "Rebuild the memorial search index in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Number of memorials indexed per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        if backend is None:
+            self.stderr.write(
+                f"No search index available on {connection.vendor}."
+            )
+            return
+
+        batch_size = options['batch_size']
+        memorials = Memorial.objects.only(*search.NAME_FIELDS).order_by('pk')
+        last_pk = 0
+        total = 0
+
+        while True:
+            batch = list(memorials.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic(), connection.cursor() as cursor:
+                for memorial in batch:
+                    backend.index(cursor, memorial)
+            last_pk = batch[-1].pk
+            total += len(batch)
+            self.stdout.write(f"Indexed {total} memorials...")
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} memorials."))
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from memorial import media, reconcile
+
+
+class Command(BaseCommand):
+    """Find and delete Cloudinary assets no memorial references."""
+
+    help = (
+        "Compare the Cloudinary inventory under memorials/ with the "
+        "database and delete orphaned assets."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Report orphans without deleting them.",
+        )
+        parser.add_argument(
+            '--prefix',
+            default=reconcile.DEFAULT_PREFIX,
+            help="Cloudinary folder prefix to scan.",
+        )
+        parser.add_argument(
+            '--min-age-hours',
+            type=float,
+            default=24,
+            help="Ignore assets uploaded more recently than this.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=reconcile.MAX_PAGE_SIZE,
+            help="Number of resources listed per Cloudinary request.",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        referenced = reconcile.referenced_public_ids()
+        self.stdout.write(
+            f"Loaded {len(referenced)} referenced public ids."
+        )
+
+        found = deleted = total_bytes = 0
+        # Deleting while the listing is still paging can shift its cursor
+        # and skip assets, so collect every orphan before deleting any
+        pending = {}
+        orphans = reconcile.find_orphans(
+            prefix=options['prefix'],
+            min_age=timedelta(hours=options['min_age_hours']),
+            page_size=options['batch_size'],
+            referenced=referenced,
+        )
+        for resource_type, public_id, size in orphans:
+            found += 1
+            total_bytes += size
+            self.stdout.write(f"{resource_type}\t{public_id}\t{size}")
+            pending.setdefault(resource_type, []).append(public_id)
+
+        if not dry_run:
+            for resource_type, public_ids in pending.items():
+                for i in range(0, len(public_ids), media.DELETE_BATCH_SIZE):
+                    deleted += media.bulk_delete(
+                        public_ids[i:i + media.DELETE_BATCH_SIZE],
+                        resource_type
+                    )
+
+        summary = f"Found {found} orphaned assets ({total_bytes} bytes)"
+        if dry_run:
+            self.stdout.write(self.style.WARNING(
+                f"{summary}; dry run, nothing deleted."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"{summary}; deleted {deleted}."
+            ))
@@ -0,0 +1,92 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from memorial import media_cleanup
+from memorial.models import MediaCleanupJob
+
+
+def _process(pk):
+    # Each pool thread gets its own connection; close it when done
+    try:
+        return media_cleanup.process_job(pk)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    """Remove deleted memorials' Cloudinary media from the cleanup queue."""
+
+    help = "Process queued Cloudinary cleanups with a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=2,
+            help="Number of memorials cleaned up in parallel.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help="Number of jobs claimed per poll.",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=10.0,
+            help="Seconds to wait when no job is due.",
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Process the jobs that are due and exit.",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        batch_size = max(options['batch_size'], concurrency)
+        done = failed = retrying = 0
+
+        # A single worker runs jobs inline on the main connection
+        pool = ThreadPoolExecutor(concurrency) if concurrency > 1 else None
+        run = pool.map if pool else map
+        process = _process if pool else media_cleanup.process_job
+
+        try:
+            while True:
+                requeued = media_cleanup.requeue_stale_jobs()
+                if requeued:
+                    self.stdout.write(f"Requeued {requeued} stale jobs.")
+
+                claimed = media_cleanup.claim_jobs(batch_size)
+                if not claimed:
+                    if options['once']:
+                        break
+                    # Drop broken or expired connections while idle
+                    close_old_connections()
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                for job in run(process, claimed):
+                    if job.status == MediaCleanupJob.STATUS_DONE:
+                        done += 1
+                    elif job.status == MediaCleanupJob.STATUS_FAILED:
+                        failed += 1
+                        self.stderr.write(
+                            f"Cleanup of {job.prefix} failed: {job.error}"
+                        )
+                    else:
+                        retrying += 1
+                self.stdout.write(f"Cleaned up {done} memorials...")
+        finally:
+            if pool:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Cleaned up {done} memorials, {failed} failed, "
+            f"{retrying} scheduled for retry."
+        ))
@@ -0,0 +1,90 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from memorial import media_jobs
+from memorial.models import MediaUploadJob
+
+
+def _process(pk):
+    # Each pool thread gets its own connection; close it when done
+    try:
+        return media_jobs.process_job(pk)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    """Push staged media uploads to Cloudinary from the job queue."""
+
+    help = "Process queued media uploads with a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help="Number of uploads processed in parallel.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help="Number of jobs claimed per poll.",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help="Seconds to wait when the queue is empty.",
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Drain the queue and exit instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        batch_size = max(options['batch_size'], concurrency)
+        done = failed = 0
+
+        # A single worker runs jobs inline on the main connection
+        pool = ThreadPoolExecutor(concurrency) if concurrency > 1 else None
+        run = pool.map if pool else map
+        process = _process if pool else media_jobs.process_job
+
+        try:
+            while True:
+                requeued = media_jobs.requeue_stale_jobs()
+                if requeued:
+                    self.stdout.write(f"Requeued {requeued} stale jobs.")
+
+                claimed = media_jobs.claim_jobs(batch_size)
+                if not claimed:
+                    if options['once']:
+                        break
+                    # Drop broken or expired connections while idle
+                    close_old_connections()
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                for job in run(process, claimed):
+                    if job.status == MediaUploadJob.STATUS_DONE:
+                        done += 1
+                    elif job.status == MediaUploadJob.STATUS_FAILED:
+                        failed += 1
+                        self.stderr.write(
+                            f"Job {job.pk} ({job.original_name}) failed: "
+                            f"{job.error}"
+                        )
+                self.stdout.write(f"Uploaded {done} files...")
+        finally:
+            if pool:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Uploaded {done} files, {failed} failed."
+        ))
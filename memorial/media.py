@@ -0,0 +1,455 @@
+"""
+Media storage for memorial uploads.
+
+Every upload, deletion and listing of memorial media goes through the
+functions in this module, which delegate to the backend selected by
+``MEDIA_BACKEND``:
+
+``cloudinary`` (default)
+    Stores media in Cloudinary. Admin API calls share a rate limit budget
+    read from Cloudinary's response headers; a call that would spend the
+    last of it raises ``Deferred`` instead.
+
+``local``
+    Stores media under ``MEDIA_LOCAL_ROOT`` and serves it from
+    ``/media/local/`` through ``FileResponse``, which hands the file to
+    the server's ``wsgi.file_wrapper`` (``sendfile`` under gunicorn). Set
+    ``MEDIA_LOCAL_ACCEL_REDIRECT`` to let nginx serve files instead. Used
+    for offline development, load tests and benchmarks.
+
+Both backends follow Cloudinary's naming: public ids of images and video
+have no extension, raw files keep theirs, and results are dicts with at
+least ``public_id``, ``secure_url`` and ``version``.
+"""
+
+import calendar
+import glob
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+from cloudinary import api, uploader
+from cloudinary.exceptions import NotFound, RateLimited
+from cloudinary.utils import cloudinary_url
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+
+RESOURCE_TYPES = ('image', 'video', 'raw')
+
+# Cloudinary deletes at most 100 public ids per Admin API call
+DELETE_BATCH_SIZE = 100
+# ... and lists at most 500 resources per page
+MAX_PAGE_SIZE = 500
+
+# Wait before retrying after Cloudinary rejected a call as rate limited
+RATE_LIMIT_RETRY = timedelta(minutes=1)
+
+
+class Deferred(Exception):
+    """Raised when a call must wait for the API rate limit to reset."""
+
+    def __init__(self, until):
+        super().__init__(f"Rate limited until {until.isoformat()}")
+        self.until = until
+
+
+class ApiBudget:
+    """
+    Admin API calls left in the current rate limit window.
+
+    Shared by all threads; updated from the headers of every response so
+    concurrent workers stop before the limit is hit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.remaining = None
+        self.reset_at = None
+
+    def check(self):
+        """Raise Deferred if the budget is spent for this window."""
+        with self._lock:
+            if self.remaining is None or self.reset_at is None:
+                return
+            if self.reset_at <= timezone.now():
+                self.remaining = self.reset_at = None
+                return
+            if self.remaining <= settings.MEDIA_CLEANUP_API_RESERVE:
+                raise Deferred(self.reset_at)
+            self.remaining -= 1
+
+    def record(self, response):
+        remaining = getattr(response, 'rate_limit_remaining', None)
+        reset_at = getattr(response, 'rate_limit_reset_at', None)
+        if remaining is None or reset_at is None:
+            return
+        with self._lock:
+            self.remaining = remaining
+            self.reset_at = datetime.fromtimestamp(
+                calendar.timegm(reset_at), tz=dt_timezone.utc
+            )
+
+
+budget = ApiBudget()
+
+
+class MediaBackend:
+    """Interface implemented by the storage backends."""
+
+    # Whether url() accepts Cloudinary-style transformations
+    supports_transformations = False
+
+    def upload(self, file, folder='', public_id=None, resource_type='image',
+               **options):
+        """Store ``file`` and return its upload result."""
+        raise NotImplementedError
+
+    def delete(self, public_id, resource_type='image'):
+        """Delete one file; return True if it existed."""
+        raise NotImplementedError
+
+    def bulk_delete(self, public_ids, resource_type='image'):
+        """Delete many files; return the number deleted."""
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix, resource_type='image'):
+        """Delete every file under ``prefix``; return the number deleted."""
+        raise NotImplementedError
+
+    def delete_folder(self, path):
+        """Remove an empty folder."""
+        raise NotImplementedError
+
+    def list_prefix(self, prefix, resource_type='image',
+                    page_size=MAX_PAGE_SIZE):
+        """Yield a dict per file under ``prefix``, a page at a time."""
+        raise NotImplementedError
+
+    def lookup(self, public_ids, resource_type='image'):
+        """Return dicts for those of ``public_ids`` that exist."""
+        raise NotImplementedError
+
+    def url(self, public_id, resource_type='image', version=None,
+            **transformation):
+        """Return the delivery URL of a file."""
+        raise NotImplementedError
+
+
+def _count_deleted(response):
+    return sum(
+        1 for status in response.get('deleted', {}).values()
+        if status == 'deleted'
+    )
+
+
+class CloudinaryBackend(MediaBackend):
+    """Media stored in Cloudinary."""
+
+    supports_transformations = True
+
+    def _admin(self, func, *args, **kwargs):
+        budget.check()
+        try:
+            response = func(*args, **kwargs)
+        except RateLimited:
+            raise Deferred(timezone.now() + RATE_LIMIT_RETRY)
+        budget.record(response)
+        return response
+
+    def upload(self, file, folder='', public_id=None, resource_type='image',
+               **options):
+        if folder:
+            options['folder'] = folder
+        if public_id:
+            options['public_id'] = public_id
+        return uploader.upload(file, resource_type=resource_type, **options)
+
+    def delete(self, public_id, resource_type='image'):
+        result = uploader.destroy(public_id, resource_type=resource_type)
+        return result.get('result') == 'ok'
+
+    def bulk_delete(self, public_ids, resource_type='image'):
+        public_ids = list(public_ids)
+        deleted = 0
+        for i in range(0, len(public_ids), DELETE_BATCH_SIZE):
+            deleted += _count_deleted(self._admin(
+                api.delete_resources,
+                public_ids[i:i + DELETE_BATCH_SIZE],
+                resource_type=resource_type,
+            ))
+        return deleted
+
+    def delete_prefix(self, prefix, resource_type='image'):
+        deleted = 0
+        while True:
+            response = self._admin(
+                api.delete_resources_by_prefix,
+                prefix,
+                resource_type=resource_type,
+            )
+            deleted += _count_deleted(response)
+            # Each call removes at most 1000 resources
+            if not response.get('partial'):
+                return deleted
+
+    def delete_folder(self, path):
+        try:
+            self._admin(api.delete_folder, path)
+        except NotFound:
+            pass
+
+    def list_prefix(self, prefix, resource_type='image',
+                    page_size=MAX_PAGE_SIZE):
+        next_cursor = None
+        while True:
+            options = {
+                'type': 'upload',
+                'prefix': prefix,
+                'resource_type': resource_type,
+                'max_results': min(page_size, MAX_PAGE_SIZE),
+            }
+            if next_cursor:
+                options['next_cursor'] = next_cursor
+            response = self._admin(api.resources, **options)
+            yield from response.get('resources', [])
+            next_cursor = response.get('next_cursor')
+            if not next_cursor:
+                return
+
+    def lookup(self, public_ids, resource_type='image'):
+        response = self._admin(
+            api.resources_by_ids, list(public_ids),
+            resource_type=resource_type,
+        )
+        return response.get('resources', [])
+
+    def url(self, public_id, resource_type='image', version=None,
+            **transformation):
+        return cloudinary_url(
+            public_id, resource_type=resource_type, version=version,
+            secure=True, **transformation
+        )[0]
+
+
+class LocalBackend(MediaBackend):
+    """Media stored on local disk under MEDIA_LOCAL_ROOT."""
+
+    @property
+    def root(self):
+        return str(settings.MEDIA_LOCAL_ROOT)
+
+    def _base(self, resource_type):
+        return os.path.join(self.root, resource_type)
+
+    def _find(self, public_id, resource_type):
+        """Return the paths holding ``public_id``, with any extension."""
+        path = os.path.join(self._base(resource_type), public_id)
+        if resource_type == 'raw':
+            return [path] if os.path.isfile(path) else []
+        return [
+            match for match in glob.glob(glob.escape(path) + '.*')
+            if os.path.splitext(match)[0] == path
+        ]
+
+    def _public_id(self, path, resource_type):
+        public_id = os.path.relpath(path, self._base(resource_type))
+        public_id = public_id.replace(os.sep, '/')
+        if resource_type != 'raw':
+            public_id = os.path.splitext(public_id)[0]
+        return public_id
+
+    def _describe(self, path, resource_type):
+        stat = os.stat(path)
+        public_id = self._public_id(path, resource_type)
+        version = int(stat.st_mtime)
+        return {
+            'public_id': public_id,
+            'resource_type': resource_type,
+            'version': version,
+            'bytes': stat.st_size,
+            'format': os.path.splitext(path)[1].lstrip('.'),
+            'created_at': datetime.fromtimestamp(
+                stat.st_mtime, tz=dt_timezone.utc
+            ).isoformat(),
+            'secure_url': self._url_for(path, resource_type, version),
+        }
+
+    def _url_for(self, path, resource_type, version=None):
+        relative = os.path.relpath(path, self._base(resource_type))
+        url = reverse('memorials:local_media', kwargs={
+            'resource_type': resource_type,
+            'path': relative.replace(os.sep, '/'),
+        })
+        return f"{url}?v={version}" if version else url
+
+    def upload(self, file, folder='', public_id=None, resource_type='image',
+               overwrite=True, use_filename=False, unique_filename=True,
+               **options):
+        name = os.path.basename(getattr(file, 'name', '') or 'file')
+        stem, ext = os.path.splitext(name)
+        if public_id is None:
+            public_id = stem if use_filename else uuid.uuid4().hex[:20]
+            if use_filename and unique_filename:
+                public_id += f"_{uuid.uuid4().hex[:6]}"
+        if folder:
+            public_id = f"{folder.strip('/')}/{public_id}"
+        if resource_type == 'raw' and not public_id.endswith(ext):
+            public_id += ext
+
+        existing = self._find(public_id, resource_type)
+        if existing and not overwrite:
+            return self._describe(existing[0], resource_type)
+        previous_version = 0
+        for path in existing:
+            previous_version = int(os.stat(path).st_mtime)
+            os.remove(path)
+
+        path = os.path.join(self._base(resource_type), public_id)
+        if resource_type != 'raw':
+            path += ext.lower()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        with open(path, 'wb') as destination:
+            if hasattr(file, 'chunks'):
+                for chunk in file.chunks():
+                    destination.write(chunk)
+            else:
+                shutil.copyfileobj(file, destination)
+        # Versions come from the mtime; make sure a replacement bumps it
+        mtime = max(time.time(), previous_version + 1)
+        os.utime(path, (mtime, mtime))
+        return self._describe(path, resource_type)
+
+    def delete(self, public_id, resource_type='image'):
+        paths = self._find(public_id, resource_type)
+        for path in paths:
+            os.remove(path)
+        return bool(paths)
+
+    def bulk_delete(self, public_ids, resource_type='image'):
+        return sum(
+            self.delete(public_id, resource_type) for public_id in public_ids
+        )
+
+    def _walk(self, prefix, resource_type):
+        base = self._base(resource_type)
+        start = os.path.join(base, os.path.dirname(prefix))
+        for directory, _, files in os.walk(start):
+            for name in sorted(files):
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, base).replace(os.sep, '/')
+                if relative.startswith(prefix):
+                    yield path
+
+    def delete_prefix(self, prefix, resource_type='image'):
+        deleted = 0
+        for path in list(self._walk(prefix, resource_type)):
+            os.remove(path)
+            deleted += 1
+        return deleted
+
+    def delete_folder(self, path):
+        for resource_type in RESOURCE_TYPES:
+            folder = os.path.join(self._base(resource_type), path)
+            # Remove empty subfolders, then the folder itself
+            for directory, _, _ in sorted(
+                    os.walk(folder), key=lambda entry: -len(entry[0])):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+
+    def list_prefix(self, prefix, resource_type='image',
+                    page_size=MAX_PAGE_SIZE):
+        for path in self._walk(prefix, resource_type):
+            yield self._describe(path, resource_type)
+
+    def lookup(self, public_ids, resource_type='image'):
+        return [
+            self._describe(paths[0], resource_type)
+            for paths in (
+                self._find(public_id, resource_type)
+                for public_id in public_ids
+            )
+            if paths
+        ]
+
+    def url(self, public_id, resource_type='image', version=None,
+            **transformation):
+        paths = self._find(public_id, resource_type)
+        path = paths[0] if paths else os.path.join(
+            self._base(resource_type), public_id
+        )
+        return self._url_for(path, resource_type, version)
+
+    def path(self, resource_type, relative_path):
+        """Return the file behind a local media URL, or None."""
+        base = os.path.realpath(self._base(resource_type))
+        path = os.path.realpath(os.path.join(base, relative_path))
+        if not path.startswith(base + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+
+BACKENDS = {
+    'cloudinary': CloudinaryBackend,
+    'local': LocalBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def _load_backend(name):
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown MEDIA_BACKEND '{name}'")
+
+
+def get_backend():
+    """Return the backend selected by MEDIA_BACKEND."""
+    return _load_backend(settings.MEDIA_BACKEND)
+
+
+def upload(file, folder='', public_id=None, resource_type='image',
+           **options):
+    return get_backend().upload(
+        file, folder=folder, public_id=public_id,
+        resource_type=resource_type, **options
+    )
+
+
+def delete(public_id, resource_type='image'):
+    return get_backend().delete(public_id, resource_type)
+
+
+def bulk_delete(public_ids, resource_type='image'):
+    return get_backend().bulk_delete(public_ids, resource_type)
+
+
+def delete_prefix(prefix, resource_type='image'):
+    return get_backend().delete_prefix(prefix, resource_type)
+
+
+def delete_folder(path):
+    return get_backend().delete_folder(path)
+
+
+def list_prefix(prefix, resource_type='image', page_size=MAX_PAGE_SIZE):
+    return get_backend().list_prefix(prefix, resource_type, page_size)
+
+
+def lookup(public_ids, resource_type='image'):
+    return get_backend().lookup(public_ids, resource_type)
+
+
+def url(public_id, resource_type='image', version=None, **transformation):
+    return get_backend().url(
+        public_id, resource_type=resource_type, version=version,
+        **transformation
+    )
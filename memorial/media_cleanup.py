@@ -0,0 +1,185 @@
+"""
+Background removal of a deleted memorial's media.
+
+Deleting a memorial only queues a ``MediaCleanupJob`` in the same
+transaction, so the request never waits on Cloudinary and the cleanup
+survives crashes. ``manage.py run_media_cleanup`` drains the queue: each
+job removes any files stored outside the memorial's folder, deletes
+everything under the folder with concurrent prefix deletes, checks the
+folder is empty and only then deletes the folder itself (see
+memorial.media for the backend calls).
+
+Failed jobs are retried with exponential backoff. Jobs that would exhaust
+the Cloudinary rate limit are deferred until it resets instead of failing.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import media
+from .media import Deferred
+from .models import MediaCleanupJob
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_TYPES = media.RESOURCE_TYPES
+
+# Processing jobs untouched for this long are assumed to belong to a dead
+# worker and are handed out again
+STALE_AFTER = timedelta(minutes=10)
+
+
+def retry_delay(attempts):
+    """Backoff before retry number ``attempts``, capped at an hour."""
+    seconds = settings.MEDIA_CLEANUP_RETRY_DELAY * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(seconds, 3600))
+
+
+# ---------------------------
+# Queueing
+# ---------------------------
+
+def memorial_prefix(memorial_id):
+    """Folder prefix holding every upload of a memorial."""
+    return f"memorials/{memorial_id}/"
+
+
+def _stray_public_ids(memorial, prefix):
+    """Public ids of the memorial's files stored outside its folder."""
+    stray = {}
+    candidates = (
+        ('image', memorial.profile_public_id),
+        ('image', memorial.qr_code_public_id),
+        ('video', memorial.audio_public_id),
+    )
+    for resource_type, public_id in candidates:
+        if public_id and not public_id.startswith(prefix):
+            stray.setdefault(resource_type, []).append(public_id)
+    return stray
+
+
+def enqueue_memorial_cleanup(memorial):
+    """Queue removal of a memorial's Cloudinary media."""
+    prefix = memorial_prefix(memorial.pk)
+    return MediaCleanupJob.objects.create(
+        memorial_id=memorial.pk,
+        prefix=prefix,
+        public_ids=_stray_public_ids(memorial, prefix),
+    )
+
+
+# ---------------------------
+# Worker
+# ---------------------------
+
+def requeue_stale_jobs(older_than=STALE_AFTER):
+    """Return jobs stuck in processing by a dead worker to the queue."""
+    return MediaCleanupJob.objects.filter(
+        status=MediaCleanupJob.STATUS_PROCESSING,
+        updated_at__lt=timezone.now() - older_than,
+    ).update(status=MediaCleanupJob.STATUS_PENDING, updated_at=timezone.now())
+
+
+def claim_jobs(limit):
+    """
+    Claim up to ``limit`` due jobs for this worker.
+
+    Each claim is a conditional UPDATE, so concurrent workers never process
+    the same job twice.
+
+    Returns:
+        list: Ids of the claimed jobs
+    """
+    candidates = MediaCleanupJob.objects.filter(
+        status=MediaCleanupJob.STATUS_PENDING,
+        next_attempt_at__lte=timezone.now(),
+    ).order_by('next_attempt_at').values_list('pk', flat=True)[:limit]
+
+    claimed = []
+    for pk in candidates:
+        updated = MediaCleanupJob.objects.filter(
+            pk=pk, status=MediaCleanupJob.STATUS_PENDING
+        ).update(
+            status=MediaCleanupJob.STATUS_PROCESSING,
+            attempts=F('attempts') + 1,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def remaining_resources(prefix):
+    """Return the number of resource types still holding files."""
+    return sum(
+        1 for resource_type in RESOURCE_TYPES
+        if next(iter(media.list_prefix(prefix, resource_type, 1)), None)
+    )
+
+
+def _run_cleanup(job):
+    deleted = 0
+    for resource_type, public_ids in job.public_ids.items():
+        deleted += media.bulk_delete(public_ids, resource_type)
+    # Resource types are deleted independently, so run them side by side;
+    # the shared budget keeps the combined call rate in check
+    with ThreadPoolExecutor(max_workers=len(RESOURCE_TYPES)) as pool:
+        deleted += sum(pool.map(
+            lambda resource_type: media.delete_prefix(
+                job.prefix, resource_type
+            ),
+            RESOURCE_TYPES
+        ))
+
+    # Deletes are eventually consistent; only drop the folder once the
+    # listing agrees it is empty
+    if remaining_resources(job.prefix):
+        raise RuntimeError(f"{job.prefix} still holds resources")
+    media.delete_folder(job.prefix.rstrip('/'))
+    return deleted
+
+
+def process_job(pk):
+    """
+    Remove a claimed job's media and record the outcome.
+
+    Failures are retried with exponential backoff until
+    MEDIA_CLEANUP_MAX_ATTEMPTS is reached; rate limit deferrals do not
+    count as attempts.
+
+    Returns:
+        MediaCleanupJob: The job in its new state
+    """
+    job = MediaCleanupJob.objects.get(pk=pk)
+    fields = ['status', 'attempts', 'next_attempt_at', 'error', 'updated_at']
+
+    try:
+        job.deleted_count += _run_cleanup(job)
+    except Deferred as e:
+        logger.warning(f"Media cleanup job {job.pk} deferred: {e}")
+        job.error = str(e)
+        job.status = MediaCleanupJob.STATUS_PENDING
+        job.attempts -= 1
+        job.next_attempt_at = e.until
+        job.save(update_fields=fields)
+        return job
+    except Exception as e:
+        logger.error(f"Media cleanup job {job.pk} failed: {e}")
+        job.error = str(e)
+        if job.attempts < settings.MEDIA_CLEANUP_MAX_ATTEMPTS:
+            job.status = MediaCleanupJob.STATUS_PENDING
+            job.next_attempt_at = timezone.now() + retry_delay(job.attempts)
+        else:
+            job.status = MediaCleanupJob.STATUS_FAILED
+        job.save(update_fields=fields)
+        return job
+
+    job.status = MediaCleanupJob.STATUS_DONE
+    job.error = ''
+    job.save(update_fields=fields + ['deleted_count'])
+    return job
@@ -0,0 +1,420 @@
+"""
+Background media uploads for memorials.
+
+Upload views stage incoming files on local disk and queue a
+``MediaUploadJob`` instead of holding a request (and, for the gallery, a
+database transaction) open across Cloudinary round-trips. Jobs are claimed
+and processed by ``manage.py run_media_worker``; gallery images are created
+up front with ``is_ready=False`` and flip to ready once their upload lands.
+
+The same upload helpers back the direct path used when
+``MEDIA_UPLOAD_ASYNC`` is disabled, with async variants for async views.
+"""
+
+import logging
+import math
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from . import aio, imaging, media
+from .cache import invalidate_memorial
+from .models import GalleryImage, MediaUploadJob
+
+logger = logging.getLogger(__name__)
+
+# Processing jobs untouched for this long are assumed to belong to a dead
+# worker and are handed out again
+STALE_AFTER = timedelta(minutes=10)
+
+
+# ---------------------------
+# Uploads
+# ---------------------------
+
+def _profile_upload_options(memorial):
+    return {
+        'folder': f"memorials/{memorial.id}/profile_pictures",
+        'public_id': f"profile_{memorial.id}",
+        'overwrite': True,
+        'resource_type': "image",
+    }
+
+
+def _set_profile_picture(memorial, upload_result):
+    memorial.profile_public_id = upload_result['public_id']
+    memorial.profile_version = upload_result.get('version')
+    memorial.profile_picture.name = upload_result['public_id']
+
+
+def upload_profile_picture(memorial, file):
+    """Upload a profile picture and point the memorial at it."""
+    processed, stats = imaging.prepare_image(file)
+    if memorial.profile_public_id:
+        media.delete(memorial.profile_public_id)
+
+    with processed:
+        upload_result = media.upload(
+            processed, **_profile_upload_options(memorial)
+        )
+    upload_result['preprocessing'] = stats
+
+    _set_profile_picture(memorial, upload_result)
+    memorial.save()
+    return upload_result
+
+
+async def aupload_profile_picture(memorial, file):
+    """Async ``upload_profile_picture``; the slow steps run in threads."""
+    processed, stats = await aio.offload(
+        'media', imaging.prepare_image, file
+    )
+    if memorial.profile_public_id:
+        await aio.offload('media', media.delete, memorial.profile_public_id)
+
+    with processed:
+        upload_result = await aio.offload(
+            'media', media.upload, processed,
+            **_profile_upload_options(memorial)
+        )
+    upload_result['preprocessing'] = stats
+
+    _set_profile_picture(memorial, upload_result)
+    await memorial.asave()
+    return upload_result
+
+
+def _audio_upload_options(memorial):
+    return {
+        'folder': f"memorials/{memorial.id}/audio",
+        'resource_type': "video",
+    }
+
+
+def _set_audio_file(memorial, upload_result):
+    memorial.audio_file = upload_result['secure_url']
+    memorial.audio_public_id = upload_result['public_id']
+
+
+def upload_audio(memorial, file):
+    """Upload an audio file, replacing the memorial's current one."""
+    if memorial.audio_public_id:
+        media.delete(memorial.audio_public_id, resource_type="video")
+
+    upload_result = media.upload(file, **_audio_upload_options(memorial))
+
+    _set_audio_file(memorial, upload_result)
+    memorial.save()
+    return upload_result
+
+
+async def aupload_audio(memorial, file):
+    """Async ``upload_audio``; the Cloudinary calls run in threads."""
+    if memorial.audio_public_id:
+        await aio.offload(
+            'media', media.delete, memorial.audio_public_id,
+            resource_type="video"
+        )
+
+    upload_result = await aio.offload(
+        'media', media.upload, file, **_audio_upload_options(memorial)
+    )
+
+    _set_audio_file(memorial, upload_result)
+    await memorial.asave()
+    return upload_result
+
+
+def upload_gallery_file(memorial, file, **options):
+    """Upload a gallery image; the caller records the result."""
+    processed, stats = imaging.prepare_image(file)
+    with processed:
+        upload_result = media.upload(
+            processed,
+            folder=f"memorials/{memorial.id}/gallery",
+            use_filename=True,
+            unique_filename=False,
+            overwrite=False,
+            **options
+        )
+    upload_result['preprocessing'] = stats
+    return upload_result
+
+
+def next_gallery_order(memorial):
+    """Return the ``order`` value that follows the memorial's last image."""
+    last = memorial.gallery.aggregate(last=Max('order'))['last']
+    return (last or 0) + 1
+
+
+def upload_gallery_files(memorial, files, concurrency=None, timeout=None):
+    """
+    Upload gallery images in parallel and record the ones that succeed.
+
+    Uploads run on a bounded thread pool; each request to Cloudinary is
+    limited to ``timeout`` seconds. Files still queued once every slot
+    has had its share of time are reported as timed out. Uploads already
+    running are waited for, which their own timeout bounds, so none lands
+    in Cloudinary without a gallery row. Successful uploads are saved
+    with a single bulk insert, in the order given.
+
+    Args:
+        memorial: Memorial receiving the images
+        files: Uploaded image files
+        concurrency: Maximum parallel uploads (GALLERY_UPLOAD_CONCURRENCY)
+        timeout: Per-file timeout in seconds (GALLERY_UPLOAD_TIMEOUT)
+
+    Returns:
+        list: One dict per file with ``name`` and ``success``, plus ``id``,
+        ``url`` and ``caption`` on success or ``error`` on failure
+    """
+    concurrency = concurrency or settings.GALLERY_UPLOAD_CONCURRENCY
+    timeout = timeout or settings.GALLERY_UPLOAD_TIMEOUT
+    results = [{'name': file.name, 'success': False} for file in files]
+    if not files:
+        return results
+
+    workers = min(concurrency, len(files))
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [
+            pool.submit(upload_gallery_file, memorial, file, timeout=timeout)
+            for file in files
+        ]
+        # Queued files only start once a slot frees up
+        wait(futures, timeout=timeout * math.ceil(len(files) / workers))
+    finally:
+        # Drop files that have not started and let running uploads finish
+        # while the request's files are still open
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    uploaded = []
+    for result, future in zip(results, futures):
+        if future.cancelled():
+            result['error'] = f"Timed out after {timeout} seconds"
+        elif future.exception():
+            result['error'] = str(future.exception())
+            logger.error(
+                f"Gallery upload of {result['name']} failed: "
+                f"{result['error']}"
+            )
+        else:
+            uploaded.append((result, future.result()))
+
+    order = next_gallery_order(memorial)
+    images = GalleryImage.objects.bulk_create([
+        GalleryImage(
+            memorial=memorial,
+            image=upload_result['secure_url'],
+            order=order + i
+        )
+        for i, (_, upload_result) in enumerate(uploaded)
+    ])
+    for (result, upload_result), image in zip(uploaded, images):
+        result.update(
+            success=True,
+            id=image.id,
+            url=upload_result['secure_url'],
+            caption=image.caption or '',
+            bytes_saved=upload_result['preprocessing']['bytes_saved'],
+            processing_ms=upload_result['preprocessing']['processing_ms']
+        )
+
+    if images:
+        # bulk_create skips post_save, so drop cached fragments here
+        invalidate_memorial(memorial.pk)
+    return results
+
+
+# ---------------------------
+# Queueing
+# ---------------------------
+
+def stage_upload(uploaded_file):
+    """
+    Copy an uploaded file into the staging directory.
+
+    Args:
+        uploaded_file: Django UploadedFile from request.FILES
+
+    Returns:
+        str: Path of the staged copy
+    """
+    os.makedirs(settings.MEDIA_UPLOAD_STAGING_DIR, exist_ok=True)
+    _, ext = os.path.splitext(uploaded_file.name)
+    path = os.path.join(
+        settings.MEDIA_UPLOAD_STAGING_DIR, f"{uuid.uuid4().hex}{ext.lower()}"
+    )
+    with open(path, 'wb') as staged:
+        for chunk in uploaded_file.chunks():
+            staged.write(chunk)
+    return path
+
+
+def enqueue(memorial, kind, uploaded_file, gallery_image=None):
+    """Stage ``uploaded_file`` and queue a job to upload it."""
+    return MediaUploadJob.objects.create(
+        memorial=memorial,
+        kind=kind,
+        gallery_image=gallery_image,
+        staged_path=stage_upload(uploaded_file),
+        original_name=uploaded_file.name[:255],
+    )
+
+
+def enqueue_gallery_images(memorial, files):
+    """
+    Queue gallery uploads, creating a pending GalleryImage for each file.
+
+    Returns:
+        list: The created MediaUploadJob rows
+    """
+    jobs = []
+    order = next_gallery_order(memorial)
+    with transaction.atomic():
+        for i, file in enumerate(files):
+            gallery_image = GalleryImage.objects.create(
+                memorial=memorial, image='', order=order + i, is_ready=False
+            )
+            jobs.append(enqueue(
+                memorial, MediaUploadJob.KIND_GALLERY, file,
+                gallery_image=gallery_image
+            ))
+    return jobs
+
+
+def job_status(job):
+    """Serialise a job for the status endpoint and upload responses."""
+    data = {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'result': job.result,
+        'error': job.error,
+    }
+    if job.gallery_image_id:
+        data['gallery_image_id'] = job.gallery_image_id
+    return data
+
+
+# ---------------------------
+# Worker
+# ---------------------------
+
+def requeue_stale_jobs(older_than=STALE_AFTER):
+    """Return jobs stuck in processing by a dead worker to the queue."""
+    return MediaUploadJob.objects.filter(
+        status=MediaUploadJob.STATUS_PROCESSING,
+        updated_at__lt=timezone.now() - older_than,
+    ).update(status=MediaUploadJob.STATUS_PENDING, updated_at=timezone.now())
+
+
+def claim_jobs(limit):
+    """
+    Claim up to ``limit`` pending jobs for this worker.
+
+    Each claim is a conditional UPDATE, so concurrent workers never process
+    the same job twice.
+
+    Returns:
+        list: Ids of the claimed jobs
+    """
+    candidates = MediaUploadJob.objects.filter(
+        status=MediaUploadJob.STATUS_PENDING
+    ).order_by('created_at').values_list('pk', flat=True)[:limit]
+
+    claimed = []
+    for pk in candidates:
+        updated = MediaUploadJob.objects.filter(
+            pk=pk, status=MediaUploadJob.STATUS_PENDING
+        ).update(
+            status=MediaUploadJob.STATUS_PROCESSING,
+            attempts=F('attempts') + 1,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def _run_upload(job):
+    memorial = job.memorial
+    with open(job.staged_path, 'rb') as staged:
+        if job.kind == MediaUploadJob.KIND_PROFILE:
+            upload_result = upload_profile_picture(memorial, staged)
+        elif job.kind == MediaUploadJob.KIND_AUDIO:
+            upload_result = upload_audio(memorial, staged)
+        else:
+            upload_result = upload_gallery_file(memorial, staged)
+            gallery_image = job.gallery_image
+            gallery_image.image = upload_result['secure_url']
+            gallery_image.is_ready = True
+            gallery_image.save(update_fields=['image', 'is_ready'])
+
+    return {
+        'public_id': upload_result['public_id'],
+        'url': upload_result['secure_url'],
+        'preprocessing': upload_result.get('preprocessing', {}),
+    }
+
+
+def _discard_staged_file(job):
+    try:
+        os.remove(job.staged_path)
+    except FileNotFoundError:
+        pass
+
+
+def process_job(pk):
+    """
+    Upload a claimed job's staged file and record the outcome.
+
+    Failed uploads go back to the queue until MEDIA_UPLOAD_MAX_ATTEMPTS is
+    reached, except invalid images, which fail at once; a gallery image
+    whose upload finally fails is removed.
+
+    Returns:
+        MediaUploadJob: The job in its new state
+    """
+    job = MediaUploadJob.objects.select_related(
+        'memorial', 'gallery_image'
+    ).get(pk=pk)
+
+    if job.kind == MediaUploadJob.KIND_GALLERY and not job.gallery_image_id:
+        # The pending image was deleted before the upload ran
+        job.status = MediaUploadJob.STATUS_FAILED
+        job.error = 'Gallery image was removed before upload'
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        _discard_staged_file(job)
+        return job
+
+    try:
+        job.result = _run_upload(job)
+    except Exception as e:
+        logger.error(f"Media upload job {job.pk} failed: {e}")
+        job.error = str(e)
+        # An invalid image fails the same way on every attempt
+        retry = not isinstance(e, imaging.InvalidImage)
+        if retry and job.attempts < settings.MEDIA_UPLOAD_MAX_ATTEMPTS:
+            job.status = MediaUploadJob.STATUS_PENDING
+            job.save(update_fields=['status', 'error', 'updated_at'])
+            return job
+
+        job.status = MediaUploadJob.STATUS_FAILED
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        if job.gallery_image_id:
+            GalleryImage.objects.filter(pk=job.gallery_image_id).delete()
+        _discard_staged_file(job)
+        return job
+
+    job.status = MediaUploadJob.STATUS_DONE
+    job.error = ''
+    job.save(update_fields=['status', 'result', 'error', 'updated_at'])
+    _discard_staged_file(job)
+    return job
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memorial', '0003_alter_galleryimage_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['memorial', 'created_at', 'id'], name='story_memorial_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tribute',
+            index=models.Index(fields=['memorial', 'created_at', 'id'], name='tribute_memorial_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:36
+
+from django.db import migrations, models
+
+# The SQL is inlined rather than taken from memorial.search so that later
+# changes to the live search backends cannot change what this migration does.
+SQLITE_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS memorial_search_index USING fts5("
+    "first_name, middle_name, last_name, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "INSERT INTO memorial_search_index "
+    "(rowid, first_name, middle_name, last_name) "
+    "SELECT id, COALESCE(first_name, ''), COALESCE(middle_name, ''), "
+    "COALESCE(last_name, '') FROM memorial_memorial",
+]
+
+POSTGRES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE TABLE IF NOT EXISTS memorial_search_index ("
+    "memorial_id bigint PRIMARY KEY "
+    "REFERENCES memorial_memorial (id) "
+    "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL, "
+    "names text NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS memorial_search_index_document_idx "
+    "ON memorial_search_index USING gin (document)",
+    "CREATE INDEX IF NOT EXISTS memorial_search_index_names_trgm_idx "
+    "ON memorial_search_index USING gin (names gin_trgm_ops)",
+    "INSERT INTO memorial_search_index (memorial_id, document, names) "
+    "SELECT id, "
+    "setweight(to_tsvector('simple', COALESCE(first_name, '')), 'A') || "
+    "setweight(to_tsvector('simple', COALESCE(middle_name, '')), 'B') || "
+    "setweight(to_tsvector('simple', COALESCE(last_name, '')), 'C'), "
+    "lower(concat_ws(' ', NULLIF(first_name, ''), NULLIF(middle_name, ''), "
+    "NULLIF(last_name, ''))) "
+    "FROM memorial_memorial",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_SQL, 'postgresql': POSTGRES_SQL}
+    for sql in statements.get(vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS memorial_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memorial', '0004_tribute_story_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.AddIndex(
+            model_name='memorial',
+            index=models.Index(fields=['date_of_birth'], name='memorial_birth_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='memorial',
+            index=models.Index(fields=['date_of_death'], name='memorial_death_idx'),
+        ),
+    ]
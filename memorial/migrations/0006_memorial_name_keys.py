@@ -0,0 +1,76 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memorial', '0005_memorial_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memorial',
+            name='first_name_folded',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='memorial',
+            name='first_name_metaphone',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='memorial',
+            name='first_name_soundex',
+            field=models.CharField(blank=True, default='', editable=False, max_length=4),
+        ),
+        migrations.AddField(
+            model_name='memorial',
+            name='last_name_folded',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='memorial',
+            name='last_name_metaphone',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='memorial',
+            name='last_name_soundex',
+            field=models.CharField(blank=True, default='', editable=False, max_length=4),
+        ),
+        migrations.AddField(
+            model_name='memorial',
+            name='middle_name_folded',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='memorial',
+            index=models.Index(fields=['last_name_folded', 'first_name_folded'], name='memorial_folded_name_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='memorial',
+            index=models.Index(fields=['first_name_folded'], name='memorial_first_folded_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='memorial',
+            index=models.Index(fields=['middle_name_folded'], name='memorial_middle_folded_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='memorial',
+            index=models.Index(fields=['last_name_metaphone', 'first_name_metaphone'], name='memorial_metaphone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='memorial',
+            index=models.Index(fields=['first_name_metaphone'], name='memorial_first_metaphone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='memorial',
+            index=models.Index(fields=['last_name_soundex'], name='memorial_last_soundex_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='memorial',
+            index=models.Index(fields=['first_name_soundex'], name='memorial_first_soundex_idx'),
+        ),
+    ]
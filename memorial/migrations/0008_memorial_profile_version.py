@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memorial', '0007_media_upload_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memorial',
+            name='profile_version',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
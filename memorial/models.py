@@ -8,12 +8,9 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 from cloudinary.models import CloudinaryField
-from cloudinary.uploader import upload
 from cloudinary_storage.storage import MediaCloudinaryStorage
-import qrcode
-from io import BytesIO
 from plans.models import Plan
-from django.conf import settings
+from . import phonetics, qr_codes
 
 
 class Memorial(models.Model):
@@ -44,6 +41,11 @@ class Memorial(models.Model):
 
     # Cloudinary references
     profile_public_id = models.CharField(max_length=300, blank=True, null=True)
+    # Cloudinary version of the current profile picture, used in its URLs
+    # so they only change when the image does
+    profile_version = models.PositiveBigIntegerField(
+        blank=True, null=True, editable=False
+    )
     audio_public_id = models.CharField(max_length=300, blank=True, null=True)
     qr_code_public_id = models.CharField(max_length=300, blank=True, null=True)
 
@@ -91,48 +93,85 @@ class Memorial(models.Model):
         max_length=255, blank=True, null=True
     )
 
-    def save(self, *args, **kwargs):
-        """Custom save to handle QR code generation."""
-        if not self.id:
-            super().save(*args, **kwargs)
+    # Fuzzy search keys, computed on save (see memorial.phonetics)
+    first_name_folded = models.CharField(
+        max_length=100, blank=True, default='', editable=False
+    )
+    middle_name_folded = models.CharField(
+        max_length=100, blank=True, default='', editable=False
+    )
+    last_name_folded = models.CharField(
+        max_length=100, blank=True, default='', editable=False
+    )
+    first_name_soundex = models.CharField(
+        max_length=4, blank=True, default='', editable=False
+    )
+    first_name_metaphone = models.CharField(
+        max_length=100, blank=True, default='', editable=False
+    )
+    last_name_soundex = models.CharField(
+        max_length=4, blank=True, default='', editable=False
+    )
+    last_name_metaphone = models.CharField(
+        max_length=100, blank=True, default='', editable=False
+    )
 
-        if not self.qr_code:
-            self.generate_qr_code()
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_of_birth'], name='memorial_birth_idx'),
+            models.Index(fields=['date_of_death'], name='memorial_death_idx'),
+            # Pattern ops let PostgreSQL use these for prefix LIKE lookups
+            models.Index(
+                fields=['last_name_folded', 'first_name_folded'],
+                name='memorial_folded_name_idx',
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops'],
+            ),
+            models.Index(
+                fields=['first_name_folded'],
+                name='memorial_first_folded_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+            models.Index(
+                fields=['middle_name_folded'],
+                name='memorial_middle_folded_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+            models.Index(
+                fields=['last_name_metaphone', 'first_name_metaphone'],
+                name='memorial_metaphone_idx',
+            ),
+            models.Index(
+                fields=['first_name_metaphone'],
+                name='memorial_first_metaphone_idx',
+            ),
+            models.Index(
+                fields=['last_name_soundex'], name='memorial_last_soundex_idx'
+            ),
+            models.Index(
+                fields=['first_name_soundex'],
+                name='memorial_first_soundex_idx',
+            ),
+        ]
+
+    def refresh_name_keys(self):
+        """Recompute the stored fuzzy search keys from the current names."""
+        for field, value in phonetics.name_keys(self).items():
+            setattr(self, field, value)
 
+    def save(self, *args, **kwargs):
+        """Custom save to keep fuzzy search keys in sync with the names."""
+        self.refresh_name_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and (
+                set(update_fields) & set(phonetics.FOLDED_FIELDS)):
+            kwargs['update_fields'] = (
+                set(update_fields) | set(phonetics.KEY_FIELDS)
+            )
         super().save(*args, **kwargs)
 
-    def generate_qr_code(self):
-        """Generates and uploads QR code to Cloudinary."""
-        url = f"{settings.SITE_URL}/memorials/{self.id}/"
-        qr_img = qrcode.make(url)
-
-        buffer = BytesIO()
-        qr_img.save(buffer, format="PNG")
-        buffer.seek(0)
-
-        try:
-            upload_result = upload(
-                buffer,
-                folder=f"memorials/{self.id}/qr_codes",
-                public_id=f"qr_code_{self.id}",
-                overwrite=True,
-                resource_type="image",
-                format="png"
-            )
-            self.qr_code_public_id = upload_result['public_id']
-            self.qr_code = None
-        except Exception as e:
-            print(f"Failed to upload QR code: {str(e)}")
-            raise
-
-    def get_qr_code_url(self):
-        """Returns full Cloudinary URL for the QR code."""
-        if self.qr_code_public_id:
-            return (
-                "https://res.cloudinary.com/neverforgotten/image/upload/"
-                f"{self.qr_code_public_id}.png"
-            )
-        return None
+    def get_qr_code_url(self, fmt='png'):
+        """Returns the URL of the on-demand QR code for this memorial."""
+        return qr_codes.qr_url(self.pk, fmt)
 
     @property
     def can_upload_to_gallery(self):
@@ -174,6 +213,12 @@ class Tribute(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['memorial', 'created_at', 'id'],
+                name='tribute_memorial_keyset_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Tribute by {self.author_name} for {self.memorial}"
@@ -190,6 +235,8 @@ class GalleryImage(models.Model):
     image = CloudinaryField('image')
     caption = models.CharField(max_length=255, blank=True, null=True)
     order = models.PositiveIntegerField(default=0)
+    # False while a queued upload (MediaUploadJob) is still processing
+    is_ready = models.BooleanField(default=True)
 
     def __str__(self):
         return f"Image for {self.memorial}"
@@ -214,6 +261,12 @@ class Story(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = "Stories"
+        indexes = [
+            models.Index(
+                fields=['memorial', 'created_at', 'id'],
+                name='story_memorial_keyset_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Story: {self.title} by {self.author_name}"
@@ -236,3 +289,109 @@ class ContactMessage(models.Model):
 
     def __str__(self):
         return f"{self.subject} - {self.name}"
+
+
+class MediaUploadJob(models.Model):
+    """
+    Queued upload of a staged file to Cloudinary.
+    Created by the upload views when MEDIA_UPLOAD_ASYNC is enabled and
+    processed by ``manage.py run_media_worker`` (see memorial.media_jobs).
+    """
+    KIND_GALLERY = 'gallery'
+    KIND_PROFILE = 'profile'
+    KIND_AUDIO = 'audio'
+    KIND_CHOICES = [
+        (KIND_GALLERY, 'Gallery image'),
+        (KIND_PROFILE, 'Profile picture'),
+        (KIND_AUDIO, 'Audio'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    memorial = models.ForeignKey(
+        Memorial, on_delete=models.CASCADE, related_name='upload_jobs'
+    )
+    gallery_image = models.ForeignKey(
+        GalleryImage,
+        on_delete=models.SET_NULL,
+        related_name='upload_jobs',
+        null=True,
+        blank=True
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    staged_path = models.CharField(max_length=500)
+    original_name = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(
+                fields=['status', 'created_at'],
+                name='mediajob_status_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} upload for {self.memorial_id}"
+
+
+class MediaCleanupJob(models.Model):
+    """
+    Pending removal of a deleted memorial's Cloudinary media.
+    Queued when a memorial is deleted and drained by
+    ``manage.py run_media_cleanup`` (see memorial.media_cleanup).
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    # Not a foreign key: the memorial is gone by the time this runs
+    memorial_id = models.PositiveBigIntegerField(db_index=True)
+    prefix = models.CharField(max_length=300)
+    # Files stored outside ``prefix``, as {resource_type: [public_id, ...]}
+    public_ids = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    deleted_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(
+                fields=['status', 'next_attempt_at'],
+                name='cleanupjob_status_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Media cleanup for memorial {self.memorial_id}"
@@ -0,0 +1,81 @@
+"""
+Keyset (cursor) pagination for the tribute and story JSON endpoints.
+
+Pages are ordered newest first by ``(created_at, id)``. The cursor handed to
+the client is an opaque token for the last row it received, and the next
+page is fetched with a ``WHERE (created_at, id) < cursor`` filter instead of
+``OFFSET``, so every page costs the same regardless of depth and rows
+inserted while a visitor scrolls never shift the window.
+"""
+
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 3
+MAX_PAGE_SIZE = 20
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded."""
+
+
+def encode_cursor(obj):
+    """Return the opaque cursor token pointing just past ``obj``."""
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor token into a ``(created_at, id)`` tuple."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(token)
+    if created_at is None:
+        raise InvalidCursor(token)
+    return created_at, pk
+
+
+def get_page_size(value):
+    """Clamp a client-requested page size to ``1..MAX_PAGE_SIZE``."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def paginate(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Return one page of ``queryset`` after ``cursor``.
+
+    Args:
+        queryset: QuerySet of rows with ``created_at`` and ``id`` fields
+        cursor: Optional cursor token from a previous page
+        page_size: Number of rows to return
+
+    Returns:
+        tuple: (list of rows, next cursor token or None)
+
+    Raises:
+        InvalidCursor: If ``cursor`` is malformed
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+
+    rows = list(queryset[:page_size + 1])
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,95 @@
+"""
+Phonetic and normalised name keys for fuzzy memorial search.
+
+Each memorial stores, per name, an ASCII-folded lowercase form plus Soundex
+and Metaphone keys (computed with ``jellyfish``) when it is saved. Fuzzy
+lookups compare the search input's keys against those indexed columns, so
+"Catherine" finds "Katherine" and "McDonald" finds "MacDonald" without
+computing any similarity per row at request time.
+"""
+
+import unicodedata
+
+import jellyfish
+from django.db.models import Q
+
+# Name fields that get phonetic keys; middle names are only folded
+PHONETIC_FIELDS = ('first_name', 'last_name')
+FOLDED_FIELDS = ('first_name', 'middle_name', 'last_name')
+
+KEY_FIELDS = tuple(
+    [f'{field}_folded' for field in FOLDED_FIELDS] +
+    [f'{field}_{kind}' for field in PHONETIC_FIELDS
+     for kind in ('soundex', 'metaphone')]
+)
+
+
+def fold(value):
+    """ASCII-fold and lowercase a name, keeping only letters and digits."""
+    normalized = unicodedata.normalize('NFKD', value or '')
+    ascii_value = normalized.encode('ascii', 'ignore').decode('ascii')
+    return ''.join(ch for ch in ascii_value.lower() if ch.isalnum())
+
+
+def soundex(value):
+    """Soundex key of a name, or '' for an empty name."""
+    folded = fold(value)
+    return jellyfish.soundex(folded) if folded else ''
+
+
+def metaphone(value):
+    """Metaphone key of a name, or '' for an empty name."""
+    folded = ''.join(ch for ch in fold(value) if ch.isalpha())
+    return jellyfish.metaphone(folded) if folded else ''
+
+
+def name_keys(memorial):
+    """
+    Compute the stored search keys for a memorial.
+
+    Returns:
+        dict: Model field name -> key value
+    """
+    keys = {}
+    for field in FOLDED_FIELDS:
+        keys[f'{field}_folded'] = fold(getattr(memorial, field))
+    for field in PHONETIC_FIELDS:
+        value = getattr(memorial, field)
+        keys[f'{field}_soundex'] = soundex(value)
+        keys[f'{field}_metaphone'] = metaphone(value)
+    return keys
+
+
+def field_condition(field, value):
+    """Q matching one name field by folded prefix or phonetic key."""
+    folded = fold(value)
+    if not folded:
+        return Q()
+    condition = Q(**{f'{field}_folded__startswith': folded})
+    if field in PHONETIC_FIELDS:
+        if metaphone(value):
+            condition |= Q(**{f'{field}_metaphone': metaphone(value)})
+        condition |= Q(**{f'{field}_soundex': soundex(value)})
+    return condition
+
+
+def fuzzy_filter(queryset, terms=(), fields=None):
+    """
+    Narrow a memorial queryset to fuzzy name matches.
+
+    Args:
+        queryset: Memorial queryset
+        terms: Free-text words, each matched against any name field
+        fields: Mapping of name field -> text matched against that field
+
+    Returns:
+        QuerySet: The filtered queryset
+    """
+    for term in terms:
+        condition = Q()
+        for field in FOLDED_FIELDS:
+            condition |= field_condition(field, term)
+        queryset = queryset.filter(condition)
+    for field, value in (fields or {}).items():
+        queryset = queryset.filter(field_condition(field, value))
+    return queryset
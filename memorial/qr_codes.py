@@ -0,0 +1,107 @@
+"""
+QR codes for memorial pages.
+
+Codes are rendered on demand by the ``memorial_qr`` view as PNG or SVG for
+``SITE_URL/memorials/<pk>/``, so nothing is generated or uploaded when a
+memorial is created. Rendered bytes are kept in a per-process LRU cache,
+and responses carry a strong ETag derived from the rendering inputs.
+
+Links include ``?v=<version>``, a hash of ``SITE_URL``. A request for the
+current version can be cached as immutable; a new ``SITE_URL`` changes
+every link instead of leaving stale codes in browser caches.
+"""
+
+import hashlib
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.urls import reverse
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+# Requested PNG width in pixels; large sizes serve high-DPI print work
+DEFAULT_SIZE = 400
+MIN_SIZE = 100
+MAX_SIZE = 4000
+
+BORDER = 4
+CACHE_SIZE = 256
+
+# Bump when rendering changes so clients drop previously cached codes
+RENDER_VERSION = 1
+
+
+def target_url(memorial_id):
+    """Return the memorial page URL encoded in its QR code."""
+    return f"{settings.SITE_URL}/memorials/{memorial_id}/"
+
+
+def version():
+    """Short token identifying the current SITE_URL and renderer."""
+    return hashlib.sha256(
+        f"{RENDER_VERSION}|{settings.SITE_URL}".encode()
+    ).hexdigest()[:12]
+
+
+def qr_url(memorial_id, fmt='png', size=None):
+    """Return the versioned URL of a memorial's QR code."""
+    url = reverse(
+        'memorials:memorial_qr', kwargs={'pk': memorial_id, 'fmt': fmt}
+    )
+    url += f"?v={version()}"
+    if size:
+        url += f"&size={size}"
+    return url
+
+
+def parse_size(value):
+    """
+    Validate a requested size, falling back to DEFAULT_SIZE.
+
+    Raises:
+        ValueError: If the size is not a whole number
+    """
+    if not value:
+        return DEFAULT_SIZE
+    return min(max(int(value), MIN_SIZE), MAX_SIZE)
+
+
+def etag(memorial_id, fmt, size):
+    """Strong ETag for a rendered code, computed without rendering it."""
+    return hashlib.sha256(
+        f"{RENDER_VERSION}|{target_url(memorial_id)}|{fmt}|{size}".encode()
+    ).hexdigest()[:32]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def render(url, fmt, size):
+    """
+    Render a QR code for ``url``.
+
+    Args:
+        url: Data to encode
+        fmt: 'png' or 'svg'
+        size: Approximate PNG width in pixels; SVGs are resolution-free
+
+    Returns:
+        bytes: The encoded image
+    """
+    qr = qrcode.QRCode(border=BORDER)
+    qr.add_data(url)
+    qr.make(fit=True)
+    qr.box_size = max(1, size // (qr.modules_count + 2 * BORDER))
+
+    if fmt == 'svg':
+        image = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+    else:
+        image = qr.make_image()
+
+    buffer = BytesIO()
+    image.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,91 @@
+"""
+Reconciliation of Cloudinary media against the database.
+
+Failed uploads and cleanup errors leave assets in Cloudinary that no
+memorial points at. ``manage.py reconcile_media`` finds them by streaming
+the media listing under ``memorials/`` a page at a time and checking
+each asset against the set of public ids the database references. Only
+that set and the orphans found are held in memory; the listing is never
+collected.
+"""
+
+import os
+import re
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import media
+from .models import GalleryImage, Memorial
+
+RESOURCE_TYPES = media.RESOURCE_TYPES
+DEFAULT_PREFIX = 'memorials/'
+MAX_PAGE_SIZE = media.MAX_PAGE_SIZE
+
+_UPLOAD_PATH_RE = re.compile(r'(?:^|/)upload/(?:v\d+/)?(?P<public_id>.+)$')
+# URLs handed out by media.LocalBackend
+_LOCAL_PATH_RE = re.compile(
+    r'(?:^|/)media/local/(?:image|video|raw)/(?P<public_id>.+)$'
+)
+
+
+def normalize_public_id(value):
+    """
+    Return the public ids a stored reference may point at.
+
+    References are stored as bare public ids, Cloudinary or local backend
+    delivery URLs or ``CloudinaryField`` values; raw assets keep their
+    extension in the public id while images and video drop it, so both
+    forms are returned.
+    """
+    value = str(value or '').split('?')[0]
+    if not value:
+        return ()
+    match = _UPLOAD_PATH_RE.search(value) or _LOCAL_PATH_RE.search(value)
+    public_id = match.group('public_id') if match else value
+    stem, ext = os.path.splitext(public_id)
+    return (public_id, stem) if ext else (public_id,)
+
+
+def referenced_public_ids(chunk_size=2000):
+    """
+    Build the set of public ids referenced by memorials and galleries.
+
+    All reference columns are read in one streaming UNION query.
+    """
+    references = Memorial.objects.values_list(
+        'profile_public_id', flat=True
+    ).union(
+        Memorial.objects.values_list('audio_public_id', flat=True),
+        Memorial.objects.values_list('qr_code_public_id', flat=True),
+        Memorial.objects.values_list('profile_picture', flat=True),
+        GalleryImage.objects.values_list('image', flat=True),
+    )
+    referenced = set()
+    for value in references.iterator(chunk_size=chunk_size):
+        referenced.update(normalize_public_id(value))
+    return referenced
+
+
+def find_orphans(prefix=DEFAULT_PREFIX, min_age=timedelta(hours=24),
+                 page_size=MAX_PAGE_SIZE, referenced=None):
+    """
+    Yield (resource_type, public_id, bytes) for unreferenced assets.
+
+    Assets younger than ``min_age`` are skipped so uploads that have not
+    been recorded yet are never reported.
+    """
+    if referenced is None:
+        referenced = referenced_public_ids()
+    cutoff = timezone.now() - min_age
+
+    for resource_type in RESOURCE_TYPES:
+        for resource in media.list_prefix(prefix, resource_type, page_size):
+            public_id = resource['public_id']
+            if public_id in referenced:
+                continue
+            created_at = parse_datetime(resource.get('created_at') or '')
+            if created_at and created_at > cutoff:
+                continue
+            yield resource_type, public_id, resource.get('bytes', 0)
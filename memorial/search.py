@@ -0,0 +1,244 @@
+"""
+Full-text search index for memorials.
+
+Memorial names are mirrored into a dedicated ``memorial_search_index`` table
+that is kept in sync from the model signals in ``memorial.signals``:
+
+- On PostgreSQL it holds a weighted ``tsvector`` (GIN indexed) plus the plain
+  names with a ``pg_trgm`` GIN index for misspelling-tolerant matching.
+- On SQLite it is an FTS5 virtual table keyed by the memorial id.
+
+Searches hit the index rather than scanning ``Memorial`` with
+``LIKE '%x%'``, return results ranked by relevance, match name prefixes and
+can be narrowed by birth/death year ranges. Phonetic matches from the keys in
+``memorial.phonetics`` are appended after the ranked hits. The number of ids
+is capped at ``MAX_RESULTS`` so pagination never counts the whole table;
+callers ask for one more to tell the user when results were cut off.
+"""
+
+import re
+from datetime import date
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from . import phonetics
+
+INDEX_TABLE = 'memorial_search_index'
+MAX_RESULTS = 500
+
+NAME_FIELDS = ('first_name', 'middle_name', 'last_name')
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split search input into lowercase word terms."""
+    return [term.lower() for term in _TERM_RE.findall(text or '')]
+
+
+class SQLiteSearchBackend:
+    """FTS5 search index used for local development and tests."""
+
+    def index(self, cursor, memorial):
+        cursor.execute(
+            f"DELETE FROM {INDEX_TABLE} WHERE rowid = %s", [memorial.pk]
+        )
+        cursor.execute(
+            f"INSERT INTO {INDEX_TABLE} "
+            "(rowid, first_name, middle_name, last_name) "
+            "VALUES (%s, %s, %s, %s)",
+            [memorial.pk] + [getattr(memorial, f) or '' for f in NAME_FIELDS]
+        )
+
+    def remove(self, cursor, memorial_id):
+        cursor.execute(
+            f"DELETE FROM {INDEX_TABLE} WHERE rowid = %s", [memorial_id]
+        )
+
+    def build_query(self, text, fields):
+        # Matching the whole word as well as the prefix ranks exact hits first
+        clauses = [f'("{term}" OR "{term}"*)' for term in tokenize(text)]
+        for field, value in fields.items():
+            clauses.extend(
+                f'{field} : ("{term}" OR "{term}"*)'
+                for term in tokenize(value)
+            )
+        return ' AND '.join(clauses)
+
+    def match_ids(self, query, text, fields):
+        return RawSQL(
+            f"SELECT rowid FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s",
+            [query]
+        )
+
+    def rank(self, query, text):
+        # bm25() is lower-is-better, negate it so higher ranks first
+        return RawSQL(
+            f"SELECT -bm25({INDEX_TABLE}) FROM {INDEX_TABLE} "
+            f"WHERE {INDEX_TABLE} MATCH %s "
+            f"AND rowid = memorial_memorial.id",
+            [query]
+        )
+
+
+class PostgresSearchBackend:
+    """tsvector + trigram search index used in production."""
+
+    # Field weights let a single tsvector answer per-field prefix queries
+    weights = {'first_name': 'A', 'middle_name': 'B', 'last_name': 'C'}
+
+    def index(self, cursor, memorial):
+        values = [getattr(memorial, f) or '' for f in NAME_FIELDS]
+        document = ' || '.join(
+            f"setweight(to_tsvector('simple', %s), '{self.weights[f]}')"
+            for f in NAME_FIELDS
+        )
+        cursor.execute(
+            f"INSERT INTO {INDEX_TABLE} (memorial_id, document, names) "
+            f"VALUES (%s, {document}, %s) "
+            "ON CONFLICT (memorial_id) DO UPDATE "
+            "SET document = EXCLUDED.document, names = EXCLUDED.names",
+            [memorial.pk] + values + [' '.join(v for v in values if v).lower()]
+        )
+
+    def remove(self, cursor, memorial_id):
+        cursor.execute(
+            f"DELETE FROM {INDEX_TABLE} WHERE memorial_id = %s",
+            [memorial_id]
+        )
+
+    def build_query(self, text, fields):
+        # Matching the whole word as well as the prefix ranks exact hits first
+        clauses = [f"({term} | {term}:*)" for term in tokenize(text)]
+        for field, value in fields.items():
+            weight = self.weights[field]
+            clauses.extend(
+                f"({term}:{weight} | {term}:*{weight})"
+                for term in tokenize(value)
+            )
+        return ' & '.join(clauses)
+
+    def match_ids(self, query, text, fields):
+        sql = (
+            f"SELECT memorial_id FROM {INDEX_TABLE} "
+            "WHERE document @@ to_tsquery('simple', %s)"
+        )
+        params = [query]
+        if tokenize(text):
+            # Misspelt free text may match by trigram, but only among
+            # memorials that still satisfy the per-field filters
+            field_query = self.build_query('', fields)
+            if field_query:
+                sql += (
+                    " OR (names %% %s "
+                    "AND document @@ to_tsquery('simple', %s))"
+                )
+                params.extend([text.lower(), field_query])
+            else:
+                sql += " OR names %% %s"
+                params.append(text.lower())
+        return RawSQL(sql, params)
+
+    def rank(self, query, text):
+        return RawSQL(
+            "SELECT ts_rank(document, to_tsquery('simple', %s)) "
+            "+ similarity(names, %s) "
+            f"FROM {INDEX_TABLE} WHERE memorial_id = memorial_memorial.id",
+            [query, text.lower()]
+        )
+
+
+def get_backend(using=None):
+    """Return the search backend for the current database, if any."""
+    vendor = (using or connection).vendor
+    if vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    return None
+
+
+def index_memorial(memorial):
+    """Insert or refresh a memorial's entry in the search index."""
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.index(cursor, memorial)
+
+
+def remove_memorial(memorial_id):
+    """Remove a memorial from the search index."""
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.remove(cursor, memorial_id)
+
+
+def year_range_filters(birth_from=None, birth_to=None,
+                       death_from=None, death_to=None):
+    """Build ORM filters for birth/death year ranges (inclusive)."""
+    filters = {}
+    if birth_from:
+        filters['date_of_birth__gte'] = date(birth_from, 1, 1)
+    if birth_to:
+        filters['date_of_birth__lte'] = date(birth_to, 12, 31)
+    if death_from:
+        filters['date_of_death__gte'] = date(death_from, 1, 1)
+    if death_to:
+        filters['date_of_death__lte'] = date(death_to, 12, 31)
+    return filters
+
+
+def search_memorials(queryset, text='', fields=None, limit=MAX_RESULTS,
+                     **year_ranges):
+    """
+    Return up to ``limit`` memorial ids matching a search, best match first.
+
+    Args:
+        queryset: Memorial queryset to search within
+        text: Free text matched against every name field
+        fields: Mapping of name field -> text matched against that field
+        limit: Maximum number of ids returned
+        **year_ranges: birth_from, birth_to, death_from, death_to years
+
+    Returns:
+        list: Memorial ids ordered by relevance
+    """
+    fields = {f: v for f, v in (fields or {}).items() if tokenize(v)}
+    queryset = queryset.filter(**year_range_filters(**year_ranges))
+    backend = get_backend()
+
+    if not tokenize(text) and not fields:
+        ids = queryset.order_by('-created_at').values_list('id', flat=True)
+        return list(ids[:limit])
+
+    if backend is None:
+        # No index on this database: fall back to substring matching
+        ranked = queryset
+        for term in tokenize(text):
+            ranked = ranked.filter(
+                Q(first_name__icontains=term) |
+                Q(middle_name__icontains=term) |
+                Q(last_name__icontains=term)
+            )
+        for field, value in fields.items():
+            ranked = ranked.filter(**{f"{field}__icontains": value})
+        ranked = ranked.order_by('-created_at')
+    else:
+        query = backend.build_query(text, fields)
+        ranked = queryset.filter(
+            id__in=backend.match_ids(query, text, fields)
+        ).annotate(
+            search_rank=backend.rank(query, text)
+        ).order_by('-search_rank', '-created_at')
+
+    ids = list(ranked.values_list('id', flat=True)[:limit])
+    if len(ids) < limit:
+        # Sounds-alike names the full-text index cannot match
+        fuzzy = phonetics.fuzzy_filter(
+            queryset, terms=tokenize(text), fields=fields
+        ).exclude(id__in=ids).order_by('-created_at')
+        ids.extend(fuzzy.values_list('id', flat=True)[:limit - len(ids)])
+    return ids
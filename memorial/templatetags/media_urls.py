@@ -0,0 +1,167 @@
+"""
+Responsive Cloudinary image URLs for memorial templates.
+
+Usage::
+
+    {% load media_urls %}
+    <img {% image_attrs memorial.profile_public_id 'card' %} alt="...">
+    <img src="{{ image.image|image_url:'lightbox' }}" alt="...">
+    <source src="{% audio_url memorial %}" type="audio/mpeg">
+
+``image_attrs`` emits ``src``, ``srcset`` and ``sizes`` attributes for one
+of the named ``PRESETS``. Every candidate is served with ``f_auto,q_auto``
+so browsers receive WebP/AVIF at a width that matches the slot the image
+is shown in, instead of the full-size original.
+
+Sources may be a public id, a ``CloudinaryResource`` or a full Cloudinary
+delivery URL (gallery images store their ``secure_url``). Anything that is
+not a Cloudinary image is passed through unchanged as a plain ``src``, and
+with a backend that cannot transform images (``MEDIA_BACKEND=local``) every
+source becomes a plain ``src``. ``audio_url`` resolves a memorial's music
+through the configured backend in the same way.
+"""
+
+import re
+from urllib.parse import urlparse
+
+from cloudinary import CloudinaryImage, CloudinaryResource
+from django import template
+from django.utils.html import format_html
+
+from memorial import media
+
+register = template.Library()
+
+# Width breakpoints (px) and layout hints for each kind of image slot
+PRESETS = {
+    # Gallery grid: three columns on desktop, full width on phones
+    'thumb': {
+        'widths': (320, 480, 640, 960),
+        'sizes': '(max-width: 767px) 100vw, 33vw',
+        'crop': 'limit',
+    },
+    # Square face-centred crops on browse and home page cards
+    'card': {
+        'widths': (200, 400, 600),
+        'sizes': '180px',
+        'crop': 'fill',
+        'gravity': 'face',
+        'square': True,
+    },
+    # Profile picture on the memorial page
+    'hero': {
+        'widths': (200, 400, 600),
+        'sizes': '200px',
+        'crop': 'fill',
+        'gravity': 'face',
+        'square': True,
+    },
+    # Enlarged views in the profile and gallery modals
+    'lightbox': {
+        'widths': (640, 1024, 1600, 2048),
+        'sizes': '(max-width: 1200px) 100vw, 1140px',
+        'crop': 'limit',
+    },
+}
+
+_DELIVERY_PATH_RE = re.compile(
+    r'/image/upload/(?:v(?P<version>\d+)/)?(?P<public_id>.+?)(?:\.\w+)?$'
+)
+
+
+def source_url(source):
+    """Return a source as stored, restoring a resource's extension."""
+    if isinstance(source, CloudinaryResource) and source.format:
+        return f"{source.public_id}.{source.format}"
+    return str(source or '')
+
+
+def parse_source(source):
+    """
+    Resolve an image source to its Cloudinary public id and version.
+
+    Returns:
+        tuple: (public_id, version), or (None, None) if ``source`` is not
+        a Cloudinary image
+    """
+    version = None
+    if isinstance(source, CloudinaryResource):
+        version = source.version
+        source = source.public_id
+    source = str(source or '')
+
+    if source.startswith('/'):
+        # A site-relative URL, such as a locally stored file
+        return None, None
+    if '://' not in source:
+        return (source or None), version
+
+    match = _DELIVERY_PATH_RE.search(urlparse(source).path)
+    if not match:
+        return None, None
+    return match.group('public_id'), match.group('version') or version
+
+
+def build_url(public_id, preset, width, version=None):
+    """Return the delivery URL of ``public_id`` at one preset width."""
+    options = PRESETS[preset]
+    transformation = {
+        'width': width,
+        'crop': options['crop'],
+        'fetch_format': 'auto',
+        'quality': 'auto',
+    }
+    if options.get('square'):
+        transformation['height'] = width
+    if options.get('gravity'):
+        transformation['gravity'] = options['gravity']
+    return CloudinaryImage(public_id, version=version).build_url(
+        secure=True, **transformation
+    )
+
+
+@register.simple_tag
+def image_attrs(source, preset, version=None):
+    """Emit ``src``/``srcset``/``sizes`` attributes for an image preset."""
+    if preset not in PRESETS:
+        raise template.TemplateSyntaxError(f"Unknown image preset '{preset}'")
+
+    public_id, stored_version = parse_source(source)
+    if public_id is None:
+        return format_html('src="{}"', source_url(source))
+
+    version = version or stored_version
+    if not media.get_backend().supports_transformations:
+        return format_html('src="{}"', media.url(public_id, version=version))
+
+    widths = PRESETS[preset]['widths']
+    srcset = ', '.join(
+        f"{build_url(public_id, preset, width, version)} {width}w"
+        for width in widths
+    )
+    return format_html(
+        'src="{}" srcset="{}" sizes="{}"',
+        build_url(public_id, preset, widths[len(widths) // 2], version),
+        srcset,
+        PRESETS[preset]['sizes'],
+    )
+
+
+@register.filter
+def image_url(source, preset):
+    """Return the largest preset URL for a single-URL context."""
+    public_id, version = parse_source(source)
+    if public_id is None:
+        return source_url(source)
+    if not media.get_backend().supports_transformations:
+        return media.url(public_id, version=version)
+    return build_url(public_id, preset, PRESETS[preset]['widths'][-1], version)
+
+
+@register.simple_tag
+def audio_url(memorial):
+    """Return the URL of a memorial's audio file."""
+    if memorial.audio_public_id:
+        return media.url(memorial.audio_public_id, resource_type='video')
+    # Files uploaded before public ids were recorded
+    return memorial.audio_file.url if memorial.audio_file else ''
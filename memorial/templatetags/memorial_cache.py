@@ -0,0 +1,64 @@
+"""
+Template tags for caching public memorial page fragments.
+
+Usage::
+
+    {% load memorial_cache %}
+    {% memorial_fragment 'tributes' memorial %}
+      ...
+    {% endmemorial_fragment %}
+
+Fragments are only cached for anonymous visitors. Signed-in users may see
+owner or author controls inside a fragment, so they always get a fresh render
+and never read or write the shared cache.
+"""
+
+from django import template
+
+from memorial.cache import (
+    FRAGMENT_TIMEOUT, cache_get, cache_set, memorial_namespace
+)
+
+register = template.Library()
+
+
+class MemorialFragmentNode(template.Node):
+    """Renders its body once per memorial version for anonymous visitors."""
+
+    def __init__(self, nodelist, fragment_name, memorial):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.memorial = memorial
+
+    def render(self, context):
+        request = context.get('request')
+        if request is None or request.user.is_authenticated:
+            return self.nodelist.render(context)
+
+        memorial = self.memorial.resolve(context)
+        name = self.fragment_name.resolve(context)
+        namespace = memorial_namespace(memorial.pk)
+        key = f"fragment:{name}"
+
+        value = cache_get(namespace, key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache_set(namespace, key, value, FRAGMENT_TIMEOUT)
+        return value
+
+
+@register.tag
+def memorial_fragment(parser, token):
+    """Cache the enclosed block per memorial for anonymous visitors."""
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires a fragment name and a memorial."
+        )
+    nodelist = parser.parse(('endmemorial_fragment',))
+    parser.delete_first_token()
+    return MemorialFragmentNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+    )
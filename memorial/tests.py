@@ -1,3 +1,1478 @@
-from django.test import TestCase
+import asyncio
+import os
+import re
+import tempfile
+import time
+from io import BytesIO, StringIO
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template, TemplateSyntaxError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from plans.models import Plan
+from . import (
+    aio, cache as memorial_cache, imaging, media, media_cleanup, media_jobs,
+    reconcile, search
+)
+from .models import (
+    Memorial, GalleryImage, MediaCleanupJob, MediaUploadJob, Tribute
+)
+from .pagination import MAX_PAGE_SIZE
+from .templatetags.media_urls import PRESETS, parse_source
+
+
+def image_upload(name, size=(64, 48), exif=None):
+    """Return an uploaded JPEG of the given size."""
+    buffer = BytesIO()
+    Image.new('RGB', size, 'navy').save(buffer, 'JPEG', exif=exif or b'')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+class QueryBudgetMixin:
+    """Helpers for asserting a page stays within a fixed query budget."""
+
+    def assertQueryBudget(self, budget, url, user=None):
+        """
+        GET ``url`` and fail if it runs more than ``budget`` queries.
+
+        Args:
+            budget: Maximum number of queries allowed
+            url: URL to request
+            user: Optional user to log in before the request
+
+        Returns:
+            The response, for further assertions
+        """
+        if user is not None:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        executed = "\n".join(q['sql'] for q in ctx.captured_queries)
+        self.assertLessEqual(
+            len(ctx), budget,
+            f"{url} ran {len(ctx)} queries (budget {budget}):\n{executed}"
+        )
+        return response
+
+
+class MemorialPageTestCase(QueryBudgetMixin, TestCase):
+    """Base case with one memorial and helpers to add page content."""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com')
+        self.plan = Plan.objects.create(name='premium', price=5)
+        self.memorial = Memorial(
+            user=self.owner,
+            plan=self.plan,
+            first_name='Ada',
+            last_name='Lovelace',
+            date_of_birth=date(1815, 12, 10),
+        )
+        self.memorial.save()
+        self.url = reverse(
+            'memorials:memorial_detail', kwargs={'pk': self.memorial.pk}
+        )
+
+    def add_content(self, count):
+        for i in range(count):
+            self.memorial.tributes.create(
+                user=self.owner, author_name=f'Author {i}', message='Hi'
+            )
+            self.memorial.stories.create(
+                user=self.owner,
+                author_name=f'Author {i}',
+                title=f'Story {i}',
+                content='Once upon a time',
+            )
+            GalleryImage.objects.create(
+                memorial=self.memorial, image=f'gallery/{i}', order=i
+            )
+
+
+class MemorialDetailQueryTests(MemorialPageTestCase):
+    """The memorial page must load in a constant number of queries."""
+
+    # memorial (+plan, +user), tributes, stories, gallery
+    ANONYMOUS_BUDGET = 4
+    # session + user lookups on top of the anonymous budget
+    OWNER_BUDGET = ANONYMOUS_BUDGET + 2
+
+    def test_anonymous_budget_is_constant(self):
+        self.add_content(2)
+        self.assertQueryBudget(self.ANONYMOUS_BUDGET, self.url)
+        self.add_content(8)
+        response = self.assertQueryBudget(self.ANONYMOUS_BUDGET, self.url)
+        self.assertContains(response, 'Story 7')
+
+    def test_owner_budget_is_constant(self):
+        self.add_content(10)
+        response = self.assertQueryBudget(
+            self.OWNER_BUDGET, self.url, user=self.owner
+        )
+        self.assertContains(response, 'data-message="Hi"')
+
+
+class MemorialFragmentCacheTests(MemorialPageTestCase):
+    """Fragments are cached for visitors and invalidated by signals."""
+
+    def test_cached_fragments_skip_prefetches(self):
+        self.add_content(3)
+        self.client.get(self.url)
+        self.assertQueryBudget(1, self.url)
+
+    def test_new_tribute_invalidates_fragment(self):
+        self.assertNotContains(self.client.get(self.url), 'Fresh tribute')
+        self.memorial.tributes.create(author_name='Fresh tribute', message='x')
+        self.assertContains(self.client.get(self.url), 'Fresh tribute')
+
+    def test_memorial_update_invalidates_fragment(self):
+        self.client.get(self.url)
+        self.memorial.biography = 'A brand new biography'
+        self.memorial.save()
+        self.assertContains(self.client.get(self.url), 'A brand new biography')
+
+    def test_owner_controls_never_cached(self):
+        self.add_content(1)
+        first_visit = self.client.get(self.url)
+        self.client.force_login(self.owner)
+        self.assertContains(self.client.get(self.url), 'data-message="Hi"')
+        self.client.logout()
+        visitor_response = self.client.get(self.url)
+        self.assertNotContains(visitor_response, 'data-message="Hi"')
+        self.assertNotContains(first_visit, 'data-message="Hi"')
+
+
+class KeysetPaginationTests(MemorialPageTestCase):
+    """Tribute and story endpoints page by cursor instead of offset."""
+
+    def setUp(self):
+        super().setUp()
+        self.tributes_url = reverse(
+            'memorials:get_tributes', kwargs={'pk': self.memorial.pk}
+        )
+        now = timezone.now()
+        for i in range(7):
+            # Two rows share each timestamp to exercise the id tiebreak
+            self.memorial.tributes.create(
+                author_name=f'Author {i}',
+                message='Hi',
+                created_at=now - timedelta(minutes=i // 2),
+            )
+
+    def collect_pages(self, **params):
+        ids, cursor = [], None
+        while True:
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(self.tributes_url, params).json()
+            ids.extend(t['id'] for t in data['tributes'])
+            cursor = data['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_walks_every_row_once_in_order(self):
+        expected = list(
+            self.memorial.tributes.order_by('-created_at', '-id')
+            .values_list('id', flat=True)
+        )
+        self.assertEqual(self.collect_pages(), expected)
+        self.assertEqual(self.collect_pages(limit=2), expected)
+
+    def test_new_rows_do_not_shift_the_window(self):
+        first = self.client.get(self.tributes_url).json()
+        self.memorial.tributes.create(author_name='Late', message='Hi')
+        second = self.client.get(
+            self.tributes_url, {'cursor': first['next_cursor']}
+        ).json()
+        first_ids = {t['id'] for t in first['tributes']}
+        self.assertFalse(first_ids & {t['id'] for t in second['tributes']})
+        self.assertEqual(len(second['tributes']), 3)
+
+    def test_page_size_is_capped(self):
+        Tribute.objects.bulk_create(
+            Tribute(memorial=self.memorial, author_name='More', message='Hi')
+            for _ in range(MAX_PAGE_SIZE)
+        )
+        data = self.client.get(self.tributes_url, {'limit': 10000}).json()
+        self.assertEqual(len(data['tributes']), MAX_PAGE_SIZE)
+        self.assertTrue(data['has_more'])
+
+    def test_detail_page_links_to_older_tributes(self):
+        with mock.patch('memorial.views.DETAIL_TRIBUTE_LIMIT', 5):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['tributes']), 5)
+        cursor = str(response.context['older_tributes_cursor'])
+        self.assertContains(response, f'data-cursor="{cursor}"')
+
+        data = self.client.get(self.tributes_url, {'cursor': cursor}).json()
+        shown = {t.id for t in response.context['tributes']}
+        older = {t['id'] for t in data['tributes']}
+        self.assertEqual(len(older), 2)
+        self.assertFalse(shown & older)
+
+    def test_detail_page_without_older_tributes(self):
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context['tributes']), 7)
+        self.assertFalse(response.context['older_tributes_cursor'])
+        self.assertNotContains(response, 'id="older-tributes"')
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.tributes_url, {'cursor': 'nope!'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stories_endpoint(self):
+        self.add_content(4)
+        url = reverse('memorials:get_stories', kwargs={'pk': self.memorial.pk})
+        data = self.client.get(url, {'limit': 3}).json()
+        self.assertEqual(len(data['stories']), 3)
+        data = self.client.get(url, {'cursor': data['next_cursor']}).json()
+        self.assertEqual(len(data['stories']), 1)
+        self.assertFalse(data['has_more'])
+
+
+class MemorialSearchTests(MemorialPageTestCase):
+    """browse_memorials searches through the full-text index."""
+
+    def setUp(self):
+        super().setUp()
+        self.browse_url = reverse('memorials:browse')
+        self.make('Adaline', 'Byron', date(1900, 1, 1), date(1950, 1, 1))
+        self.make('Charles', 'Babbage', date(1791, 12, 26), date(1871, 10, 18))
+
+    def make(self, first_name, last_name, born, died=None):
+        memorial = Memorial(
+            user=self.owner,
+            first_name=first_name,
+            last_name=last_name,
+            date_of_birth=born,
+            date_of_death=died,
+        )
+        memorial.save()
+        return memorial
+
+    def found(self, **params):
+        response = self.client.get(self.browse_url, params)
+        return [m.first_name for m in response.context['memorials']]
+
+    def test_prefix_match_on_field(self):
+        self.assertEqual(self.found(first_name='Ada'), ['Ada', 'Adaline'])
+        self.assertEqual(self.found(last_name='babb'), ['Charles'])
+
+    def test_free_text_ranks_exact_match_first(self):
+        self.assertEqual(self.found(q='ada')[0], 'Ada')
+
+    def test_year_ranges(self):
+        self.assertEqual(
+            self.found(first_name='ada', born_from=1850), ['Adaline']
+        )
+        self.assertEqual(self.found(died_to=1900), ['Charles'])
+
+    def test_rename_updates_index(self):
+        self.memorial.first_name = 'Augusta'
+        self.memorial.save()
+        self.assertEqual(self.found(first_name='Augus'), ['Augusta'])
+        self.assertEqual(self.found(first_name='Ada'), ['Adaline'])
+
+    def test_phonetic_matches_follow_ranked_hits(self):
+        self.make('Katherine', 'MacDonald', date(1920, 5, 1))
+        self.assertEqual(self.found(first_name='Catherine'), ['Katherine'])
+        self.assertEqual(self.found(last_name='McDonald'), ['Katherine'])
+        self.assertEqual(self.found(q='kathryn mcdonald'), ['Katherine'])
+
+    def test_backfill_name_keys(self):
+        Memorial.objects.update(first_name_metaphone='', last_name_soundex='')
+        call_command('backfill_name_keys', batch_size=2, stdout=StringIO())
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.first_name_metaphone, 'AT')
+        self.assertEqual(self.memorial.last_name_soundex, 'L142')
+
+    def test_truncated_results_are_flagged(self):
+        with mock.patch('memorial.search.MAX_RESULTS', 1):
+            response = self.client.get(self.browse_url, {'first_name': 'a'})
+        self.assertTrue(response.context['truncated'])
+        self.assertEqual(len(response.context['memorials']), 1)
+        self.assertContains(response, 'Showing the first 1 matches')
+
+        response = self.client.get(self.browse_url, {'first_name': 'ada'})
+        self.assertFalse(response.context['truncated'])
+        self.assertNotContains(response, 'Showing the first')
+
+
+class PostgresSearchBackendTests(SimpleTestCase):
+    """The trigram fallback never widens the per-field filters."""
+
+    def setUp(self):
+        self.backend = search.PostgresSearchBackend()
+
+    def match(self, text, fields):
+        query = self.backend.build_query(text, fields)
+        return self.backend.match_ids(query, text, fields)
+
+    def test_trigram_match_keeps_field_filters(self):
+        sql = self.match('ada', {'last_name': 'lovelace'})
+        self.assertIn(
+            "OR (names %% %s AND document @@ to_tsquery('simple', %s))",
+            sql.sql
+        )
+        self.assertEqual(sql.params[1:], [
+            'ada', '(lovelace:C | lovelace:*C)'
+        ])
+
+    def test_trigram_match_without_field_filters(self):
+        sql = self.match('ada', {})
+        self.assertTrue(sql.sql.endswith(' OR names %% %s'))
+        self.assertEqual(sql.params, ['(ada | ada:*)', 'ada'])
+
+    def test_fields_only_skip_trigram_match(self):
+        sql = self.match('', {'first_name': 'ada'})
+        self.assertNotIn('names', sql.sql)
+        self.assertEqual(sql.params, ['(ada:A | ada:*A)'])
+
+
+class MediaUploadJobTests(MemorialPageTestCase):
+    """Uploads are staged and pushed to Cloudinary by the media worker."""
+
+    def setUp(self):
+        super().setUp()
+        staging = tempfile.TemporaryDirectory()
+        self.addCleanup(staging.cleanup)
+        settings_override = override_settings(
+            MEDIA_UPLOAD_ASYNC=True,
+            MEDIA_UPLOAD_STAGING_DIR=staging.name,
+            MEDIA_UPLOAD_MAX_ATTEMPTS=2,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch('memorial.media.upload', return_value={
+            'public_id': 'memorials/1/gallery/photo',
+            'secure_url': 'https://res.cloudinary.com/demo/photo.jpg',
+        })
+        self.upload = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.owner)
+
+    def post_gallery(self, count):
+        files = [image_upload(f'photo{i}.jpg') for i in range(count)]
+        return self.client.post(
+            reverse('memorials:upload_gallery_images', args=[self.memorial.pk]),
+            {'images': files},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+
+    def run_worker(self):
+        call_command(
+            'run_media_worker', once=True, concurrency=1,
+            stdout=StringIO(), stderr=StringIO()
+        )
+
+    def test_gallery_upload_is_queued_then_processed(self):
+        response = self.post_gallery(2)
+        self.assertEqual(response.status_code, 202)
+        jobs = response.json()['jobs']
+        self.assertEqual(len(jobs), 2)
+        self.upload.assert_not_called()
+        self.assertEqual(self.memorial.gallery.filter(is_ready=False).count(), 2)
+        self.assertNotContains(self.client.get(self.url), 'photo.jpg')
+
+        self.run_worker()
+
+        self.assertEqual(self.upload.call_count, 2)
+        self.assertEqual(self.memorial.gallery.filter(is_ready=True).count(), 2)
+        status = self.client.get(jobs[0]['status_url']).json()
+        self.assertEqual(status['status'], MediaUploadJob.STATUS_DONE)
+        self.assertEqual(status['result']['url'], self.upload.return_value['secure_url'])
+        for job in MediaUploadJob.objects.all():
+            self.assertFalse(os.path.exists(job.staged_path))
+
+    def test_failed_upload_is_retried_then_dropped(self):
+        self.upload.side_effect = RuntimeError('Cloudinary is down')
+        self.post_gallery(1)
+        self.run_worker()
+
+        job = MediaUploadJob.objects.get()
+        self.assertEqual(job.status, MediaUploadJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('Cloudinary is down', job.error)
+        self.assertFalse(self.memorial.gallery.exists())
+
+    def test_invalid_image_is_not_retried(self):
+        data = image_upload('photo.jpg', size=(400, 300)).read()
+        self.client.post(
+            reverse('memorials:upload_gallery_images', args=[self.memorial.pk]),
+            {'images': [SimpleUploadedFile(
+                'photo.jpg', data[:len(data) // 2], 'image/jpeg'
+            )]},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.run_worker()
+
+        job = MediaUploadJob.objects.get()
+        self.assertEqual(job.status, MediaUploadJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('Invalid image', job.error)
+        self.upload.assert_not_called()
+
+    def test_profile_upload_status_is_private(self):
+        response = self.client.post(
+            reverse('memorials:upload_profile_picture', args=[self.memorial.pk]),
+            {'profile_picture': image_upload('me.jpg')},
+        )
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()['status_url']
+        self.assertEqual(
+            self.client.get(status_url).json()['status'],
+            MediaUploadJob.STATUS_PENDING
+        )
+
+        other = User.objects.create_user('other', 'other@example.com')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+
+
+class ConcurrentGalleryUploadTests(MemorialPageTestCase):
+    """Synchronous gallery uploads run in parallel and report per file."""
+
+    def setUp(self):
+        super().setUp()
+        self.plan.allow_gallery = True
+        self.plan.save()
+        self.upload_url = reverse(
+            'memorials:upload_gallery_images', args=[self.memorial.pk]
+        )
+        self.client.force_login(self.owner)
+
+    def fake_upload(self, file, **options):
+        if file.name.startswith('bad'):
+            raise RuntimeError('Invalid image file')
+        return {
+            'public_id': file.name,
+            'secure_url': f'https://res.cloudinary.com/demo/{file.name}',
+        }
+
+    def post_gallery(self, *names):
+        files = [image_upload(name) for name in names]
+        with mock.patch('memorial.media.upload', self.fake_upload):
+            return self.client.post(
+                self.upload_url, {'images': files},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            )
+
+    def test_partial_success_is_reported_per_file(self):
+        GalleryImage.objects.create(
+            memorial=self.memorial, image='gallery/old', order=4
+        )
+        data = self.post_gallery('a.jpg', 'bad.jpg', 'c.jpg').json()
+
+        self.assertTrue(data['success'])
+        self.assertEqual(
+            [r['success'] for r in data['results']], [True, False, True]
+        )
+        self.assertIn('Invalid image file', data['results'][1]['error'])
+        self.assertEqual(
+            list(self.memorial.gallery.order_by('order')
+                 .values_list('order', flat=True)),
+            [4, 5, 6]
+        )
+
+    def test_all_failed(self):
+        response = self.post_gallery('bad.jpg')
+        self.assertEqual(response.status_code, 502)
+        self.assertFalse(response.json()['success'])
+        self.assertFalse(self.memorial.gallery.exists())
+
+    def test_bulk_insert_invalidates_cached_gallery(self):
+        self.client.logout()
+        self.client.get(self.url)
+        self.client.force_login(self.owner)
+        self.post_gallery('fresh.jpg')
+        self.client.logout()
+        self.assertContains(self.client.get(self.url), 'demo/fresh')
+
+    def test_queued_uploads_time_out(self):
+        started = []
+
+        def slow_upload(file, **options):
+            started.append(file.name)
+            time.sleep(0.3)
+            return self.fake_upload(file)
+
+        files = [image_upload('slow.jpg'), image_upload('queued.jpg')]
+        with mock.patch('memorial.media.upload', slow_upload):
+            results = media_jobs.upload_gallery_files(
+                self.memorial, files, concurrency=1, timeout=0.1
+            )
+        # The running upload was waited for and recorded
+        self.assertTrue(results[0]['success'])
+        self.assertIn('Timed out', results[1]['error'])
+        self.assertEqual(started, ['slow.webp'])
+        self.assertEqual(self.memorial.gallery.count(), 1)
+
+
+@override_settings(IMAGE_MAX_EDGE=100, IMAGE_FORMAT='WEBP', IMAGE_QUALITY=80)
+class ImagePreprocessingTests(SimpleTestCase):
+    """Uploads are oriented, stripped, downscaled and re-encoded."""
+
+    def rotated_photo(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        exif[0x010F] = 'PhoneMaker'
+        return image_upload('photo.jpg', size=(400, 300), exif=exif.tobytes())
+
+    def test_downscales_and_strips_metadata(self):
+        processed, stats = imaging.prepare_image(self.rotated_photo())
+
+        with processed, Image.open(processed) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.size, (75, 100))
+            self.assertFalse(image.getexif())
+        self.assertEqual(processed.name, 'photo.webp')
+        self.assertEqual(
+            stats['bytes_saved'],
+            stats['original_bytes'] - stats['processed_bytes']
+        )
+        self.assertGreater(stats['bytes_saved'], 0)
+
+    def test_jpeg_output(self):
+        processed, stats = imaging.prepare_image(
+            self.rotated_photo(), image_format='jpeg'
+        )
+        with processed, Image.open(processed) as image:
+            self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(processed.name, 'photo.jpg')
+
+    def test_undecodable_files_pass_through(self):
+        # Pillow cannot read HEIC; Cloudinary can
+        upload = SimpleUploadedFile('photo.heic', b'ftypheic data')
+        processed, stats = imaging.prepare_image(upload)
+        self.assertIs(processed, upload)
+        self.assertEqual(processed.read(), b'ftypheic data')
+        self.assertEqual(stats['bytes_saved'], 0)
+
+    def test_cmyk_profile_is_dropped(self):
+        buffer = BytesIO()
+        Image.new('CMYK', (50, 50)).save(
+            buffer, 'JPEG', icc_profile=b'cmyk profile'
+        )
+        upload = SimpleUploadedFile('print.jpg', buffer.getvalue())
+        processed, stats = imaging.prepare_image(upload)
+        with processed, Image.open(processed) as image:
+            self.assertEqual(image.mode, 'RGB')
+            self.assertNotIn('icc_profile', image.info)
+
+    def test_palette_transparency_is_kept(self):
+        buffer = BytesIO()
+        Image.new('P', (50, 50)).save(buffer, 'PNG', transparency=0)
+        upload = SimpleUploadedFile('logo.png', buffer.getvalue())
+        processed, stats = imaging.prepare_image(upload)
+        with processed, Image.open(processed) as image:
+            self.assertEqual(image.mode, 'RGBA')
+            self.assertEqual(image.getpixel((0, 0))[3], 0)
+
+    def test_truncated_image_is_invalid(self):
+        upload = image_upload('photo.jpg', size=(400, 300))
+        data = upload.read()
+        upload = SimpleUploadedFile('photo.jpg', data[:len(data) // 2])
+        with self.assertRaises(imaging.InvalidImage):
+            imaging.prepare_image(upload)
+
+    def test_decompression_bomb_is_invalid(self):
+        # Pillow refuses images over twice MAX_IMAGE_PIXELS
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            with self.assertRaises(imaging.InvalidImage):
+                imaging.prepare_image(image_upload('bomb.jpg'))
+
+
+class ProfileVersionTests(MemorialPageTestCase):
+    """Profile picture URLs change only when the picture does."""
+
+    def upload_profile(self, version):
+        self.client.force_login(self.owner)
+        upload_result = {
+            'public_id': 'memorials/1/profile_pictures/profile_1',
+            'secure_url': 'https://res.cloudinary.com/demo/profile_1.webp',
+            'version': version,
+        }
+        with mock.patch('memorial.media.delete'), mock.patch(
+            'memorial.media.upload', return_value=upload_result
+        ):
+            self.client.post(
+                reverse('memorials:upload_profile_picture',
+                        args=[self.memorial.pk]),
+                {'profile_picture': image_upload('me.jpg')},
+            )
+        self.client.logout()
+        self.memorial.refresh_from_db()
+
+    def profile_srcsets(self):
+        html = self.client.get(self.url).content.decode()
+        return re.findall(r'srcset="([^"]*profile_pictures[^"]*)"', html)
+
+    def test_urls_are_stable_between_views(self):
+        self.upload_profile(1712000000)
+        self.assertEqual(self.memorial.profile_version, 1712000000)
+        first = self.profile_srcsets()
+        cache.clear()
+        self.assertEqual(first, self.profile_srcsets())
+        self.assertIn('/v1712000000/memorials/1/profile_pictures/', first[0])
+
+    def test_new_upload_changes_url(self):
+        self.upload_profile(1712000000)
+        self.upload_profile(1713000000)
+        response = self.client.get(self.url)
+        self.assertContains(response, '/v1713000000/')
+        self.assertNotContains(response, '/v1712000000/')
+
+    def test_backfill_profile_versions(self):
+        Memorial.objects.filter(pk=self.memorial.pk).update(
+            profile_public_id='memorials/1/profile_pictures/profile_1'
+        )
+        with mock.patch('memorial.media.lookup', return_value=[{
+            'public_id': 'memorials/1/profile_pictures/profile_1',
+            'version': 1700000000,
+        }]):
+            call_command('backfill_profile_versions', stdout=StringIO())
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.profile_version, 1700000000)
+
+
+class AsyncViewTests(MemorialPageTestCase):
+    """Upload and contact views run async with the SDK calls offloaded."""
+
+    def test_anonymous_upload_redirects_to_login(self):
+        url = reverse('memorials:upload_audio', args=[self.memorial.pk])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(f'?next={url}', response['Location'])
+
+    def test_upload_audio(self):
+        self.client.force_login(self.owner)
+        Memorial.objects.filter(pk=self.memorial.pk).update(
+            audio_public_id='memorials/1/audio/old'
+        )
+        with mock.patch('memorial.media.delete') as delete, mock.patch(
+            'memorial.media.upload', return_value={
+                'public_id': 'memorials/1/audio/song',
+                'secure_url': 'https://res.cloudinary.com/demo/song.mp3',
+            }
+        ):
+            response = self.client.post(
+                reverse('memorials:upload_audio', args=[self.memorial.pk]),
+                {'audio_file': SimpleUploadedFile(
+                    'song.mp3', b'ID3', 'audio/mpeg'
+                )},
+            )
+        self.assertRedirects(
+            response,
+            reverse('memorials:memorial_edit', args=[self.memorial.pk]),
+            fetch_redirect_response=False,
+        )
+        delete.assert_called_once_with(
+            'memorials/1/audio/old', resource_type='video'
+        )
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.audio_public_id,
+                         'memorials/1/audio/song')
+
+    def test_invalid_profile_picture_is_rejected(self):
+        self.client.force_login(self.owner)
+        upload = image_upload('me.jpg', size=(400, 300))
+        data = upload.read()
+        with mock.patch('memorial.media.upload') as upload_file:
+            response = self.client.post(
+                reverse('memorials:upload_profile_picture',
+                        args=[self.memorial.pk]),
+                {'profile_picture': SimpleUploadedFile(
+                    'me.jpg', data[:len(data) // 2], 'image/jpeg'
+                )},
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'Invalid image')
+        upload_file.assert_not_called()
+
+    def test_upload_to_another_users_memorial_is_404(self):
+        other = User.objects.create_user('other', 'other@example.com')
+        self.client.force_login(other)
+        response = self.client.post(
+            reverse('memorials:upload_profile_picture',
+                    args=[self.memorial.pk]),
+            {'profile_picture': image_upload('me.jpg')},
+        )
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        CONTACT_EMAIL='team@example.com',
+    )
+    def test_contact_sends_mail(self):
+        response = self.client.post(reverse('memorials:contact'), {
+            'name': 'Grace',
+            'email': 'grace@example.com',
+            'subject': 'Hello',
+            'message': 'A question',
+        })
+        self.assertRedirects(response, reverse('memorials:contact'))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['team@example.com'])
+        self.assertIn('grace@example.com', mail.outbox[0].body)
+
+    @override_settings(ASYNC_IO_LIMITS={'media': 2})
+    def test_offload_bounds_calls_per_service(self):
+        running = []
+        peak = []
+
+        def call():
+            running.append(1)
+            peak.append(len(running))
+            time.sleep(0.05)
+            running.pop()
+
+        async def main():
+            await asyncio.gather(*(aio.offload('media', call)
+                                   for _ in range(6)))
+
+        asyncio.run(main())
+        self.assertEqual(len(peak), 6)
+        self.assertEqual(max(peak), 2)
+
+
+class QRCodeEndpointTests(MemorialPageTestCase):
+    """QR codes are rendered on demand with cache-friendly headers."""
+
+    def test_png_is_immutable_when_versioned(self):
+        response = self.client.get(self.memorial.get_qr_code_url())
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(response['ETag'].startswith('"'))
+
+        with self.assertNumQueries(1):
+            repeat = self.client.get(
+                self.memorial.get_qr_code_url(),
+                HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_unversioned_links_expire(self):
+        url = reverse(
+            'memorials:memorial_qr', args=[self.memorial.pk, 'svg']
+        )
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertTrue(response.content.startswith(b'<?xml'))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+
+    def test_size_parameter(self):
+        response = self.client.get(
+            self.memorial.get_qr_code_url(), {'size': 2000}
+        )
+        with Image.open(BytesIO(response.content)) as image:
+            self.assertGreater(image.width, 1800)
+        self.assertEqual(
+            self.client.get(self.url + 'qr.png', {'size': 'big'}).status_code,
+            400
+        )
+
+    def test_site_url_changes_version_and_etag(self):
+        url = self.memorial.get_qr_code_url()
+        etag = self.client.get(url)['ETag']
+        with override_settings(SITE_URL='https://example.com'):
+            self.assertNotEqual(self.memorial.get_qr_code_url(), url)
+            self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+    def test_unknown_memorial_or_format(self):
+        self.assertEqual(
+            self.client.get(self.url + 'qr.gif').status_code, 404
+        )
+        missing = reverse('memorials:memorial_qr', args=[999, 'png'])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_missing_memorial_is_404_despite_matching_etag(self):
+        url = self.memorial.get_qr_code_url()
+        etag = self.client.get(url)['ETag']
+        self.memorial.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+
+
+class MemorialFieldUpdateTests(MemorialPageTestCase):
+    """AJAX edits write only the fields they change."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.owner)
+
+    def post(self, name, data, **extra):
+        url = reverse(f'memorials:{name}', kwargs={'pk': self.memorial.pk})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, data, **extra)
+        return response, [q['sql'] for q in ctx.captured_queries]
+
+    def test_quote_update_skips_file_refetch(self):
+        response, queries = self.post('update_quote', {'quote': 'Hello'})
+        self.assertEqual(response.status_code, 200)
+        memorial_queries = [q for q in queries if 'memorial_memorial' in q]
+        # One lookup and one narrow UPDATE, no pre_save refetch
+        self.assertEqual(len(memorial_queries), 2)
+        update = next(q for q in memorial_queries if q.startswith('UPDATE'))
+        self.assertIn('"quote"', update)
+        self.assertNotIn('"biography"', update)
+
+    def test_name_update_refreshes_search_keys(self):
+        response, queries = self.post(
+            'update_name', {'first_name': 'Augusta', 'last_name': 'King'}
+        )
+        self.assertEqual(response.json()['new_name'], 'Augusta King')
+        update = next(q for q in queries if q.startswith('UPDATE'))
+        self.assertIn('"last_name_soundex"', update)
+        self.assertNotIn('"quote"', update)
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.last_name_folded, 'king')
+
+    def test_patch_applies_several_fields_in_one_update(self):
+        response, queries = self.post('patch_memorial', {
+            'quote': 'Poetical science',
+            'date_of_death': '1852-11-27',
+            'banner_type': 'color',
+            'banner_value': '#ffffff',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['updated'],
+            ['banner_type', 'banner_value', 'date_of_death', 'quote']
+        )
+        updates = [q for q in queries if q.startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('"first_name"', updates[0])
+
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.quote, 'Poetical science')
+        self.assertEqual(self.memorial.date_of_death, date(1852, 11, 27))
+        self.assertEqual(self.memorial.banner_value, '#ffffff')
+
+    def test_patch_accepts_json(self):
+        response, _ = self.post(
+            'patch_memorial', '{"biography": "Line one\\nLine two"}',
+            content_type='application/json'
+        )
+        self.assertEqual(response.json()['updated'], ['biography'])
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.biography, 'Line one\nLine two')
+
+    def test_patch_rejects_invalid_values(self):
+        for data in (
+            {},
+            {'date_of_birth': '10/12/1815'},
+            {'date_of_death': '1800-01-01'},
+            {'banner_type': 'video'},
+            {'last_name': ' '},
+        ):
+            response, _ = self.post('patch_memorial', data)
+            self.assertEqual(response.status_code, 400, data)
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.last_name, 'Lovelace')
+
+    def test_patch_rejects_json_that_is_not_an_object(self):
+        for body in ('null', '[]', '"quote"'):
+            response, _ = self.post(
+                'patch_memorial', body, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400, body)
+
+    def test_patch_checks_field_lengths(self):
+        response, queries = self.post(
+            'patch_memorial', {'first_name': 'A' * 101}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('First name', response.json()['message'])
+        self.assertFalse(any(q.startswith('UPDATE') for q in queries))
+
+    def test_patch_clears_date_of_death(self):
+        Memorial.objects.filter(pk=self.memorial.pk).update(
+            date_of_death=date(1852, 11, 27)
+        )
+        response, _ = self.post('patch_memorial', {'date_of_death': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['memorial']['date_of_death'])
+        self.memorial.refresh_from_db()
+        self.assertIsNone(self.memorial.date_of_death)
+
+    def test_patch_is_owner_only(self):
+        other = User.objects.create_user('other', 'other@example.com')
+        self.client.force_login(other)
+        response, _ = self.post('patch_memorial', {'quote': 'Hijacked'})
+        self.assertEqual(response.status_code, 404)
+
+
+class FakeCloudinaryApi:
+    """In-memory stand-in for the cloudinary.api calls used by cleanup."""
+
+    PAGE_SIZE = 2
+
+    def __init__(self, resources, remaining=None):
+        # {resource_type: [public_id, ...]}
+        self.stored = {k: list(v) for k, v in resources.items()}
+        self.remaining = remaining
+        self.created = {}
+        self.calls = []
+        self.deleted_folders = []
+
+    def _response(self, data):
+        response = FakeApiResponse(data)
+        if self.remaining is not None:
+            self.remaining -= 1
+            response.rate_limit_remaining = self.remaining
+            response.rate_limit_reset_at = time.gmtime(time.time() + 3600)
+        return response
+
+    def delete_resources_by_prefix(self, prefix, resource_type='image'):
+        self.calls.append(('prefix', resource_type))
+        stored = self.stored.setdefault(resource_type, [])
+        matches = [p for p in stored if p.startswith(prefix)]
+        batch = matches[:self.PAGE_SIZE]
+        for public_id in batch:
+            stored.remove(public_id)
+        return self._response({
+            'deleted': {public_id: 'deleted' for public_id in batch},
+            'partial': len(matches) > len(batch),
+        })
+
+    def delete_resources(self, public_ids, resource_type='image'):
+        self.calls.append(('ids', resource_type))
+        stored = self.stored.setdefault(resource_type, [])
+        deleted = {}
+        for public_id in public_ids:
+            if public_id in stored:
+                stored.remove(public_id)
+                deleted[public_id] = 'deleted'
+            else:
+                deleted[public_id] = 'not_found'
+        return self._response({'deleted': deleted})
+
+    def resources(self, type, prefix, resource_type, max_results,
+                  next_cursor=None):
+        self.calls.append(('list', resource_type))
+        stored = self.stored.get(resource_type, [])
+        matches = [p for p in stored if p.startswith(prefix)]
+        start = int(next_cursor or 0)
+        end = start + max_results
+        response = {
+            'resources': [
+                {
+                    'public_id': p,
+                    'bytes': 100,
+                    'created_at': self.created.get(p, '2020-01-01T00:00:00Z'),
+                }
+                for p in matches[start:end]
+            ]
+        }
+        if end < len(matches):
+            response['next_cursor'] = str(end)
+        return self._response(response)
+
+    def delete_folder(self, path):
+        self.deleted_folders.append(path)
+        return self._response({'deleted': [path]})
+
+
+class FakeApiResponse(dict):
+    rate_limit_remaining = None
+    rate_limit_reset_at = None
+
+
+@override_settings(
+    MEDIA_CLEANUP_MAX_ATTEMPTS=2,
+    MEDIA_CLEANUP_RETRY_DELAY=30,
+    MEDIA_CLEANUP_API_RESERVE=5,
+)
+class MediaCleanupTests(MemorialPageTestCase):
+    """Deleted memorials' media is removed by the cleanup worker."""
+
+    def setUp(self):
+        super().setUp()
+        media.budget.remaining = None
+        media.budget.reset_at = None
+        prefix = media_cleanup.memorial_prefix(self.memorial.pk)
+        self.fake = FakeCloudinaryApi({
+            'image': [f'{prefix}gallery/{i}' for i in range(5)]
+            + ['legacy/profile_1', 'other/keep'],
+            'video': [f'{prefix}audio/song'],
+        })
+        patcher = mock.patch.object(media, 'api', self.fake)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def delete_memorial(self):
+        self.memorial.profile_public_id = 'legacy/profile_1'
+        self.memorial.save()
+        with mock.patch.object(FakeCloudinaryApi, '_response') as called:
+            self.memorial.delete()
+        called.assert_not_called()
+        return MediaCleanupJob.objects.get()
+
+    def run_cleanup(self):
+        call_command(
+            'run_media_cleanup', once=True, concurrency=1,
+            stdout=StringIO(), stderr=StringIO()
+        )
+
+    def test_delete_only_queues_cleanup(self):
+        job = self.delete_memorial()
+        self.assertEqual(job.status, MediaCleanupJob.STATUS_PENDING)
+        self.assertEqual(job.public_ids, {'image': ['legacy/profile_1']})
+        self.assertEqual(self.fake.calls, [])
+
+    def test_worker_empties_folder_then_deletes_it(self):
+        job = self.delete_memorial()
+        self.run_cleanup()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, MediaCleanupJob.STATUS_DONE)
+        self.assertEqual(job.deleted_count, 7)
+        self.assertEqual(self.fake.stored['image'], ['other/keep'])
+        self.assertEqual(self.fake.stored['video'], [])
+        # Five gallery images take three prefix calls at two per page
+        self.assertEqual(self.fake.calls.count(('prefix', 'image')), 3)
+        self.assertEqual(
+            self.fake.deleted_folders, [job.prefix.rstrip('/')]
+        )
+
+    def test_leftover_resources_are_retried_with_backoff(self):
+        job = self.delete_memorial()
+        with mock.patch.object(
+            media_cleanup, 'remaining_resources', return_value=1
+        ):
+            self.run_cleanup()
+            job.refresh_from_db()
+            self.assertEqual(job.status, MediaCleanupJob.STATUS_PENDING)
+            self.assertEqual(job.attempts, 1)
+            self.assertGreater(
+                job.next_attempt_at,
+                timezone.now() + timedelta(seconds=25)
+            )
+            self.assertEqual(self.fake.deleted_folders, [])
+
+            MediaCleanupJob.objects.update(next_attempt_at=timezone.now())
+            self.run_cleanup()
+            job.refresh_from_db()
+            self.assertEqual(job.status, MediaCleanupJob.STATUS_FAILED)
+            self.assertIn('still holds resources', job.error)
+
+    def test_spent_rate_limit_defers_without_using_an_attempt(self):
+        self.fake.remaining = 8
+        job = self.delete_memorial()
+        self.run_cleanup()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, MediaCleanupJob.STATUS_PENDING)
+        self.assertEqual(job.attempts, 0)
+        self.assertGreater(
+            job.next_attempt_at, timezone.now() + timedelta(minutes=50)
+        )
+        self.assertIn('Rate limited', job.error)
+
+    def test_retry_delay_doubles_up_to_an_hour(self):
+        self.assertEqual(media_cleanup.retry_delay(1), timedelta(seconds=30))
+        self.assertEqual(media_cleanup.retry_delay(3), timedelta(seconds=120))
+        self.assertEqual(media_cleanup.retry_delay(20), timedelta(hours=1))
+
+
+class ReconcileMediaTests(MemorialPageTestCase):
+    """reconcile_media deletes Cloudinary assets nothing references."""
+
+    def setUp(self):
+        super().setUp()
+        media.budget.remaining = None
+        media.budget.reset_at = None
+        pk = self.memorial.pk
+        self.memorial.profile_public_id = f'memorials/{pk}/profile_pictures/p'
+        self.memorial.profile_picture.name = self.memorial.profile_public_id
+        self.memorial.audio_public_id = f'memorials/{pk}/audio/song'
+        self.memorial.save()
+        GalleryImage.objects.create(
+            memorial=self.memorial,
+            image=f'https://res.cloudinary.com/demo/image/upload/v12/'
+                  f'memorials/{pk}/gallery/kept.jpg',
+        )
+        GalleryImage.objects.create(memorial=self.memorial, image='')
+
+        self.fake = FakeCloudinaryApi({
+            'image': [
+                f'memorials/{pk}/profile_pictures/p',
+                f'memorials/{pk}/gallery/kept',
+                f'memorials/{pk}/gallery/orphan',
+                f'memorials/{pk}/gallery/fresh',
+                'memorials/999/gallery/deleted',
+            ],
+            'video': [f'memorials/{pk}/audio/song', f'memorials/{pk}/old'],
+        })
+        self.fake.created[f'memorials/{pk}/gallery/fresh'] = (
+            timezone.now().isoformat()
+        )
+        patcher = mock.patch.object(media, 'api', self.fake)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def reconcile(self, **options):
+        out = StringIO()
+        call_command('reconcile_media', stdout=out, **options)
+        return out.getvalue()
+
+    def test_dry_run_reports_without_deleting(self):
+        output = self.reconcile(dry_run=True, batch_size=2)
+        pk = self.memorial.pk
+        self.assertIn(f'image\tmemorials/{pk}/gallery/orphan\t100', output)
+        self.assertIn('image\tmemorials/999/gallery/deleted', output)
+        self.assertIn(f'video\tmemorials/{pk}/old', output)
+        self.assertIn('Found 3 orphaned assets (300 bytes)', output)
+        self.assertNotIn('fresh', output)
+        self.assertEqual(len(self.fake.stored['image']), 5)
+        # Five images listed two at a time
+        self.assertEqual(self.fake.calls.count(('list', 'image')), 3)
+
+    def test_deletes_only_orphans(self):
+        output = self.reconcile()
+        pk = self.memorial.pk
+        self.assertIn('deleted 3', output)
+        self.assertEqual(self.fake.stored['image'], [
+            f'memorials/{pk}/profile_pictures/p',
+            f'memorials/{pk}/gallery/kept',
+            f'memorials/{pk}/gallery/fresh',
+        ])
+        self.assertEqual(self.fake.stored['video'], [
+            f'memorials/{pk}/audio/song'
+        ])
+
+    def test_references_load_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            referenced = reconcile.referenced_public_ids()
+        self.assertEqual(len(ctx), 1)
+        self.assertIn(
+            f'memorials/{self.memorial.pk}/gallery/kept', referenced
+        )
+
+    def test_normalize_public_id(self):
+        self.assertEqual(reconcile.normalize_public_id(None), ())
+        self.assertEqual(
+            reconcile.normalize_public_id('image/upload/v1/a/b.png'),
+            ('a/b.png', 'a/b')
+        )
+        self.assertEqual(reconcile.normalize_public_id('a/b'), ('a/b',))
+        self.assertEqual(
+            reconcile.normalize_public_id('/media/local/image/a/b.webp?v=17'),
+            ('a/b.webp', 'a/b')
+        )
+
+    def test_deletes_after_listing(self):
+        pk = self.memorial.pk
+        with mock.patch.object(media, 'DELETE_BATCH_SIZE', 1):
+            output = self.reconcile(batch_size=2)
+        self.assertIn('deleted 3', output)
+        self.assertNotIn(f'memorials/{pk}/gallery/orphan',
+                         self.fake.stored['image'])
+        calls = [kind for kind, _ in self.fake.calls]
+        self.assertEqual(calls.index('ids'), calls.count('list'))
+        self.assertEqual(calls.count('ids'), 3)
+
+
+class LocalMediaBackendTests(MemorialPageTestCase):
+    """The local backend stores, serves and deletes media offline."""
+
+    def setUp(self):
+        super().setUp()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        settings_override = override_settings(
+            MEDIA_BACKEND='local', MEDIA_LOCAL_ROOT=self.root
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.plan.allow_gallery = True
+        self.plan.save()
+        self.client.force_login(self.owner)
+
+    def test_gallery_upload_is_stored_and_served(self):
+        response = self.client.post(
+            reverse('memorials:upload_gallery_images',
+                    args=[self.memorial.pk]),
+            {'images': [image_upload('a.jpg'), image_upload('b.jpg')]},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        results = response.json()['results']
+        self.assertTrue(all(result['success'] for result in results))
+
+        stored = list(media.list_prefix(
+            f'memorials/{self.memorial.pk}/gallery/'
+        ))
+        self.assertEqual(len(stored), 2)
+        self.assertTrue(all(r['format'] == 'webp' for r in stored))
+
+        url = results[0]['url']
+        self.assertTrue(url.startswith('/media/local/image/memorials/'))
+        served = self.client.get(url)
+        self.assertEqual(served['Content-Type'], 'image/webp')
+        self.assertIn('immutable', served['Cache-Control'])
+        with Image.open(BytesIO(b''.join(served.streaming_content))) as img:
+            self.assertEqual(img.format, 'WEBP')
+
+        self.client.logout()
+        self.assertContains(self.client.get(self.url), f'src="{url}"')
+
+    def test_reconcile_keeps_referenced_files(self):
+        response = self.client.post(
+            reverse('memorials:upload_gallery_images',
+                    args=[self.memorial.pk]),
+            {'images': [image_upload('a.jpg')]},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        url = response.json()['results'][0]['url']
+        self.assertTrue(GalleryImage.objects.filter(
+            memorial=self.memorial, image=url
+        ).exists())
+        media.upload(
+            image_upload('orphan.jpg'),
+            folder=f'memorials/{self.memorial.pk}/gallery',
+        )
+
+        out = StringIO()
+        call_command('reconcile_media', min_age_hours=0, stdout=out)
+        self.assertIn('deleted 1', out.getvalue())
+        stored = list(media.list_prefix(
+            f'memorials/{self.memorial.pk}/gallery/'
+        ))
+        self.assertEqual(len(stored), 1)
+        self.assertIn(stored[0]['public_id'], url)
+
+    def test_audio_and_edit_gallery_use_local_urls(self):
+        self.client.post(
+            reverse('memorials:upload_audio', args=[self.memorial.pk]),
+            {'audio_file': SimpleUploadedFile(
+                'song.mp3', b'ID3', 'audio/mpeg'
+            )},
+        )
+        image = self.client.post(
+            reverse('memorials:upload_gallery_images',
+                    args=[self.memorial.pk]),
+            {'images': [image_upload('a.jpg')]},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        ).json()['results'][0]['url']
+        self.memorial.refresh_from_db()
+        audio = media.url(self.memorial.audio_public_id, 'video')
+        self.assertTrue(audio.startswith('/media/local/video/'))
+
+        edit = self.client.get(
+            reverse('memorials:memorial_edit', args=[self.memorial.pk])
+        )
+        self.assertContains(edit, f'<source src="{audio}"')
+        self.assertContains(edit, f'src="{image}"')
+        self.assertNotContains(edit, 'res.cloudinary.com')
+        detail = self.client.get(self.url)
+        self.assertContains(detail, f'<source src="{audio}"')
+
+    def test_replacing_a_file_bumps_its_version(self):
+        first = media.upload(
+            image_upload('p.jpg'), folder='memorials/1', public_id='p'
+        )
+        second = media.upload(
+            image_upload('p.png'), folder='memorials/1', public_id='p'
+        )
+        self.assertEqual(first['public_id'], 'memorials/1/p')
+        self.assertGreater(second['version'], first['version'])
+        self.assertEqual(
+            [r['format'] for r in media.lookup(['memorials/1/p'])], ['png']
+        )
+        self.assertEqual(
+            media.url('memorials/1/p', version=second['version']),
+            second['secure_url']
+        )
+
+    def test_cleanup_worker_empties_memorial_folder(self):
+        prefix = media_cleanup.memorial_prefix(self.memorial.pk)
+        media.upload(image_upload('a.jpg'), folder=f'{prefix}gallery')
+        media.upload(
+            SimpleUploadedFile('song.mp3', b'ID3'),
+            folder=f'{prefix}audio', resource_type='video'
+        )
+        self.memorial.delete()
+        call_command(
+            'run_media_cleanup', once=True, concurrency=1,
+            stdout=StringIO(), stderr=StringIO()
+        )
+        job = MediaCleanupJob.objects.get()
+        self.assertEqual(job.status, MediaCleanupJob.STATUS_DONE)
+        self.assertEqual(job.deleted_count, 2)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.root, 'image', prefix)
+        ))
+
+    def test_rejects_paths_outside_root(self):
+        for path in ('../secret', 'memorials/missing.jpg'):
+            response = self.client.get(
+                reverse('memorials:local_media', args=['image', path])
+            )
+            self.assertEqual(response.status_code, 404)
+
+    @override_settings(MEDIA_LOCAL_ACCEL_REDIRECT='/protected/')
+    def test_accel_redirect_hands_off_to_proxy(self):
+        result = media.upload(image_upload('a.jpg'), folder='x')
+        response = self.client.get(result['secure_url'])
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            f"/protected/image/{result['public_id']}.webp"
+            if result['format'] == 'webp'
+            else f"/protected/image/{result['public_id']}.jpg"
+        )
+        self.assertEqual(response.content, b'')
+
+
+class MediaUrlTests(SimpleTestCase):
+    """media_urls builds responsive Cloudinary URLs from named presets."""
+
+    gallery_url = (
+        'https://res.cloudinary.com/demo/image/upload/'
+        'v1712/memorials/1/gallery/photo.jpg'
+    )
+
+    def render(self, source, preset):
+        return Template(
+            "{% load media_urls %}<img {% image_attrs source preset %}>"
+        ).render(Context({'source': source, 'preset': preset}))
+
+    def test_srcset_covers_preset_widths(self):
+        html = self.render('memorials/1/profile_pictures/profile_1', 'card')
+        for width in PRESETS['card']['widths']:
+            self.assertIn(
+                f'c_fill,f_auto,g_face,h_{width},q_auto,w_{width}', html
+            )
+            self.assertIn(f' {width}w', html)
+        self.assertIn('sizes="180px"', html)
+
+    def test_delivery_urls_keep_public_id_and_version(self):
+        self.assertEqual(
+            parse_source(self.gallery_url),
+            ('memorials/1/gallery/photo', '1712')
+        )
+        html = self.render(self.gallery_url, 'thumb')
+        self.assertIn('/v1712/memorials/1/gallery/photo 320w', html)
+
+    def test_other_urls_pass_through(self):
+        self.assertEqual(
+            self.render('https://example.com/a.png', 'thumb'),
+            '<img src="https://example.com/a.png">'
+        )
+
+    def test_unknown_preset(self):
+        with self.assertRaises(TemplateSyntaxError):
+            self.render('memorials/1/photo', 'poster')
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis client used by RedisCache."""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        # Redis hands every value back as bytes
+        self.data[key] = value if isinstance(value, bytes) else (
+            str(value).encode()
+        )
+        self.expiry[key] = ex
+        return True
+
+    def exists(self, *keys):
+        return sum(key in self.data for key in keys)
+
+    def incr(self, key, amount=1):
+        value = int(self.data[key]) + amount
+        self.data[key] = str(value).encode()
+        return value
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def flushdb(self):
+        self.data.clear()
+        self.expiry.clear()
+
+
+class NamespacedCacheTests(SimpleTestCase):
+    """memorial.cache helpers behave the same on every configured backend."""
+
+    def check_backend(self):
+        cache.clear()
+        memorial_cache.cache_set('memorial:1', 'hero', '<h1>Ada</h1>')
+        memorial_cache.cache_set('memorial:2', 'hero', '<h1>Alan</h1>')
+        self.assertEqual(
+            memorial_cache.cache_get('memorial:1', 'hero'), '<h1>Ada</h1>'
+        )
+
+        memorial_cache.invalidate('memorial:1')
+        self.assertIsNone(memorial_cache.cache_get('memorial:1', 'hero'))
+        self.assertEqual(
+            memorial_cache.cache_get('memorial:2', 'hero'), '<h1>Alan</h1>'
+        )
+
+    def test_locmem_backend(self):
+        self.check_backend()
+
+    def test_evicted_version_does_not_revive_stale_keys(self):
+        cache.clear()
+        memorial_cache.cache_set('memorial:1', 'hero', '<h1>Ada</h1>')
+        cache.delete('memorial:1:version')
+        self.assertIsNone(memorial_cache.cache_get('memorial:1', 'hero'))
+
+        memorial_cache.cache_set('memorial:1', 'hero', '<h1>Ada L.</h1>')
+        cache.delete('memorial:1:version')
+        memorial_cache.invalidate('memorial:1')
+        self.assertIsNone(memorial_cache.cache_get('memorial:1', 'hero'))
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }}):
+                self.check_backend()
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379',
+        'TIMEOUT': 300,
+    }})
+    def test_redis_backend(self):
+        redis = FakeRedis()
+        with mock.patch(
+            'django.core.cache.backends.redis.RedisCacheClient.get_client',
+            return_value=redis,
+        ):
+            self.check_backend()
+
+            # Omitted timeouts use the backend's; None never expires
+            memorial_cache.cache_set('browse', 'default', 'a')
+            memorial_cache.cache_set('browse', 'forever', 'b', None)
+            version = memorial_cache.get_version('browse')
+            expiry = {
+                key.rsplit(':', 1)[-1]: ex
+                for key, ex in redis.expiry.items()
+                if f'browse:v{version}:' in key
+            }
+        self.assertEqual(expiry, {'default': 300, 'forever': None})
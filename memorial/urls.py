@@ -41,6 +41,17 @@ urlpatterns = [
         name='memorial_detail',
     ),
 
+    path(
+        'memorials/<int:pk>/qr.<str:fmt>',
+        views.memorial_qr,
+        name='memorial_qr',
+    ),
+    path(
+        'media/local/<str:resource_type>/<path:path>',
+        views.local_media,
+        name='local_media',
+    ),
+
     # User Account
     path(
         'account/',
@@ -94,6 +105,11 @@ urlpatterns = [
         update_biography,
         name='update_biography',
     ),
+    path(
+        'memorials/<int:pk>/patch/',
+        views.patch_memorial,
+        name='patch_memorial',
+    ),
 
     # Audio Handling
     path(
@@ -108,6 +124,11 @@ urlpatterns = [
         views.upload_gallery_images,
         name='upload_gallery_images',
     ),
+    path(
+        'memorials/uploads/<int:pk>/',
+        views.upload_job_status,
+        name='upload_job_status',
+    ),
     path(
         '<int:memorial_id>/gallery/<int:image_id>/delete/',
         views.delete_gallery_image,
@@ -6,6 +6,8 @@ Handles memorial creation, management, and all related functionality.
 # Standard Library
 from datetime import datetime
 import json
+import mimetypes
+from urllib.parse import urlencode
 
 # Django Core
 from django import forms
@@ -14,29 +16,34 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.mail import send_mail
 from django.core.paginator import Paginator
-from django.db import transaction
-from django.db.models import Q
-from django.http import JsonResponse
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect, reverse
 from django.urls import reverse_lazy
+from django.utils.functional import SimpleLazyObject
 from django.views.decorators.csrf import csrf_protect
-from django.views.decorators.http import require_POST, require_http_methods
+from django.views.decorators.http import (
+    etag, require_POST, require_http_methods
+)
 from django.views.generic import (
     ListView, CreateView, UpdateView, FormView
 )
 
 # Third Party
-import cloudinary
-import cloudinary.uploader
+from asgiref.sync import sync_to_async
 import stripe
-from cloudinary.uploader import upload, destroy
 
 # Local Apps
 from plans.models import Plan
 from .forms import MemorialForm, ContactForm, GalleryImageForm
-from .models import Memorial, Story, GalleryImage, Tribute
+from .models import Memorial, Story, GalleryImage, Tribute, MediaUploadJob
+from .pagination import (
+    InvalidCursor, encode_cursor, get_page_size, paginate
+)
+from . import aio, imaging, media, media_jobs, qr_codes, search
 from newsletter.forms import SubscribeForm
 # ---------------------------
 # Basic Views
@@ -170,14 +177,83 @@ def delete_memorial(request, pk):
 # ---------------------------
 
 
+# Upper bounds for the tributes/stories rendered on the detail page; the
+# "Load Older" buttons fetch the rest from get_tributes/get_stories.
+DETAIL_TRIBUTE_LIMIT = 50
+DETAIL_STORY_LIMIT = 50
+
+
+def detail_prefetches():
+    """Bounded prefetches for the relations shown on the detail page."""
+    return (
+        Prefetch(
+            'tributes',
+            queryset=Tribute.objects.select_related('user').order_by(
+                '-created_at', '-id'
+            )[:DETAIL_TRIBUTE_LIMIT + 1],
+            to_attr='recent_tributes',
+        ),
+        Prefetch(
+            'stories',
+            queryset=Story.objects.select_related('user').order_by(
+                '-created_at', '-id'
+            )[:DETAIL_STORY_LIMIT + 1],
+            to_attr='recent_stories',
+        ),
+        Prefetch(
+            'gallery',
+            queryset=GalleryImage.objects.filter(is_ready=True).order_by(
+                'order', 'id'
+            ),
+            to_attr='gallery_images',
+        ),
+    )
+
+
+def _detail_relation(memorial, attr):
+    if not hasattr(memorial, attr):
+        prefetch_related_objects([memorial], *detail_prefetches())
+    return getattr(memorial, attr)
+
+
+def lazy_detail_relation(memorial, attr, limit=None):
+    """
+    Return a lazy list of one prefetched detail-page relation.
+
+    All relations are prefetched together on first access, so a page whose
+    fragments are served from the cache skips the prefetch queries entirely.
+    Tributes and stories are prefetched one row past ``limit`` so the page
+    can tell whether older entries exist.
+    """
+    return SimpleLazyObject(
+        lambda: _detail_relation(memorial, attr)[:limit]
+    )
+
+
+def lazy_older_cursor(memorial, attr, limit):
+    """
+    Return a lazy cursor for the entries past the first ``limit``.
+
+    The cursor is empty when the page already shows every entry.
+    """
+    def load():
+        rows = _detail_relation(memorial, attr)
+        return encode_cursor(rows[limit - 1]) if len(rows) > limit else ''
+    return SimpleLazyObject(load)
+
+
 @csrf_protect
 def memorial_detail(request, pk):
     """Detailed view of a memorial with tributes and stories"""
-    memorial = get_object_or_404(Memorial, pk=pk)
-    memorial.refresh_from_db()
+    if (request.method == 'POST' and
+            request.headers.get('x-requested-with') == 'XMLHttpRequest'):
+        if 'story_content' in request.POST:
+            return create_story(request, pk)
+        return create_tribute(request, pk)
 
-    tributes = memorial.tributes.all().order_by('-created_at')[:6]
-    stories = memorial.stories.all().order_by('-created_at')[:3]
+    memorial = get_object_or_404(
+        Memorial.objects.select_related('plan', 'user'), pk=pk
+    )
 
     plan_name = memorial.plan.name.lower() if memorial.plan else ""
     is_premium_plan = plan_name in ['premium', 'lifetime']
@@ -187,19 +263,26 @@ def memorial_detail(request, pk):
         is_premium_plan
     )
 
-    if (request.method == 'POST' and
-            request.headers.get('x-requested-with') == 'XMLHttpRequest'):
-        if 'story_content' in request.POST:
-            return create_story(request, pk)
-        return create_tribute(request, pk)
-
     return render(
         request,
         'memorials/memorial_detail.html',
         {
             'memorial': memorial,
-            'tributes': tributes,
-            'stories': stories,
+            'tributes': lazy_detail_relation(
+                memorial, 'recent_tributes', DETAIL_TRIBUTE_LIMIT
+            ),
+            'older_tributes_cursor': lazy_older_cursor(
+                memorial, 'recent_tributes', DETAIL_TRIBUTE_LIMIT
+            ),
+            'stories': lazy_detail_relation(
+                memorial, 'recent_stories', DETAIL_STORY_LIMIT
+            ),
+            'older_stories_cursor': lazy_older_cursor(
+                memorial, 'recent_stories', DETAIL_STORY_LIMIT
+            ),
+            'gallery_images': lazy_detail_relation(
+                memorial, 'gallery_images'
+            ),
             'is_premium': is_premium,
             'request': request,
         }
@@ -218,7 +301,7 @@ def update_name(request, pk):
         memorial.first_name = request.POST.get('first_name', '')
         memorial.middle_name = request.POST.get('middle_name', '')
         memorial.last_name = request.POST.get('last_name', '')
-        memorial.save()
+        memorial.save(update_fields=['first_name', 'middle_name', 'last_name'])
 
         full_name = (
             f"{memorial.first_name} "
@@ -268,7 +351,7 @@ def update_dates(request, pk):
 
         memorial.date_of_birth = date_of_birth
         memorial.date_of_death = date_of_death
-        memorial.save()
+        memorial.save(update_fields=['date_of_birth', 'date_of_death'])
 
         return JsonResponse({
             'status': 'success',
@@ -303,7 +386,7 @@ def update_quote(request, pk):
             quote = request.POST.get('quote', '').strip()
 
         memorial.quote = quote
-        memorial.save()
+        memorial.save(update_fields=['quote'])
 
         return JsonResponse({
             'status': 'success',
@@ -344,7 +427,7 @@ def update_banner(request, pk):
 
         memorial.banner_type = banner_type
         memorial.banner_value = banner_value
-        memorial.save()
+        memorial.save(update_fields=['banner_type', 'banner_value'])
 
         return JsonResponse({
             'status': 'success',
@@ -372,7 +455,7 @@ def update_biography(request, pk):
         memorial = get_object_or_404(Memorial, pk=pk, user=request.user)
         biography = request.POST.get('biography', '')
         memorial.biography = biography
-        memorial.save()
+        memorial.save(update_fields=['biography'])
         return JsonResponse({
             'success': True,
             'biography': biography.replace('\n', '<br>')
@@ -384,23 +467,155 @@ def update_biography(request, pk):
         }, status=400)
 
 
+# Fields the combined patch endpoint may change
+PATCHABLE_TEXT_FIELDS = (
+    'first_name', 'middle_name', 'last_name', 'quote', 'biography',
+)
+PATCHABLE_DATE_FIELDS = ('date_of_birth', 'date_of_death')
+BANNER_TYPES = ('image', 'color')
+
+
+def _apply_memorial_patch(memorial, data):
+    """
+    Copy whitelisted fields from ``data`` onto ``memorial``.
+
+    Returns:
+        list: Names of the fields that were set
+
+    Raises:
+        ValueError: If a value is invalid
+    """
+    fields = []
+
+    for field in PATCHABLE_TEXT_FIELDS:
+        if field in data:
+            value = str(data[field] or '')
+            if field != 'biography':
+                value = value.strip()
+            setattr(memorial, field, value)
+            fields.append(field)
+
+    for field in PATCHABLE_DATE_FIELDS:
+        if field in data:
+            if field == 'date_of_death' and not data[field]:
+                # An empty value clears the date
+                value = None
+            else:
+                try:
+                    value = datetime.strptime(
+                        data[field], '%Y-%m-%d'
+                    ).date()
+                except (ValueError, TypeError):
+                    raise ValueError(
+                        f'Invalid {field.replace("_", " ")}. '
+                        f'Use YYYY-MM-DD.'
+                    )
+            setattr(memorial, field, value)
+            fields.append(field)
+
+    if 'banner_type' in data or 'banner_value' in data:
+        banner_type = data.get('banner_type') or memorial.banner_type
+        banner_value = data.get('banner_value') or memorial.banner_value
+        if banner_type not in BANNER_TYPES:
+            raise ValueError('Invalid banner type')
+        if banner_type == 'image' and banner_value.startswith('/static/'):
+            banner_value = banner_value.replace('/static/', '')
+        memorial.banner_type = banner_type
+        memorial.banner_value = banner_value
+        fields += ['banner_type', 'banner_value']
+
+    if not fields:
+        raise ValueError('No fields to update')
+    if not memorial.first_name or not memorial.last_name:
+        raise ValueError('First and last name are required')
+    try:
+        # Lengths and choices, checked for the fields being written only
+        memorial.clean_fields(exclude=[
+            f.name for f in memorial._meta.fields if f.name not in fields
+        ])
+    except ValidationError as e:
+        field, errors = next(iter(e.message_dict.items()))
+        raise ValueError(f'{field.replace("_", " ").capitalize()}: '
+                         f'{errors[0]}')
+    if memorial.date_of_death and (
+            memorial.date_of_death < memorial.date_of_birth):
+        raise ValueError('Date of death cannot be before date of birth')
+    return fields
+
+
+@require_POST
+@login_required
+def patch_memorial(request, pk):
+    """
+    AJAX endpoint applying several memorial field changes at once.
+
+    Accepts JSON or form data with any of the name, date, quote, biography
+    and banner fields, and writes them with a single UPDATE limited to the
+    fields that were sent.
+    """
+    memorial = get_object_or_404(Memorial, pk=pk, user=request.user)
+
+    try:
+        if request.content_type == 'application/json':
+            data = json.loads(request.body)
+        else:
+            data = request.POST
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object')
+        fields = _apply_memorial_patch(memorial, data)
+    except (ValueError, AttributeError) as e:
+        return JsonResponse(
+            {'status': 'error', 'message': str(e)},
+            status=400
+        )
+
+    memorial.save(update_fields=fields)
+
+    return JsonResponse({
+        'status': 'success',
+        'updated': sorted(fields),
+        'memorial': {
+            'first_name': memorial.first_name,
+            'middle_name': memorial.middle_name,
+            'last_name': memorial.last_name,
+            'date_of_birth': memorial.date_of_birth.isoformat(),
+            'date_of_death': (
+                memorial.date_of_death.isoformat()
+                if memorial.date_of_death else None
+            ),
+            'quote': memorial.quote,
+            'biography': memorial.biography,
+            'banner_type': memorial.banner_type,
+            'banner_value': memorial.banner_value,
+        }
+    })
+
+
 # ---------------------------
 # File Upload Views
 # ---------------------------
 
-@login_required
-def upload_profile_picture(request, pk):
+@aio.login_required
+async def upload_profile_picture(request, pk):
     """View for uploading profile pictures to Cloudinary"""
-    memorial = get_object_or_404(Memorial, pk=pk, user=request.user)
+    memorial = await aio.aget_object_or_404(
+        Memorial, pk=pk, user=request.user
+    )
+    # Parsing the multipart body reads the upload from disk
+    files = await sync_to_async(
+        lambda: request.FILES, thread_sensitive=False
+    )()
 
-    if request.method == 'POST' and 'profile_picture' in request.FILES:
-        profile_pic = request.FILES['profile_picture']
+    if request.method == 'POST' and 'profile_picture' in files:
+        profile_pic = files['profile_picture']
 
-        if profile_pic.size > 5 * 1024 * 1024:
-            return JsonResponse(
-                {'status': 'error', 'message': 'Image too large (max 5MB)'},
-                status=400
-            )
+        # Originals are downscaled before upload, so allow large phone photos
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        if profile_pic.size > max_size:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'Image too large (max {max_size // 1024 // 1024}MB)'
+            }, status=400)
 
         if not profile_pic.content_type.startswith('image/'):
             return JsonResponse(
@@ -409,28 +624,36 @@ def upload_profile_picture(request, pk):
             )
 
         try:
-            if memorial.profile_picture:
-                memorial.profile_picture.delete()
-
-            upload_result = upload(
-                profile_pic,
-                folder=f"memorials/{memorial.id}/profile_pictures",
-                public_id=f"profile_{memorial.id}",
-                overwrite=True,
-                resource_type="image"
-            )
+            if settings.MEDIA_UPLOAD_ASYNC:
+                job = await sync_to_async(media_jobs.enqueue)(
+                    memorial, MediaUploadJob.KIND_PROFILE, profile_pic
+                )
+                return JsonResponse({
+                    'status': 'pending',
+                    'job': media_jobs.job_status(job),
+                    'status_url': reverse(
+                        'memorials:upload_job_status', args=[job.pk]
+                    ),
+                    'message': 'Profile picture is processing'
+                }, status=202)
 
-            memorial.profile_public_id = upload_result['public_id']
-            memorial.profile_picture.name = upload_result['public_id']
-            memorial.save()
+            upload_result = await media_jobs.aupload_profile_picture(
+                memorial, profile_pic
+            )
 
             return JsonResponse({
                 'status': 'success',
                 'profile_picture_url': upload_result['secure_url'],
                 'public_id': upload_result['public_id'],
+                'preprocessing': upload_result['preprocessing'],
                 'message': 'Profile picture updated!'
             })
 
+        except imaging.InvalidImage:
+            return JsonResponse(
+                {'status': 'error', 'message': 'Invalid image'},
+                status=400
+            )
         except Exception as e:
             return JsonResponse({
                 'status': 'error',
@@ -443,6 +666,92 @@ def upload_profile_picture(request, pk):
     )
 
 
+def memorial_qr_etag(request, pk, fmt, size):
+    """ETag for a QR code, so repeat requests skip rendering."""
+    return qr_codes.etag(pk, fmt, size)
+
+
+@require_http_methods(["GET", "HEAD"])
+def memorial_qr(request, pk, fmt):
+    """View serving a memorial's QR code as PNG or SVG."""
+    if fmt not in qr_codes.FORMATS:
+        return JsonResponse(
+            {'status': 'error', 'message': 'Unsupported format'},
+            status=404
+        )
+
+    try:
+        size = qr_codes.parse_size(request.GET.get('size'))
+    except ValueError:
+        return JsonResponse(
+            {'status': 'error', 'message': 'Invalid size'},
+            status=400
+        )
+
+    # Checked before the ETag so missing memorials never get a 304
+    if not Memorial.objects.filter(pk=pk).exists():
+        return JsonResponse(
+            {'status': 'error', 'message': 'Memorial not found'},
+            status=404
+        )
+
+    return _render_memorial_qr(request, pk, fmt, size)
+
+
+@etag(memorial_qr_etag)
+def _render_memorial_qr(request, pk, fmt, size):
+    """Render a validated QR code request, unless the ETag matches."""
+    response = HttpResponse(
+        qr_codes.render(qr_codes.target_url(pk), fmt, size),
+        content_type=qr_codes.FORMATS[fmt]
+    )
+    if request.GET.get('v') == qr_codes.version():
+        # Versioned links change whenever the encoded URL could change
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+@require_http_methods(["GET", "HEAD"])
+def local_media(request, resource_type, path):
+    """
+    View serving files stored by the local media backend.
+
+    FileResponse streams through the server's wsgi.file_wrapper, so
+    gunicorn sends files with sendfile(); with MEDIA_LOCAL_ACCEL_REDIRECT
+    set, nginx serves them instead.
+    """
+    backend = media.get_backend()
+    if not isinstance(backend, media.LocalBackend):
+        raise Http404
+    if resource_type not in media.RESOURCE_TYPES:
+        raise Http404
+    file_path = backend.path(resource_type, path)
+    if file_path is None:
+        raise Http404
+
+    if settings.MEDIA_LOCAL_ACCEL_REDIRECT:
+        response = HttpResponse(
+            content_type=(
+                mimetypes.guess_type(file_path)[0]
+                or 'application/octet-stream'
+            )
+        )
+        response['X-Accel-Redirect'] = (
+            f"{settings.MEDIA_LOCAL_ACCEL_REDIRECT}{resource_type}/{path}"
+        )
+    else:
+        response = FileResponse(open(file_path, 'rb'))
+
+    if request.GET.get('v'):
+        # Versioned URLs change whenever the file is replaced
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
 # ---------------------------
 # Tribute Views
 # ---------------------------
@@ -588,46 +897,61 @@ def delete_tribute(request, pk):
 def get_tributes(request, pk):
     """AJAX endpoint for loading more memorial tributes."""
     memorial = get_object_or_404(Memorial, pk=pk)
-    offset = int(request.GET.get('offset', 0))
-    limit = 3
+    page_size = get_page_size(request.GET.get('limit'))
 
-    tributes = (
-        memorial.tributes.all()
-        .order_by('-created_at')[offset:offset + limit]
-    )
+    try:
+        tributes, next_cursor = paginate(
+            memorial.tributes.all(), request.GET.get('cursor'), page_size
+        )
+    except InvalidCursor:
+        return JsonResponse(
+            {'status': 'error', 'message': 'Invalid cursor'},
+            status=400
+        )
 
+    is_owner = request.user == memorial.user
     return JsonResponse({
         'tributes': [{
             'id': t.id,
             'author_name': t.author_name,
             'message': t.message,
-            'created_at': t.created_at.strftime("%b %d, %Y")
+            'created_at': t.created_at.strftime("%b %d, %Y"),
+            'can_edit': is_owner or (
+                request.user.is_authenticated and t.user_id == request.user.id
+            ),
         } for t in tributes],
-        'is_owner': request.user == memorial.user
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+        'is_owner': is_owner
     })
 
 
-@login_required
-def upload_audio(request, pk):
+@aio.login_required
+async def upload_audio(request, pk):
     """View for uploading audio files to Cloudinary"""
-    memorial = get_object_or_404(Memorial, pk=pk, user=request.user)
+    memorial = await aio.aget_object_or_404(
+        Memorial, pk=pk, user=request.user
+    )
+    # Parsing the multipart body reads the upload from disk
+    files = await sync_to_async(
+        lambda: request.FILES, thread_sensitive=False
+    )()
 
-    if request.method == 'POST' and 'audio_file' in request.FILES:
-        audio_file = request.FILES['audio_file']
+    if request.method == 'POST' and 'audio_file' in files:
+        audio_file = files['audio_file']
 
         try:
-            if memorial.audio_public_id:
-                destroy(memorial.audio_public_id, resource_type="video")
-
-            upload_result = upload(
-                audio_file,
-                folder=f"memorials/{memorial.id}/audio",
-                resource_type="video"
-            )
+            if settings.MEDIA_UPLOAD_ASYNC:
+                await sync_to_async(media_jobs.enqueue)(
+                    memorial, MediaUploadJob.KIND_AUDIO, audio_file
+                )
+                messages.success(
+                    request,
+                    "Audio file received. It will be live in a moment."
+                )
+                return redirect('memorials:memorial_edit', pk=memorial.id)
 
-            memorial.audio_file = upload_result['secure_url']
-            memorial.audio_public_id = upload_result['public_id']
-            memorial.save()
+            await media_jobs.aupload_audio(memorial, audio_file)
 
             messages.success(request, "Audio file updated successfully!")
         except Exception as e:
@@ -659,7 +983,7 @@ def upload_gallery_image(request, memorial_id):
     if request.method == 'POST':
         form = GalleryImageForm(request.POST, request.FILES)
         if form.is_valid():
-            upload_result = cloudinary.uploader.upload(
+            upload_result = media.upload(
                 request.FILES['image'],
                 folder=f"memorials/{memorial.id}/gallery",
                 use_filename=True,
@@ -686,7 +1010,6 @@ def upload_gallery_image(request, memorial_id):
 
 @require_http_methods(["POST"])
 @login_required
-@transaction.atomic
 def upload_gallery_images(request, pk):
     """View for bulk uploading gallery images with AJAX support."""
     memorial = get_object_or_404(Memorial, pk=pk, user=request.user)
@@ -720,46 +1043,71 @@ def upload_gallery_images(request, pk):
 
         # Process uploads
         images_to_upload = images[:memorial.remaining_gallery_slots]
-        new_images = []
 
-        for image in images_to_upload:
-            upload_result = cloudinary.uploader.upload(
-                image,
-                folder=f"memorials/{memorial.id}/gallery",
-                use_filename=True,
-                unique_filename=False,
-                overwrite=False
+        if settings.MEDIA_UPLOAD_ASYNC:
+            jobs = media_jobs.enqueue_gallery_images(
+                memorial, images_to_upload
             )
+            response_data = {
+                'success': True,
+                'new_images': [],
+                'jobs': [
+                    dict(
+                        media_jobs.job_status(job),
+                        status_url=reverse(
+                            'memorials:upload_job_status', args=[job.pk]
+                        )
+                    )
+                    for job in jobs
+                ],
+                'message': f"Processing {len(jobs)} images...",
+                'remaining_slots': memorial.remaining_gallery_slots
+            }
+            if len(images) > len(images_to_upload):
+                response_data['message'] += (
+                    f" ({len(images) - len(images_to_upload)} skipped)"
+                )
+            if is_ajax:
+                return JsonResponse(response_data, status=202)
+            messages.success(request, response_data['message'])
+            return redirect('memorials:memorial_edit', pk=pk)
 
-            gallery_image = GalleryImage.objects.create(
-                memorial=memorial,
-                image=upload_result['secure_url'],
-                order=memorial.gallery.count() + 1
-            )
-            new_images.append({
-                'id': gallery_image.id,
-                'url': gallery_image.image,
-                'caption': gallery_image.caption or ''
-            })
+        results = media_jobs.upload_gallery_files(memorial, images_to_upload)
+        new_images = [
+            {key: result[key] for key in ('id', 'url', 'caption')}
+            for result in results if result['success']
+        ]
+        failed = len(results) - len(new_images)
 
         # Prepare response
         response_data = {
-            'success': True,
+            'success': bool(new_images),
             'new_images': new_images,
+            'results': results,
             'message': f"Uploaded {len(new_images)} images successfully!",
-            'remaining_slots': (
-                memorial.remaining_gallery_slots - len(new_images)
-            )
+            'remaining_slots': memorial.remaining_gallery_slots
         }
 
+        if failed:
+            response_data['message'] = (
+                f"Uploaded {len(new_images)} of {len(results)} images."
+            )
+            if not new_images:
+                response_data['error'] = "None of the images could be uploaded"
+
         if len(images) > len(images_to_upload):
             response_data['message'] += (
                 f" ({len(images) - len(images_to_upload)} skipped)"
             )
 
         if is_ajax:
-            return JsonResponse(response_data)
-        messages.success(request, f"Uploaded {len(new_images)} images successfully!")
+            return JsonResponse(
+                response_data, status=200 if new_images else 502
+            )
+        if new_images:
+            messages.success(request, response_data['message'])
+        else:
+            messages.error(request, response_data['error'])
         return redirect('memorials:memorial_edit', pk=pk)
 
     except Exception as e:
@@ -773,6 +1121,15 @@ def upload_gallery_images(request, pk):
         return redirect('memorials:memorial_edit', pk=pk)
 
 
+@login_required
+def upload_job_status(request, pk):
+    """Report the progress of a background media upload."""
+    job = get_object_or_404(
+        MediaUploadJob, pk=pk, memorial__user=request.user
+    )
+    return JsonResponse(media_jobs.job_status(job))
+
+
 @login_required
 def delete_gallery_image(request, memorial_id, image_id):
     """View for deleting gallery images from memorial."""
@@ -792,7 +1149,7 @@ def delete_gallery_image(request, memorial_id, image_id):
 
         public_id = image.image.public_id
         if public_id:
-            destroy(public_id)
+            media.delete(public_id)
 
         image.delete()
         messages.success(request, "Image deleted successfully.")
@@ -953,23 +1310,33 @@ def delete_story(request, pk):
 def get_stories(request, pk):
     """AJAX endpoint for loading more memorial stories."""
     memorial = get_object_or_404(Memorial, pk=pk)
-    offset = int(request.GET.get('offset', 0))
-    limit = 3
+    page_size = get_page_size(request.GET.get('limit'))
 
-    stories = (
-        memorial.stories.all()
-        .order_by('-created_at')[offset:offset + limit]
-    )
+    try:
+        stories, next_cursor = paginate(
+            memorial.stories.all(), request.GET.get('cursor'), page_size
+        )
+    except InvalidCursor:
+        return JsonResponse(
+            {'status': 'error', 'message': 'Invalid cursor'},
+            status=400
+        )
 
+    is_owner = request.user == memorial.user
     return JsonResponse({
         'stories': [{
             'id': s.id,
             'author_name': s.author_name,
             'title': s.title,
             'content': s.content,
-            'created_at': s.created_at.strftime("%b %d, %Y")
+            'created_at': s.created_at.strftime("%b %d, %Y"),
+            'can_edit': is_owner or (
+                request.user.is_authenticated and s.user_id == request.user.id
+            ),
         } for s in stories],
-        'is_owner': request.user == memorial.user
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+        'is_owner': is_owner
     })
 
 
@@ -1067,57 +1434,92 @@ class UpgradeMemorialView(LoginRequiredMixin, FormView):
 # Browse and Search Views
 # ---------------------------
 
+SEARCH_NAME_FIELDS = ('first_name', 'middle_name', 'last_name')
+SEARCH_YEAR_PARAMS = {
+    'born_from': 'birth_from',
+    'born_to': 'birth_to',
+    'died_from': 'death_from',
+    'died_to': 'death_to',
+}
+
+
+def parse_year(value):
+    """Return ``value`` as a year, or None if it is not a usable year."""
+    try:
+        year = int(value)
+    except (TypeError, ValueError):
+        return None
+    return year if 1 <= year <= 9999 else None
+
+
 def browse_memorials(request):
     """View for browsing and searching memorials."""
     memorials_list = Memorial.objects.all().order_by('-created_at')
     search_query = None
     search_results = False
+    truncated = False
+    querystring = ''
 
-    if request.method == 'GET':
-        first_name = request.GET.get('first_name', '').strip()
-        middle_name = request.GET.get('middle_name', '').strip()
-        last_name = request.GET.get('last_name', '').strip()
-        date_of_birth = request.GET.get('date_of_birth', '').strip()
-        date_of_death = request.GET.get('date_of_death', '').strip()
-
-        if any([
-            first_name,
-            middle_name,
-            last_name,
-            date_of_birth,
-            date_of_death
-        ]):
-            search_results = True
-            query = Q()
-
-            if first_name:
-                query &= Q(first_name__icontains=first_name)
-            if middle_name:
-                query &= Q(middle_name__icontains=middle_name)
-            if last_name:
-                query &= Q(last_name__icontains=last_name)
-            if date_of_birth:
-                query &= Q(date_of_birth=date_of_birth)
-            if date_of_death:
-                query &= Q(date_of_death=date_of_death)
-
-            memorials_list = memorials_list.filter(query)
-            search_query = {
-                'first_name': first_name,
-                'middle_name': middle_name,
-                'last_name': last_name,
-                'date_of_birth': date_of_birth,
-                'date_of_death': date_of_death,
-            }
+    text = request.GET.get('q', '').strip()
+    names = {
+        field: request.GET.get(field, '').strip()
+        for field in SEARCH_NAME_FIELDS
+    }
+    date_of_birth = request.GET.get('date_of_birth', '').strip()
+    date_of_death = request.GET.get('date_of_death', '').strip()
+    year_ranges = {
+        arg: parse_year(request.GET.get(param))
+        for param, arg in SEARCH_YEAR_PARAMS.items()
+    }
+
+    if (text or any(names.values()) or date_of_birth or date_of_death or
+            any(year_ranges.values())):
+        search_results = True
+        if date_of_birth:
+            memorials_list = memorials_list.filter(date_of_birth=date_of_birth)
+        if date_of_death:
+            memorials_list = memorials_list.filter(date_of_death=date_of_death)
+
+        # Rank through the search index, then only load the current page.
+        # One extra id tells us whether the results were cut off.
+        memorials_list = search.search_memorials(
+            memorials_list, text=text, fields=names,
+            limit=search.MAX_RESULTS + 1, **year_ranges
+        )
+        truncated = len(memorials_list) > search.MAX_RESULTS
+        memorials_list = memorials_list[:search.MAX_RESULTS]
+
+        search_query = {
+            'q': text,
+            **names,
+            'date_of_birth': date_of_birth,
+            'date_of_death': date_of_death,
+            **{
+                param: year_ranges[arg] or ''
+                for param, arg in SEARCH_YEAR_PARAMS.items()
+            },
+        }
+        querystring = '&' + urlencode(
+            {key: value for key, value in search_query.items() if value}
+        )
 
     paginator = Paginator(memorials_list, 9)
     page_number = request.GET.get('page')
     memorials = paginator.get_page(page_number)
 
+    if search_results:
+        found = Memorial.objects.in_bulk(memorials.object_list)
+        memorials.object_list = [
+            found[pk] for pk in memorials.object_list if pk in found
+        ]
+
     context = {
         'memorials': memorials,
         'search_query': search_query,
         'search_results': search_results,
+        'truncated': truncated,
+        'max_results': search.MAX_RESULTS,
+        'querystring': querystring,
     }
 
     return render(request, 'browse.html', context)
@@ -1127,15 +1529,17 @@ def browse_memorials(request):
 # Contact View
 # ---------------------------
 
-def contact(request):
+async def contact(request):
     """View for handling contact form submissions."""
     if request.method == 'POST':
         form = ContactForm(request.POST)
-        if form.is_valid():
-            contact_message = form.save()
+        if await sync_to_async(form.is_valid)():
+            contact_message = await sync_to_async(form.save)()
 
             try:
-                send_mail(
+                await aio.offload(
+                    'email',
+                    send_mail,
                     f"New Contact Message: {contact_message.subject}",
                     (
                         f"From: {contact_message.name} "
@@ -1154,5 +1558,4 @@ def contact(request):
     else:
         form = ContactForm()
 
-    return render(request, 'contact.html', {'form': form})
-
+    return await aio.arender(request, 'contact.html', {'form': form})
@@ -82,10 +82,43 @@ WSGI_APPLICATION = 'neverforgotten.wsgi.application'
 # ========================
 # Database Configuration
 # ========================
+# Set when DATABASE_URL points at PgBouncer in transaction pooling mode.
+# PgBouncer then owns the server connections, so Django closes its own
+# after each request by default.
+DATABASE_PGBOUNCER = config('DATABASE_PGBOUNCER', default=False, cast=bool)
+# Serving mode picked in gunicorn.conf.py
+SERVER_MODE = config('SERVER_MODE', default='wsgi').lower()
+# Seconds a thread keeps its database connection between requests; 0
+# opens a new connection for every request. Health checks test a reused
+# connection before a request relies on it.
+#
+# Every serving thread holds its own persistent connection, so the web
+# dyno alone may keep WEB_CONCURRENCY x GUNICORN_THREADS connections open
+# (see gunicorn.conf.py), plus one per Procfile worker and up to
+# --concurrency while send_newsletters runs. Keep that total under the
+# plan's connection limit, or use PgBouncer. Under SERVER_MODE=asgi sync
+# code runs on a fresh thread per request, so kept connections would
+# never be reused (Django ticket #33497); they are closed by default.
+CONN_MAX_AGE = config(
+    'CONN_MAX_AGE',
+    default=0 if DATABASE_PGBOUNCER or SERVER_MODE == 'asgi' else 600,
+    cast=int,
+)
+CONN_HEALTH_CHECKS = config('CONN_HEALTH_CHECKS', default=True, cast=bool)
+
 if 'DATABASE_URL' in os.environ:
     DATABASES = {
-        'default': dj_database_url.parse(os.environ.get('DATABASE_URL'))
+        'default': dj_database_url.parse(
+            os.environ.get('DATABASE_URL'),
+            conn_max_age=CONN_MAX_AGE,
+            conn_health_checks=CONN_HEALTH_CHECKS,
+        )
     }
+    if DATABASE_PGBOUNCER:
+        # Transaction pooling does not keep a server connection across
+        # transactions, which server-side cursors need; QuerySet.iterator()
+        # then fetches each result set in full
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
 else:
     DATABASES = {
         'default': {
@@ -94,6 +127,47 @@ else:
         }
     }
 
+# ========================
+# Cache Configuration
+# ========================
+# locmem is per-process and only suits development; multi-worker
+# deployments should share a file-based or Redis cache.
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('REDIS_URL', default='redis://127.0.0.1:6379'),
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config(
+                'CACHE_LOCATION', default=str(BASE_DIR / '.cache')
+            ),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'neverforgotten',
+        }
+    }
+
+CACHES['default']['KEY_PREFIX'] = 'neverforgotten'
+CACHES['default']['TIMEOUT'] = config(
+    'CACHE_DEFAULT_TIMEOUT', default=300, cast=int
+)
+
+# Rendered memorial page fragments (see memorial.cache)
+MEMORIAL_FRAGMENT_CACHE_TIMEOUT = config(
+    'MEMORIAL_FRAGMENT_CACHE_TIMEOUT', default=3600, cast=int
+)
+
 # ========================
 # Authentication
 # ========================
@@ -167,6 +241,68 @@ CLOUDINARY_STORAGE = {
     'SECURE': True
 }
 
+# Background media uploads (see memorial.media_jobs). When enabled, uploads
+# are staged to MEDIA_UPLOAD_STAGING_DIR and pushed to Cloudinary by
+# `manage.py run_media_worker` (the Procfile's mediaworker process). That
+# process must be scaled up and able to read the staging directory, or
+# queued uploads are never processed.
+MEDIA_UPLOAD_ASYNC = config('MEDIA_UPLOAD_ASYNC', default=False, cast=bool)
+MEDIA_UPLOAD_STAGING_DIR = config(
+    'MEDIA_UPLOAD_STAGING_DIR', default=os.path.join(MEDIA_ROOT, 'staging')
+)
+MEDIA_UPLOAD_MAX_ATTEMPTS = config(
+    'MEDIA_UPLOAD_MAX_ATTEMPTS', default=3, cast=int
+)
+
+# Synchronous gallery uploads run in parallel on a bounded thread pool
+GALLERY_UPLOAD_CONCURRENCY = config(
+    'GALLERY_UPLOAD_CONCURRENCY', default=4, cast=int
+)
+GALLERY_UPLOAD_TIMEOUT = config('GALLERY_UPLOAD_TIMEOUT', default=30, cast=int)
+
+# Uploaded images are re-encoded before upload (see memorial.imaging)
+IMAGE_UPLOAD_MAX_SIZE = config(
+    'IMAGE_UPLOAD_MAX_SIZE', default=20 * 1024 * 1024, cast=int
+)
+IMAGE_MAX_EDGE = config('IMAGE_MAX_EDGE', default=2048, cast=int)
+IMAGE_FORMAT = config('IMAGE_FORMAT', default='WEBP')
+IMAGE_QUALITY = config('IMAGE_QUALITY', default=82, cast=int)
+IMAGE_SPOOL_MAX_SIZE = config(
+    'IMAGE_SPOOL_MAX_SIZE', default=2 * 1024 * 1024, cast=int
+)
+
+# Where memorial media is stored (see memorial.media): 'cloudinary', or
+# 'local' to keep files under MEDIA_LOCAL_ROOT for development and load
+# tests. MEDIA_LOCAL_ACCEL_REDIRECT is an nginx internal location prefix
+# that local files are handed off to instead of being sent by Django.
+MEDIA_BACKEND = config('MEDIA_BACKEND', default='cloudinary')
+MEDIA_LOCAL_ROOT = config(
+    'MEDIA_LOCAL_ROOT', default=os.path.join(MEDIA_ROOT, 'local')
+)
+MEDIA_LOCAL_ACCEL_REDIRECT = config('MEDIA_LOCAL_ACCEL_REDIRECT', default='')
+
+# Cloudinary media of deleted memorials is removed by
+# `manage.py run_media_cleanup` (see memorial.media_cleanup)
+MEDIA_CLEANUP_MAX_ATTEMPTS = config(
+    'MEDIA_CLEANUP_MAX_ATTEMPTS', default=6, cast=int
+)
+# Seconds before the first retry; doubles with each further attempt
+MEDIA_CLEANUP_RETRY_DELAY = config(
+    'MEDIA_CLEANUP_RETRY_DELAY', default=30, cast=int
+)
+# Admin API calls per rate limit window left for the rest of the site
+MEDIA_CLEANUP_API_RESERVE = config(
+    'MEDIA_CLEANUP_API_RESERVE', default=50, cast=int
+)
+
+# Blocking SDK calls from async views run in threads, at most this many
+# at a time per service and worker process (see memorial.aio)
+ASYNC_IO_LIMITS = {
+    'media': config('ASYNC_MEDIA_LIMIT', default=8, cast=int),
+    'stripe': config('ASYNC_STRIPE_LIMIT', default=16, cast=int),
+    'email': config('ASYNC_EMAIL_LIMIT', default=4, cast=int),
+}
+
 
 # ========================
 # Email Configuration
@@ -183,6 +319,8 @@ else:
 
 DEFAULT_FROM_EMAIL = config('EMAIL_HOST_USER')
 SERVER_EMAIL = DEFAULT_FROM_EMAIL
+# Recipient of contact form messages
+CONTACT_EMAIL = config('CONTACT_EMAIL', default=DEFAULT_FROM_EMAIL)
 
 # Site name for emails
 SITE_NAME = "NeverForgotten Memorials"
@@ -191,6 +329,12 @@ SITE_NAME = "NeverForgotten Memorials"
 ACCOUNT_EMAIL_SUBJECT_PREFIX = f"[{SITE_NAME}] "
 ACCOUNT_DEFAULT_HTTP_PROTOCOL = 'https'
 
+# Newsletters are sent by `manage.py send_newsletters` (see
+# newsletter.delivery); failed deliveries are retried on later passes
+NEWSLETTER_MAX_ATTEMPTS = config(
+    'NEWSLETTER_MAX_ATTEMPTS', default=3, cast=int
+)
+
 
 # ========================
 # Payment Configuration
@@ -206,6 +350,13 @@ DOMAIN = config(
     'DOMAIN',
     default='https://neverforgotten-461f6f1b50c5.herokuapp.com'
 )
+# Webhook events are recorded and applied by `manage.py
+# process_stripe_events` (see plans.webhooks); disable to apply them
+# during the webhook request instead.
+STRIPE_EVENTS_ASYNC = config('STRIPE_EVENTS_ASYNC', default=True, cast=bool)
+STRIPE_EVENT_MAX_ATTEMPTS = config(
+    'STRIPE_EVENT_MAX_ATTEMPTS', default=5, cast=int
+)
 
 # ========================
 # Internationalization
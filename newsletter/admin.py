@@ -1,14 +1,23 @@
 from django.contrib import admin
 
 # Register your models here.
+import io
+import time
+
 from django.contrib import admin
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
 from django.urls import reverse
 from django.utils.html import format_html
 from django.shortcuts import redirect
 from django.contrib import messages
 
-from .models import Subscriber, Newsletter
-from .utils import send_newsletter
+from . import bulk, delivery
+from .forms import SubscriberImportForm
+from .models import Subscriber, Newsletter, NewsletterDelivery
+
+# Rejected rows listed after an admin import; the rest are only counted
+MAX_REPORTED_REJECTS = 20
 
 
 @admin.register(Subscriber)
@@ -18,7 +27,8 @@ class SubscriberAdmin(admin.ModelAdmin):
     list_display = ('email', 'first_name', 'subscribed', 'created_at')
     list_filter = ('subscribed', 'created_at')
     search_fields = ('email', 'first_name', 'last_name')
-    actions = ['resubscribe_selected']
+    actions = ['resubscribe_selected', 'export_csv', 'export_jsonl']
+    change_list_template = 'admin/newsletter/subscriber/change_list.html'
 
     def resubscribe_selected(self, request, queryset):
         """
@@ -37,6 +47,109 @@ class SubscriberAdmin(admin.ModelAdmin):
 
     resubscribe_selected.short_description = "Resubscribe selected subscribers"
 
+    def _export(self, queryset, fmt):
+        """Stream the selected subscribers as a file download."""
+        content_type = 'text/csv' if fmt == 'csv' else 'application/jsonl'
+        response = StreamingHttpResponse(
+            bulk.export_rows(queryset, fmt),
+            content_type=f'{content_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="subscribers.{fmt}"'
+        )
+        return response
+
+    def export_csv(self, request, queryset):
+        """Admin action to download selected subscribers as CSV."""
+        return self._export(queryset, 'csv')
+
+    export_csv.short_description = "Export selected subscribers as CSV"
+
+    def export_jsonl(self, request, queryset):
+        """Admin action to download selected subscribers as JSONL."""
+        return self._export(queryset, 'jsonl')
+
+    export_jsonl.short_description = "Export selected subscribers as JSONL"
+
+    def get_urls(self):
+        """Adds the import view to the admin interface."""
+        from django.urls import path
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_subscribers),
+                name='newsletter_subscriber_import'
+            ),
+        ]
+        return custom_urls + urls
+
+    def import_subscribers(self, request):
+        """
+        Custom admin view to import subscribers from an uploaded file.
+
+        Args:
+            request: HttpRequest object
+
+        Returns:
+            The upload form, or a redirect to the subscriber list
+        """
+        form = SubscriberImportForm(
+            request.POST or None, request.FILES or None
+        )
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            fmt = form.cleaned_data['format'] or bulk.detect_format(
+                upload.name
+            )
+            rejects = []
+
+            def reject(line_number, reason):
+                if len(rejects) < MAX_REPORTED_REJECTS:
+                    rejects.append(f"line {line_number}: {reason}")
+
+            stream = io.TextIOWrapper(
+                upload.file, encoding='utf-8-sig', newline=''
+            )
+            start = time.perf_counter()
+            try:
+                result = bulk.import_subscribers(
+                    bulk.read_rows(stream, fmt), on_reject=reject
+                )
+            except UnicodeDecodeError:
+                self.message_user(
+                    request,
+                    'The file is not UTF-8; rows before the error were '
+                    'imported.',
+                    level=messages.ERROR
+                )
+                return redirect('..')
+            elapsed = time.perf_counter() - start
+
+            self.message_user(
+                request,
+                f'Imported {result.upserted} subscribers from '
+                f'{result.processed} rows in {elapsed:.1f}s.',
+                messages.SUCCESS
+            )
+            if result.rejected:
+                self.message_user(
+                    request,
+                    f'Rejected {result.rejected} rows: ' + '; '.join(rejects),
+                    level=messages.WARNING
+                )
+            return redirect('..')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import subscribers',
+            'form': form,
+        }
+        return TemplateResponse(
+            request, 'admin/newsletter/subscriber/import.html', context
+        )
+
 
 @admin.register(Newsletter)
 class NewsletterAdmin(admin.ModelAdmin):
@@ -45,18 +158,19 @@ class NewsletterAdmin(admin.ModelAdmin):
     list_display = (
         'subject',
         'created_at',
-        'is_sent',
+        'status',
         'sent_at',
+        'delivery_summary',
         'send_newsletter_link'
     )
-    list_filter = ('is_sent', 'created_at')
+    list_filter = ('status', 'created_at')
     search_fields = ('subject', 'content')
-    readonly_fields = ('is_sent', 'sent_at')
+    readonly_fields = ('status', 'is_sent', 'sent_at')
     actions = ['send_selected_newsletters']
 
     def send_newsletter_link(self, obj):
         """
-        Custom admin column that displays a 'Send Now' button for unsent
+        Custom admin column that displays a 'Send Now' button for draft
         newsletters.
 
         Args:
@@ -65,16 +179,29 @@ class NewsletterAdmin(admin.ModelAdmin):
         Returns:
             HTML button or status text
         """
-        if not obj.is_sent:
+        if obj.status == Newsletter.STATUS_DRAFT:
             return format_html(
                 '<a class="button" href="{}">Send Now</a>',
                 reverse('admin:send_newsletter', args=[obj.pk])
             )
-        return "Sent"
+        return obj.get_status_display()
 
     send_newsletter_link.short_description = "Actions"
     send_newsletter_link.allow_tags = True
 
+    def delivery_summary(self, obj):
+        """Custom admin column with the newsletter's delivery counts."""
+        if obj.status == Newsletter.STATUS_DRAFT:
+            return "-"
+        counts = delivery.delivery_counts(obj)
+        return ", ".join(
+            f"{counts[status]} {label.lower()}"
+            for status, label in NewsletterDelivery.STATUS_CHOICES
+            if counts.get(status)
+        ) or "-"
+
+    delivery_summary.short_description = "Deliveries"
+
     def get_urls(self):
         """Adds custom URLs to the admin interface."""
         from django.urls import path
@@ -90,7 +217,7 @@ class NewsletterAdmin(admin.ModelAdmin):
 
     def send_newsletter(self, request, object_id):
         """
-        Custom admin view to send a single newsletter.
+        Custom admin view to queue a single newsletter for sending.
 
         Args:
             request: HttpRequest object
@@ -100,49 +227,56 @@ class NewsletterAdmin(admin.ModelAdmin):
             Redirect response
         """
         newsletter = Newsletter.objects.get(pk=object_id)
-        try:
-            send_newsletter(newsletter, request)
-            newsletter.is_sent = True
-            newsletter.save()
+        if delivery.queue_newsletter(newsletter):
             self.message_user(
                 request,
-                f'Newsletter "{newsletter.subject}" sent successfully!',
+                f'Newsletter "{newsletter.subject}" queued for sending.',
                 messages.SUCCESS
             )
-        except Exception as e:
+        else:
             self.message_user(
                 request,
-                f'Error: {str(e)}',
-                level=messages.ERROR
+                f'Newsletter "{newsletter.subject}" has already been sent.',
+                level=messages.WARNING
             )
         return redirect('..')
 
     def send_selected_newsletters(self, request, queryset):
         """
-        Admin action to send multiple selected newsletters.
+        Admin action to queue multiple selected newsletters for sending.
 
         Args:
             request: HttpRequest object
             queryset: QuerySet of selected Newsletter objects
         """
-        sent_count = 0
-        for newsletter in queryset.filter(is_sent=False):
-            try:
-                send_newsletter(newsletter, request)
-                newsletter.is_sent = True
-                newsletter.save()
-                sent_count += 1
-            except Exception as e:
-                self.message_user(
-                    request,
-                    f'Failed to send {newsletter.subject}: {e}',
-                    level=messages.ERROR
-                )
-
+        queued_count = sum(
+            delivery.queue_newsletter(newsletter)
+            for newsletter in queryset
+        )
         self.message_user(
             request,
-            f'Sent {sent_count} out of {queryset.count()} newsletters',
+            f'Queued {queued_count} out of {queryset.count()} newsletters',
             messages.SUCCESS
         )
 
     send_selected_newsletters.short_description = "Send selected newsletters"
+
+
+@admin.register(NewsletterDelivery)
+class NewsletterDeliveryAdmin(admin.ModelAdmin):
+    """Read-only view of per-subscriber newsletter deliveries."""
+
+    list_display = (
+        'newsletter', 'subscriber', 'status', 'attempts', 'sent_at'
+    )
+    list_filter = ('status', 'newsletter')
+    search_fields = ('subscriber__email',)
+    list_select_related = ('newsletter', 'subscriber')
+    raw_id_fields = ('newsletter', 'subscriber')
+    readonly_fields = (
+        'newsletter', 'subscriber', 'status', 'attempts', 'error', 'sent_at',
+        'updated_at',
+    )
+
+    def has_add_permission(self, request):
+        return False
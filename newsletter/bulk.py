@@ -0,0 +1,239 @@
+"""
+Streaming import and export of newsletter subscribers.
+
+Files are CSV with a header row or JSONL with one object per line, and
+carry the columns in ``FIELDS``; only ``email`` is required. Both
+directions work a row at a time: imports validate and upsert one batch
+at a time, exports read the table with a server-side iterator, so memory
+use does not grow with the size of the list.
+
+Imports upsert on email with ``bulk_create(update_conflicts=True)``.
+Existing subscribers only have the columns present in the file
+overwritten, so importing a list without a ``subscribed`` column never
+resubscribes anyone who opted out.
+"""
+
+import csv
+import io
+import json
+import os
+
+from django.contrib.auth.base_user import BaseUserManager
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+from .models import Subscriber
+
+FORMATS = ('csv', 'jsonl')
+FIELDS = ('email', 'first_name', 'last_name', 'subscribed', 'created_at')
+# Columns an import may set; created_at is export only
+IMPORT_FIELDS = ('email', 'first_name', 'last_name', 'subscribed')
+
+_TRUE = {'1', 'true', 'yes', 'y', 't'}
+_FALSE = {'0', 'false', 'no', 'n', 'f', ''}
+
+
+def detect_format(filename, default='csv'):
+    """Guess the file format from its extension."""
+    ext = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if ext in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if ext == 'csv':
+        return 'csv'
+    return default
+
+
+# ---------------------------
+# Reading
+# ---------------------------
+
+def read_rows(stream, fmt):
+    """
+    Yield (line_number, row) pairs from a text stream.
+
+    Rows that cannot be parsed are yielded with a ValueError in place of
+    the row dict.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Drop columns past the header row
+            row.pop(None, None)
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, ValueError(f"Invalid JSON: {e}")
+                continue
+            if not isinstance(row, dict):
+                row = ValueError("Expected a JSON object")
+            yield line_number, row
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise ValidationError(f"Invalid subscribed value: {value}")
+
+
+def clean_row(row):
+    """
+    Validate one imported row.
+
+    Returns:
+        dict: The row's importable columns with cleaned values
+
+    Raises:
+        ValidationError: If the row is not a valid subscriber
+    """
+    cleaned = {}
+    for field in IMPORT_FIELDS:
+        if field not in row:
+            continue
+        value = row[field]
+        if field == 'subscribed':
+            cleaned[field] = _parse_bool(value)
+            continue
+        value = str(value or '').strip()
+        max_length = Subscriber._meta.get_field(field).max_length
+        if len(value) > max_length:
+            raise ValidationError(
+                f"{field} is longer than {max_length} characters"
+            )
+        cleaned[field] = value
+
+    if not cleaned.get('email'):
+        raise ValidationError("Missing email")
+    cleaned['email'] = BaseUserManager.normalize_email(cleaned['email'])
+    validate_email(cleaned['email'])
+    return cleaned
+
+
+# ---------------------------
+# Importing
+# ---------------------------
+
+class ImportResult:
+    """Running totals for an import."""
+
+    def __init__(self):
+        self.processed = 0
+        self.upserted = 0
+        self.rejected = 0
+
+
+def _upsert(batch):
+    """
+    Upsert a batch of cleaned rows keyed on email.
+
+    Rows are grouped by the columns they provide so each group only
+    overwrites those columns on existing subscribers.
+    """
+    groups = {}
+    for row in batch.values():
+        groups.setdefault(frozenset(row), []).append(Subscriber(**row))
+
+    for columns, subscribers in groups.items():
+        update_fields = [
+            field for field in IMPORT_FIELDS
+            if field in columns and field != 'email'
+        ] + ['updated_at']
+        Subscriber.objects.bulk_create(
+            subscribers,
+            update_conflicts=True,
+            unique_fields=['email'],
+            update_fields=update_fields,
+        )
+    return len(batch)
+
+
+def import_subscribers(rows, batch_size=1000, on_reject=None):
+    """
+    Validate and upsert subscribers from ``read_rows`` output.
+
+    Args:
+        rows: Iterable of (line_number, row) pairs
+        batch_size: Rows validated and written per query
+        on_reject: Called with (line_number, reason) for each rejected row
+
+    Returns:
+        ImportResult: Totals for the import
+    """
+    result = ImportResult()
+    # Keyed on email so repeats within a batch collapse to the last row
+    batch = {}
+
+    for line_number, row in rows:
+        result.processed += 1
+        try:
+            if isinstance(row, Exception):
+                raise row
+            cleaned = clean_row(row)
+        except (ValidationError, ValueError) as e:
+            result.rejected += 1
+            if on_reject:
+                reason = '; '.join(getattr(e, 'messages', [str(e)]))
+                on_reject(line_number, reason)
+            continue
+
+        batch[cleaned['email']] = cleaned
+        if len(batch) >= batch_size:
+            result.upserted += _upsert(batch)
+            batch = {}
+
+    if batch:
+        result.upserted += _upsert(batch)
+    return result
+
+
+# ---------------------------
+# Exporting
+# ---------------------------
+
+def _format_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def export_rows(queryset, fmt, chunk_size=2000):
+    """
+    Yield the subscribers in ``queryset`` as lines of CSV or JSONL.
+
+    The CSV header is the first line.
+    """
+    values = queryset.order_by('pk').values_list(*FIELDS).iterator(
+        chunk_size=chunk_size
+    )
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def line(row):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(row)
+            return buffer.getvalue()
+
+        yield line(FIELDS)
+        for row in values:
+            yield line([_format_value(value) for value in row])
+    elif fmt == 'jsonl':
+        for row in values:
+            yield json.dumps({
+                field: _format_value(value)
+                for field, value in zip(FIELDS, row)
+            }) + '\n'
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
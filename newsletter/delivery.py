@@ -0,0 +1,307 @@
+"""
+Newsletter delivery engine.
+
+Sending a newsletter from the admin only marks it queued; the mail goes
+out from ``manage.py send_newsletters`` so a large list never holds up a
+request. The worker first records a ``NewsletterDelivery`` row for every
+active subscriber, streaming the subscriber table in chunks, then claims
+pending deliveries in batches and sends each batch over a single
+connection to the mail server. Batches run side by side on a thread pool.
+
+Every delivery's outcome is recorded, so a send that crashes picks up
+where it stopped: only the batches that were in flight can be mailed a
+second time. Failed deliveries are retried on the worker's next pass
+until NEWSLETTER_MAX_ATTEMPTS is reached.
+"""
+
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection as db_connection
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Newsletter, NewsletterDelivery, Subscriber
+from .rendering import CompiledNewsletter
+
+logger = logging.getLogger(__name__)
+
+# Deliveries claimed this long ago without an outcome are assumed to
+# belong to a dead worker and are handed out again
+STALE_AFTER = timedelta(minutes=10)
+
+
+# ---------------------------
+# Queueing
+# ---------------------------
+
+def queue_newsletter(newsletter):
+    """
+    Mark a draft newsletter for delivery by the worker.
+
+    Returns:
+        bool: False if the newsletter was already queued or sent
+    """
+    return bool(Newsletter.objects.filter(
+        pk=newsletter.pk, status=Newsletter.STATUS_DRAFT
+    ).update(status=Newsletter.STATUS_QUEUED))
+
+
+def add_recipients(newsletter, chunk_size=2000):
+    """
+    Record a pending delivery for every active subscriber.
+
+    Subscribers are streamed from the database ``chunk_size`` at a time.
+    Existing deliveries are left alone, so this is safe to run again after
+    a crash.
+
+    Returns:
+        int: Number of subscribers considered
+    """
+    subscriber_ids = Subscriber.objects.filter(
+        subscribed=True
+    ).order_by('pk').values_list('pk', flat=True)
+
+    total = 0
+    chunk = []
+    for subscriber_id in subscriber_ids.iterator(chunk_size=chunk_size):
+        chunk.append(NewsletterDelivery(
+            newsletter_id=newsletter.pk, subscriber_id=subscriber_id
+        ))
+        if len(chunk) >= chunk_size:
+            total += _insert_deliveries(chunk)
+            chunk = []
+    if chunk:
+        total += _insert_deliveries(chunk)
+    return total
+
+
+def _insert_deliveries(deliveries):
+    NewsletterDelivery.objects.bulk_create(deliveries, ignore_conflicts=True)
+    return len(deliveries)
+
+
+# ---------------------------
+# Claiming
+# ---------------------------
+
+def requeue_stale_deliveries(newsletter, older_than=STALE_AFTER):
+    """Return deliveries stuck in a dead worker's batch to the queue."""
+    return NewsletterDelivery.objects.filter(
+        newsletter=newsletter,
+        status=NewsletterDelivery.STATUS_SENDING,
+        updated_at__lt=timezone.now() - older_than,
+    ).update(status=NewsletterDelivery.STATUS_PENDING, batch=None)
+
+
+def claim_batch(newsletter, limit, claimed_before=None):
+    """
+    Claim up to ``limit`` pending deliveries as one batch.
+
+    The batch is claimed with a single conditional UPDATE that tags the
+    rows with a fresh batch id, so concurrent workers never share a
+    delivery. Deliveries last touched after ``claimed_before`` are left
+    for a later pass.
+
+    Returns:
+        list: The claimed deliveries with their subscribers
+    """
+    candidates = NewsletterDelivery.objects.filter(
+        newsletter=newsletter, status=NewsletterDelivery.STATUS_PENDING
+    )
+    if claimed_before is not None:
+        candidates = candidates.filter(updated_at__lt=claimed_before)
+    candidates = list(
+        candidates.order_by('pk').values_list('pk', flat=True)[:limit]
+    )
+    if not candidates:
+        return []
+
+    batch = uuid.uuid4()
+    NewsletterDelivery.objects.filter(
+        pk__in=candidates, status=NewsletterDelivery.STATUS_PENDING
+    ).update(
+        status=NewsletterDelivery.STATUS_SENDING,
+        batch=batch,
+        attempts=F('attempts') + 1,
+        updated_at=timezone.now(),
+    )
+    return list(
+        NewsletterDelivery.objects.filter(batch=batch)
+        .select_related('subscriber')
+        .order_by('pk')
+    )
+
+
+# ---------------------------
+# Sending
+# ---------------------------
+
+def build_message(compiled, subscriber, connection=None):
+    """
+    Build a subscriber's email from a compiled newsletter.
+
+    The message carries RFC 8058 one-click List-Unsubscribe headers.
+    """
+    values = compiled.values(subscriber)
+    text_content, html_content = compiled.render(subscriber, values)
+    msg = EmailMultiAlternatives(
+        subject=compiled.subject,
+        body=text_content,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[subscriber.email],
+        connection=connection,
+        headers={
+            'List-Unsubscribe': f"<{values['unsubscribe_url']}>",
+            'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click',
+        },
+    )
+    msg.attach_alternative(html_content, "text/html")
+    return msg
+
+
+def send_batch(compiled, deliveries):
+    """
+    Send a claimed batch over one mail server connection and record the
+    outcome of each delivery.
+
+    Args:
+        compiled: CompiledNewsletter shared by every batch of the send
+        deliveries: Deliveries claimed with ``claim_batch``
+
+    Returns:
+        dict: Counts of deliveries per resulting status
+    """
+    sent, skipped, failed = [], [], []
+    connection = get_connection()
+    pending = iter(deliveries)
+    try:
+        connection.open()
+        for delivery in pending:
+            if not delivery.subscriber.subscribed:
+                skipped.append(delivery.pk)
+                continue
+            try:
+                connection.send_messages([
+                    build_message(compiled, delivery.subscriber, connection)
+                ])
+            except Exception as e:
+                logger.error(
+                    f"Failed to send to {delivery.subscriber.email}: {e}"
+                )
+                failed.append((delivery, str(e)))
+                # The connection may be broken; carry on over a fresh one
+                connection.close()
+                connection.open()
+            else:
+                sent.append(delivery.pk)
+    except Exception as e:
+        # The mail server is unreachable; the rest of the batch is retried
+        logger.error(
+            f"Newsletter {compiled.newsletter.pk} batch aborted: {e}"
+        )
+        failed.extend((delivery, str(e)) for delivery in pending)
+    finally:
+        connection.close()
+
+    now = timezone.now()
+    NewsletterDelivery.objects.filter(pk__in=sent).update(
+        status=NewsletterDelivery.STATUS_SENT, error='', sent_at=now,
+        updated_at=now,
+    )
+    NewsletterDelivery.objects.filter(pk__in=skipped).update(
+        status=NewsletterDelivery.STATUS_SKIPPED, updated_at=now,
+    )
+    retrying = 0
+    for delivery, error in failed:
+        if delivery.attempts < settings.NEWSLETTER_MAX_ATTEMPTS:
+            status = NewsletterDelivery.STATUS_PENDING
+            retrying += 1
+        else:
+            status = NewsletterDelivery.STATUS_FAILED
+        NewsletterDelivery.objects.filter(pk=delivery.pk).update(
+            status=status, error=error, updated_at=now,
+        )
+
+    return {
+        NewsletterDelivery.STATUS_SENT: len(sent),
+        NewsletterDelivery.STATUS_SKIPPED: len(skipped),
+        NewsletterDelivery.STATUS_FAILED: len(failed) - retrying,
+        NewsletterDelivery.STATUS_PENDING: retrying,
+    }
+
+
+def _send_batch_threaded(compiled, deliveries):
+    # Each pool thread gets its own connection; close it when done
+    try:
+        return send_batch(compiled, deliveries)
+    finally:
+        db_connection.close()
+
+
+def delivery_counts(newsletter):
+    """Return {status: count} for a newsletter's deliveries."""
+    return dict(
+        newsletter.deliveries.order_by()
+        .values_list('status').annotate(count=Count('pk'))
+    )
+
+
+def deliver(newsletter, batch_size=100, concurrency=4, chunk_size=2000):
+    """
+    Make one pass over a queued newsletter's pending deliveries.
+
+    The newsletter is marked sent once no delivery is waiting to be sent
+    or retried.
+
+    Returns:
+        dict: Counts of deliveries per resulting status for this pass
+    """
+    if newsletter.status == Newsletter.STATUS_QUEUED:
+        add_recipients(newsletter, chunk_size)
+        Newsletter.objects.filter(
+            pk=newsletter.pk, status=Newsletter.STATUS_QUEUED
+        ).update(status=Newsletter.STATUS_SENDING)
+        newsletter.status = Newsletter.STATUS_SENDING
+    requeue_stale_deliveries(newsletter)
+    # Deliveries that fail during this pass wait for the next one
+    started = timezone.now()
+    # The templates are rendered once; batches only fill in the
+    # per-subscriber fields
+    compiled = CompiledNewsletter(newsletter)
+
+    # A single worker sends batches inline on the main connection
+    pool = ThreadPoolExecutor(concurrency) if concurrency > 1 else None
+    run = pool.map if pool else map
+    send = _send_batch_threaded if pool else send_batch
+
+    totals = {}
+    try:
+        while True:
+            batches = []
+            for _ in range(max(concurrency, 1)):
+                batch = claim_batch(newsletter, batch_size, started)
+                if not batch:
+                    break
+                batches.append(batch)
+            if not batches:
+                break
+            for counts in run(send, [compiled] * len(batches), batches):
+                for status, count in counts.items():
+                    totals[status] = totals.get(status, 0) + count
+    finally:
+        if pool:
+            pool.shutdown()
+
+    counts = delivery_counts(newsletter)
+    if not (counts.get(NewsletterDelivery.STATUS_PENDING)
+            or counts.get(NewsletterDelivery.STATUS_SENDING)):
+        newsletter.status = Newsletter.STATUS_SENT
+        newsletter.is_sent = True
+        newsletter.sent_at = timezone.now()
+        newsletter.save(update_fields=['status', 'is_sent', 'sent_at'])
+    return totals
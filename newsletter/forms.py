@@ -1,5 +1,7 @@
 # newsletter/forms.py
 from django import forms
+
+from .bulk import FORMATS
 from .models import Subscriber
 
 
@@ -18,3 +20,14 @@ class SubscribeForm(forms.ModelForm):
                 attrs={'placeholder': 'Last name (optional)'}
             ),
         }
+
+
+class SubscriberImportForm(forms.Form):
+    """Upload form for the subscriber import admin view."""
+
+    file = forms.FileField(help_text="CSV with a header row, or JSONL.")
+    format = forms.ChoiceField(
+        choices=[('', 'From file extension')]
+        + [(fmt, fmt.upper()) for fmt in FORMATS],
+        required=False,
+    )
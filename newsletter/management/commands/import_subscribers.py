@@ -0,0 +1,69 @@
+import io
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from newsletter import bulk
+
+
+class Command(BaseCommand):
+    """Import newsletter subscribers from a CSV or JSONL file."""
+
+    help = (
+        "Stream subscribers from a CSV or JSONL file ('-' for stdin) and "
+        "upsert them by email in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument(
+            '--format',
+            choices=bulk.FORMATS,
+            help="File format; guessed from the extension by default.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Number of rows written per query.",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or bulk.detect_format(path)
+
+        def reject(line_number, reason):
+            self.stderr.write(f"Line {line_number}: {reason}")
+
+        start = time.perf_counter()
+        try:
+            if path == '-':
+                stream = io.TextIOWrapper(
+                    sys.stdin.buffer, encoding='utf-8-sig', newline=''
+                )
+            else:
+                stream = open(path, encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f"Cannot open {path}: {e}")
+
+        with stream:
+            try:
+                result = bulk.import_subscribers(
+                    bulk.read_rows(stream, fmt),
+                    batch_size=options['batch_size'],
+                    on_reject=reject,
+                )
+            except UnicodeDecodeError as e:
+                raise CommandError(
+                    f"{path} is not UTF-8 ({e}); rows before the error "
+                    f"were imported."
+                )
+        elapsed = time.perf_counter() - start
+
+        rate = result.processed / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.upserted} subscribers, rejected "
+            f"{result.rejected}, from {result.processed} rows in "
+            f"{elapsed:.1f}s ({rate:,.0f} rows/s)."
+        ))
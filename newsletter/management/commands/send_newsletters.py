@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from newsletter import delivery
+from newsletter.models import Newsletter, NewsletterDelivery
+
+
+class Command(BaseCommand):
+    """Deliver queued newsletters to their subscribers."""
+
+    help = "Send queued newsletters in batches with a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help="Number of batches sent in parallel.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help="Number of emails sent over each mail server connection.",
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help="Number of subscribers read per query.",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=30.0,
+            help="Seconds to wait between passes over queued newsletters.",
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Make one pass over the queued newsletters and exit.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            newsletters = list(Newsletter.objects.filter(status__in=[
+                Newsletter.STATUS_QUEUED, Newsletter.STATUS_SENDING
+            ]).order_by('pk'))
+
+            for newsletter in newsletters:
+                counts = delivery.deliver(
+                    newsletter,
+                    batch_size=options['batch_size'],
+                    concurrency=options['concurrency'],
+                    chunk_size=options['chunk_size'],
+                )
+                self.stdout.write(
+                    f'"{newsletter.subject}": '
+                    f"{counts.get(NewsletterDelivery.STATUS_SENT, 0)} sent, "
+                    f"{counts.get(NewsletterDelivery.STATUS_FAILED, 0)} "
+                    f"failed, "
+                    f"{counts.get(NewsletterDelivery.STATUS_PENDING, 0)} "
+                    f"scheduled for retry."
+                )
+                if newsletter.status == Newsletter.STATUS_SENT:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Finished sending "{newsletter.subject}".'
+                    ))
+
+            if options['once']:
+                break
+            # Drop broken or expired connections while idle
+            close_old_connections()
+            time.sleep(options['poll_interval'])
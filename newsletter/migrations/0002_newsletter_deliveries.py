@@ -0,0 +1,49 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def mark_sent_newsletters(apps, schema_editor):
+    Newsletter = apps.get_model('newsletter', 'Newsletter')
+    Newsletter.objects.filter(is_sent=True).update(status='sent')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('queued', 'Queued'), ('sending', 'Sending'), ('sent', 'Sent')], default='draft', max_length=10),
+        ),
+        migrations.RunPython(
+            mark_sent_newsletters, migrations.RunPython.noop
+        ),
+        migrations.CreateModel(
+            name='NewsletterDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('skipped', 'Skipped'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('batch', models.UUIDField(blank=True, editable=False, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='newsletter.newsletter')),
+                ('subscriber', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='newsletter.subscriber')),
+            ],
+            options={
+                'verbose_name_plural': 'newsletter deliveries',
+                'indexes': [models.Index(fields=['newsletter', 'status'], name='delivery_status_idx'), models.Index(fields=['batch'], name='delivery_batch_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='newsletterdelivery',
+            constraint=models.UniqueConstraint(fields=('newsletter', 'subscriber'), name='unique_newsletter_delivery'),
+        ),
+    ]
@@ -15,11 +15,80 @@ class Subscriber(models.Model):
 
 
 class Newsletter(models.Model):
+    STATUS_DRAFT = 'draft'
+    STATUS_QUEUED = 'queued'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_CHOICES = [
+        (STATUS_DRAFT, 'Draft'),
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+    ]
+
     subject = models.CharField(max_length=200)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     sent_at = models.DateTimeField(null=True, blank=True)
     is_sent = models.BooleanField(default=False)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_DRAFT
+    )
 
     def __str__(self):
         return self.subject
+
+
+class NewsletterDelivery(models.Model):
+    """
+    Delivery of a newsletter to one subscriber.
+    Created for every active subscriber when a send starts and worked
+    through by ``manage.py send_newsletters`` (see newsletter.delivery).
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_SKIPPED = 'skipped'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_SKIPPED, 'Skipped'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    newsletter = models.ForeignKey(
+        Newsletter, on_delete=models.CASCADE, related_name='deliveries'
+    )
+    subscriber = models.ForeignKey(
+        Subscriber, on_delete=models.CASCADE, related_name='deliveries'
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    # Identifies the worker batch that claimed this delivery
+    batch = models.UUIDField(null=True, blank=True, editable=False)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'newsletter deliveries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['newsletter', 'subscriber'],
+                name='unique_newsletter_delivery',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['newsletter', 'status'],
+                name='delivery_status_idx',
+            ),
+            models.Index(fields=['batch'], name='delivery_batch_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.newsletter} to {self.subscriber}"
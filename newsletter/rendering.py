@@ -0,0 +1,128 @@
+"""
+Compile-once rendering of newsletter emails.
+
+Only a handful of fields differ between the copies of a newsletter, so
+the templates go through the template engine once per send with marker
+strings standing in for those fields. ``CompiledNewsletter`` splits the
+output around the markers; each recipient's copy is then a join of the
+static pieces and that recipient's values, escaped for the HTML part.
+
+Templates may print the personalised fields (``greeting_name``,
+``unsubscribe_url`` and the ``subscriber`` name and email) but not branch
+on them, since every branch sees the marker.
+"""
+
+import re
+import uuid
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.html import escape
+
+from .tokens import make_unsubscribe_token
+
+TEXT_TEMPLATE = 'newsletter/emails/newsletter_template.txt'
+HTML_TEMPLATE = 'newsletter/emails/newsletter_template.html'
+
+# Fallback greeting for subscribers who did not give a first name
+DEFAULT_GREETING = 'Subscriber'
+
+FIELDS = ('greeting_name', 'first_name', 'last_name', 'email',
+          'unsubscribe_url')
+
+
+class CompiledNewsletter:
+    """A newsletter rendered once, ready for per-recipient substitution."""
+
+    def __init__(self, newsletter):
+        self.newsletter = newsletter
+        # A fresh token per compile keeps markers out of reach of content
+        token = uuid.uuid4().hex
+        markers = {
+            field: f'{token}:{field}:'
+            for field in FIELDS + ('unsubscribe_token',)
+        }
+        self._fields = {marker: field for field, marker in markers.items()}
+        self._pattern = re.compile(
+            '|'.join(re.escape(marker) for marker in markers.values())
+        )
+
+        # Unsubscribe links differ only in the signed token
+        url = reverse(
+            'newsletter:unsubscribe', args=[markers['unsubscribe_token']]
+        )
+        self._unsubscribe_url = self._split(
+            f"{settings.DOMAIN.rstrip('/')}{url}"
+        )
+
+        context = {
+            'newsletter': newsletter,
+            'subscriber': SimpleNamespace(
+                first_name=markers['first_name'],
+                last_name=markers['last_name'],
+                email=markers['email'],
+            ),
+            'greeting_name': markers['greeting_name'],
+            'unsubscribe_url': markers['unsubscribe_url'],
+        }
+        self.subject = newsletter.subject
+        self._text = self._split(render_to_string(TEXT_TEMPLATE, context))
+        self._html = self._split(render_to_string(HTML_TEMPLATE, context))
+
+    def _split(self, rendered):
+        """Split rendered output into literal strings and field names."""
+        parts = []
+        position = 0
+        for match in self._pattern.finditer(rendered):
+            parts.append(rendered[position:match.start()])
+            parts.append(self._fields[match.group()])
+            position = match.end()
+        parts.append(rendered[position:])
+        return parts
+
+    @staticmethod
+    def _join(parts, values):
+        # Literals sit at even indexes, field names at odd ones
+        return ''.join(
+            values[part] if i % 2 else part for i, part in enumerate(parts)
+        )
+
+    def values(self, subscriber):
+        """Return the personalised field values for a subscriber."""
+        values = {
+            'greeting_name': subscriber.first_name or DEFAULT_GREETING,
+            'first_name': subscriber.first_name,
+            'last_name': subscriber.last_name,
+            'email': subscriber.email,
+        }
+        values['unsubscribe_url'] = self._join(self._unsubscribe_url, {
+            'unsubscribe_token': make_unsubscribe_token(subscriber.pk)
+        })
+        return values
+
+    def unsubscribe_url(self, subscriber):
+        """Absolute unsubscribe link for a subscriber."""
+        return self.values(subscriber)['unsubscribe_url']
+
+    def render(self, subscriber, values=None):
+        """
+        Render a subscriber's copy of the newsletter.
+
+        Args:
+            subscriber: Subscriber to render for
+            values: The subscriber's ``values()``, if already computed
+
+        Returns:
+            tuple: (text_content, html_content)
+        """
+        if values is None:
+            values = self.values(subscriber)
+        html_values = {
+            field: escape(value) for field, value in values.items()
+        }
+        return (
+            self._join(self._text, values),
+            self._join(self._html, html_values),
+        )
@@ -0,0 +1,409 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.template.loader import render_to_string
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import delivery
+from .models import Newsletter, NewsletterDelivery, Subscriber
+from .rendering import HTML_TEMPLATE, CompiledNewsletter
+from .tokens import make_unsubscribe_token, read_unsubscribe_token
+
+
+class CountingBackend(EmailBackend):
+    """Locmem backend that counts connections and can refuse addresses."""
+
+    opened = 0
+    refused = set()
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if set(message.to) & self.refused:
+                raise ConnectionError(f"{message.to[0]} refused")
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='newsletter.tests.CountingBackend',
+    NEWSLETTER_MAX_ATTEMPTS=2,
+)
+class NewsletterDeliveryTests(TestCase):
+    """Newsletters are queued from the admin and sent by the worker."""
+
+    def setUp(self):
+        CountingBackend.opened = 0
+        CountingBackend.refused = set()
+        Subscriber.objects.bulk_create([
+            Subscriber(email=f'reader{i}@example.com', first_name=f'R{i}')
+            for i in range(5)
+        ])
+        Subscriber.objects.create(email='gone@example.com', subscribed=False)
+        self.newsletter = Newsletter.objects.create(
+            subject='Autumn news', content='<p>Hello</p>'
+        )
+
+    def send(self, batch_size=2):
+        call_command(
+            'send_newsletters', once=True, concurrency=1,
+            batch_size=batch_size, stdout=StringIO()
+        )
+        self.newsletter.refresh_from_db()
+
+    def test_admin_only_queues_the_newsletter(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:send_newsletter', args=[self.newsletter.pk])
+        )
+        self.assertEqual(response.status_code, 302)
+        self.newsletter.refresh_from_db()
+        self.assertEqual(self.newsletter.status, Newsletter.STATUS_QUEUED)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_worker_sends_one_email_per_active_subscriber(self):
+        delivery.queue_newsletter(self.newsletter)
+        self.send()
+
+        self.assertEqual(
+            sorted(m.to[0] for m in mail.outbox),
+            [f'reader{i}@example.com' for i in range(5)]
+        )
+        message = mail.outbox[0]
+        subscriber = Subscriber.objects.get(email=message.to[0])
+        url = reverse(
+            'newsletter:unsubscribe',
+            args=[make_unsubscribe_token(subscriber.pk)]
+        )
+        self.assertIn(url, message.body)
+        self.assertEqual(
+            message.extra_headers['List-Unsubscribe'],
+            f'<{settings.DOMAIN}{url}>'
+        )
+        self.assertEqual(
+            message.extra_headers['List-Unsubscribe-Post'],
+            'List-Unsubscribe=One-Click'
+        )
+        # One connection per batch of two
+        self.assertEqual(CountingBackend.opened, 3)
+        self.assertEqual(self.newsletter.status, Newsletter.STATUS_SENT)
+        self.assertTrue(self.newsletter.is_sent)
+        self.assertEqual(
+            delivery.delivery_counts(self.newsletter),
+            {NewsletterDelivery.STATUS_SENT: 5}
+        )
+
+    def test_drafts_are_not_sent(self):
+        self.send()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(self.newsletter.status, Newsletter.STATUS_DRAFT)
+
+    def test_interrupted_send_resumes_without_resending(self):
+        delivery.queue_newsletter(self.newsletter)
+        self.newsletter.refresh_from_db()
+        delivery.add_recipients(self.newsletter)
+        Newsletter.objects.filter(pk=self.newsletter.pk).update(
+            status=Newsletter.STATUS_SENDING
+        )
+        NewsletterDelivery.objects.filter(subscriber__email__in=[
+            'reader0@example.com', 'reader1@example.com'
+        ]).update(status=NewsletterDelivery.STATUS_SENT)
+
+        self.send()
+
+        self.assertEqual(
+            sorted(m.to[0] for m in mail.outbox),
+            [f'reader{i}@example.com' for i in range(2, 5)]
+        )
+        self.assertEqual(self.newsletter.status, Newsletter.STATUS_SENT)
+
+    def test_unsubscribed_during_send_is_skipped(self):
+        delivery.queue_newsletter(self.newsletter)
+        self.newsletter.refresh_from_db()
+        delivery.add_recipients(self.newsletter)
+        Subscriber.objects.filter(email='reader3@example.com').update(
+            subscribed=False
+        )
+        self.send()
+
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(
+            NewsletterDelivery.objects.get(
+                subscriber__email='reader3@example.com'
+            ).status,
+            NewsletterDelivery.STATUS_SKIPPED
+        )
+
+    def test_failed_deliveries_are_retried_then_given_up(self):
+        CountingBackend.refused = {'reader2@example.com'}
+        delivery.queue_newsletter(self.newsletter)
+        self.send()
+
+        refused = NewsletterDelivery.objects.get(
+            subscriber__email='reader2@example.com'
+        )
+        self.assertEqual(refused.status, NewsletterDelivery.STATUS_PENDING)
+        self.assertIn('refused', refused.error)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(self.newsletter.status, Newsletter.STATUS_SENDING)
+
+        self.send()
+        refused.refresh_from_db()
+        self.assertEqual(refused.status, NewsletterDelivery.STATUS_FAILED)
+        self.assertEqual(refused.attempts, 2)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(self.newsletter.status, Newsletter.STATUS_SENT)
+
+
+@override_settings(DOMAIN='https://example.com')
+class CompiledNewsletterTests(SimpleTestCase):
+    """Compiled copies match a full render of the templates."""
+
+    def setUp(self):
+        self.newsletter = Newsletter(
+            subject='Autumn news', content='<p>Hello &amp; welcome</p>'
+        )
+        self.compiled = CompiledNewsletter(self.newsletter)
+
+    def test_html_matches_full_render(self):
+        subscriber = Subscriber(pk=7, email='zoe+news@example.com',
+                                first_name='Zoë <b>&</b>')
+        url = 'https://example.com' + reverse(
+            'newsletter:unsubscribe', args=[make_unsubscribe_token(7)]
+        )
+        expected = render_to_string(HTML_TEMPLATE, {
+            'newsletter': self.newsletter,
+            'subscriber': subscriber,
+            'greeting_name': subscriber.first_name,
+            'unsubscribe_url': url,
+        })
+        text, html = self.compiled.render(subscriber)
+        self.assertEqual(html, expected)
+        self.assertIn('Hello Zoë <b>&</b>,', text)
+        self.assertIn(url, text)
+        self.assertEqual(self.compiled.unsubscribe_url(subscriber), url)
+
+    def test_blank_first_name_gets_default_greeting(self):
+        text, html = self.compiled.render(
+            Subscriber(pk=1, email='a@example.com')
+        )
+        self.assertIn('Hello Subscriber,', text)
+        self.assertIn('Hello Subscriber,', html)
+
+
+class SubscriberImportExportTests(TestCase):
+    """Subscribers stream in and out of CSV and JSONL files."""
+
+    def setUp(self):
+        Subscriber.objects.create(
+            email='kept@example.com', first_name='Old', subscribed=False
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def import_file(self, path):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_subscribers', path, batch_size=2, stdout=out, stderr=err
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_upserts_and_reports_rejects(self):
+        path = self.write_file('list.csv', (
+            'email,first_name,last_name\n'
+            'new1@Example.COM,Ann,Lee\n'
+            'not-an-email,Bad,Row\n'
+            'kept@example.com,New,Name\n'
+            'new2@example.com,Bo,\n'
+            'new2@example.com,Bob,\n'
+        ))
+        out, err = self.import_file(path)
+
+        self.assertIn('Imported 3 subscribers, rejected 1', out)
+        self.assertIn('Line 3: Enter a valid email address.', err)
+        self.assertTrue(Subscriber.objects.filter(
+            email='new1@example.com', first_name='Ann', subscribed=True
+        ).exists())
+        self.assertEqual(
+            Subscriber.objects.get(email='new2@example.com').first_name, 'Bob'
+        )
+        kept = Subscriber.objects.get(email='kept@example.com')
+        self.assertEqual(kept.first_name, 'New')
+        # No subscribed column: opted-out subscribers stay opted out
+        self.assertFalse(kept.subscribed)
+
+    def test_jsonl_import(self):
+        path = self.write_file('list.jsonl', '\n'.join([
+            json.dumps({'email': 'kept@example.com', 'subscribed': 'yes'}),
+            '{broken',
+            json.dumps({'email': 'x@example.com', 'subscribed': False}),
+        ]))
+        out, err = self.import_file(path)
+
+        self.assertIn('rejected 1', out)
+        self.assertIn('Line 2: Invalid JSON', err)
+        kept = Subscriber.objects.get(email='kept@example.com')
+        self.assertTrue(kept.subscribed)
+        self.assertEqual(kept.first_name, 'Old')
+        self.assertFalse(
+            Subscriber.objects.get(email='x@example.com').subscribed
+        )
+
+    def test_export_round_trips_through_import(self):
+        Subscriber.objects.create(email='b@example.com', first_name='Bé, Jr')
+        path = os.path.join(self.tmpdir.name, 'out.csv')
+        call_command('export_subscribers', path, stderr=StringIO())
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(
+            lines[0], 'email,first_name,last_name,subscribed,created_at'
+        )
+        self.assertEqual(len(lines), 3)
+
+        Subscriber.objects.all().delete()
+        self.import_file(path)
+        self.assertEqual(
+            Subscriber.objects.get(email='b@example.com').first_name, 'Bé, Jr'
+        )
+        self.assertFalse(
+            Subscriber.objects.get(email='kept@example.com').subscribed
+        )
+
+    def test_export_jsonl_to_stdout(self):
+        out = StringIO()
+        call_command(
+            'export_subscribers', format='jsonl', subscribed_only=True,
+            stdout=out, stderr=StringIO()
+        )
+        self.assertEqual(out.getvalue(), '')
+
+        Subscriber.objects.filter(email='kept@example.com').update(
+            subscribed=True
+        )
+        out = StringIO()
+        call_command(
+            'export_subscribers', format='jsonl', stdout=out,
+            stderr=StringIO()
+        )
+        row = json.loads(out.getvalue())
+        self.assertEqual(row['email'], 'kept@example.com')
+        self.assertIs(row['subscribed'], True)
+
+    def test_admin_import_and_export(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile(
+            'list.csv', b'email,first_name\nadmin1@example.com,Al\nbad,X\n'
+        )
+        response = self.client.post(
+            reverse('admin:newsletter_subscriber_import'),
+            {'file': upload, 'format': ''},
+            follow=True
+        )
+        self.assertContains(response, 'Imported 1 subscribers')
+        self.assertContains(response, 'Rejected 1 rows: line 3')
+        self.assertTrue(
+            Subscriber.objects.filter(email='admin1@example.com').exists()
+        )
+
+        response = self.client.post(
+            reverse('admin:newsletter_subscriber_changelist'),
+            {
+                'action': 'export_csv',
+                '_selected_action': list(
+                    Subscriber.objects.values_list('pk', flat=True)
+                ),
+            }
+        )
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('admin1@example.com,Al,', content)
+        self.assertIn('kept@example.com,Old,', content)
+
+
+class UnsubscribeTests(TestCase):
+    """Signed links unsubscribe with a single UPDATE."""
+
+    def setUp(self):
+        self.subscriber = Subscriber.objects.create(email='a@example.com')
+        self.url = reverse(
+            'newsletter:unsubscribe',
+            args=[make_unsubscribe_token(self.subscriber.pk)]
+        )
+
+    def test_token_round_trip(self):
+        token = make_unsubscribe_token(12345)
+        self.assertEqual(read_unsubscribe_token(token), 12345)
+        with self.assertRaises(signing.BadSignature):
+            read_unsubscribe_token(make_unsubscribe_token(1)[:-1] + 'x')
+
+    def test_one_click_unsubscribe_is_a_single_update(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                self.url, {'List-Unsubscribe': 'One-Click'}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.subscriber.refresh_from_db()
+        self.assertFalse(self.subscriber.subscribed)
+
+    def test_confirmation_page_then_unsubscribe(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Yes, Unsubscribe')
+        response = self.client.post(self.url)
+        self.assertRedirects(response, reverse('memorials:index'))
+        self.subscriber.refresh_from_db()
+        self.assertFalse(self.subscriber.subscribed)
+
+    def test_forged_token_is_rejected(self):
+        url = reverse('newsletter:unsubscribe', args=[
+            f'{signing.b62_encode(self.subscriber.pk)}:forged'
+        ])
+        response = self.client.post(url)
+        self.assertRedirects(response, reverse('memorials:index'))
+        self.subscriber.refresh_from_db()
+        self.assertTrue(self.subscriber.subscribed)
+
+    def test_links_with_the_email_still_work(self):
+        url = reverse('newsletter:unsubscribe', args=['a@example.com'])
+        response = self.client.get(url)
+        self.assertContains(response, 'a@example.com')
+        self.client.post(url)
+        self.subscriber.refresh_from_db()
+        self.assertFalse(self.subscriber.subscribed)
+
+    def test_links_with_the_email_need_a_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        url = reverse('newsletter:unsubscribe', args=['a@example.com'])
+        self.assertEqual(client.post(url).status_code, 403)
+        self.subscriber.refresh_from_db()
+        self.assertTrue(self.subscriber.subscribed)
+
+        client.get(url)
+        token = client.cookies['csrftoken'].value
+        response = client.post(url, {'csrfmiddlewaretoken': token})
+        self.assertRedirects(response, reverse('memorials:index'))
+        self.subscriber.refresh_from_db()
+        self.assertFalse(self.subscriber.subscribed)
+
+        # Signed links still accept one-click POSTs without a token
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(self.url, {'List-Unsubscribe': 'One-Click'})
+        self.assertEqual(response.status_code, 200)
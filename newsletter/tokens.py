@@ -0,0 +1,32 @@
+"""
+Signed unsubscribe tokens.
+
+A token is the subscriber id in base 62 followed by an HMAC signature
+(``django.core.signing``), so unsubscribe links can be verified without
+a database lookup and cannot be forged for other subscribers. Tokens do
+not expire: an unsubscribe link has to keep working for as long as the
+email carrying it is around.
+"""
+
+from django.core import signing
+
+SALT = 'newsletter.unsubscribe'
+
+
+def make_unsubscribe_token(subscriber_id):
+    """Return the unsubscribe token for a subscriber id."""
+    return signing.Signer(salt=SALT).sign(signing.b62_encode(subscriber_id))
+
+
+def read_unsubscribe_token(token):
+    """
+    Return the subscriber id signed into a token.
+
+    Raises:
+        signing.BadSignature: If the token was not issued by this site
+    """
+    value = signing.Signer(salt=SALT).unsign(token)
+    try:
+        return signing.b62_decode(value)
+    except ValueError:
+        raise signing.BadSignature("Malformed unsubscribe token")
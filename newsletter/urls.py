@@ -6,5 +6,5 @@ app_name = 'newsletter'
 
 urlpatterns = [
     path('subscribe/', views.subscribe, name='subscribe'),
-    path('unsubscribe/<str:email>/', views.unsubscribe, name='unsubscribe'),
+    path('unsubscribe/<str:token>/', views.unsubscribe, name='unsubscribe'),
 ]
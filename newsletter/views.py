@@ -1,10 +1,17 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
 
 from .models import Subscriber
 from .forms import SubscribeForm
+from .tokens import read_unsubscribe_token
 from .utils import send_welcome_email
 
 
@@ -70,33 +77,65 @@ def subscribe(request):
         return redirect('memorials:index')
 
 
+def _unsubscribe(request, subscribers, email=None):
+    """Confirm on GET and unsubscribe ``subscribers`` on POST."""
+    if request.method == 'POST':
+        subscribers.filter(subscribed=True).update(
+            subscribed=False, updated_at=timezone.now()
+        )
+        if request.POST.get('List-Unsubscribe') == 'One-Click':
+            # One-click clients do not follow redirects
+            return HttpResponse('Unsubscribed.', content_type='text/plain')
+        messages.success(
+            request,
+            'You have been unsubscribed from our newsletter.'
+        )
+        return redirect('memorials:index')
+
+    # Show confirmation page for GET requests
+    return render(
+        request,
+        'newsletter/unsubscribe_confirm.html',
+        {'email': email}
+    )
+
+
+@csrf_protect
+def _unsubscribe_email(request, email):
+    # Anyone can build a link holding an address, so a POST must come
+    # from the confirmation page rather than another site
+    return _unsubscribe(
+        request, Subscriber.objects.filter(email=email), email
+    )
+
+
+@csrf_exempt
 @require_http_methods(["GET", "POST"])
-def unsubscribe(request, email):
+def unsubscribe(request, token):
     """
     Handle newsletter unsubscription requests.
 
     GET: Shows confirmation page
-    POST: Processes unsubscription
+    POST: Processes unsubscription, including RFC 8058 one-click POSTs
+    sent by mail clients from the List-Unsubscribe header
+
+    The signed token identifies the subscriber, so unsubscribing is a
+    single UPDATE with no lookup beforehand. CSRF protection is off for
+    signed tokens because mail clients post without a CSRF token; the
+    signature already ties the request to the subscriber's own email.
+    Links holding a raw address keep CSRF protection.
     """
     try:
-        subscriber = Subscriber.objects.get(email=email)
-
-        if request.method == 'POST':
-            subscriber.subscribed = False
-            subscriber.save()
-            messages.success(
-                request,
-                'You have been unsubscribed from our newsletter.'
-            )
+        subscriber_id = read_unsubscribe_token(token)
+    except signing.BadSignature:
+        # Links in emails sent before signed tokens carry the raw address
+        try:
+            validate_email(token)
+        except ValidationError:
+            messages.error(request, 'This unsubscribe link is invalid.')
             return redirect('memorials:index')
+        return _unsubscribe_email(request, token)
 
-        # Show confirmation page for GET requests
-        return render(
-            request,
-            'newsletter/unsubscribe_confirm.html',
-            {'email': email}
-        )
-
-    except Subscriber.DoesNotExist:
-        messages.error(request, 'This email is not subscribed.')
-        return redirect('memorials:index')
+    return _unsubscribe(
+        request, Subscriber.objects.filter(pk=subscriber_id)
+    )
@@ -1,6 +1,7 @@
 # plans/admin.py
 from django.contrib import admin
-from .models import Plan
+from . import webhooks
+from .models import Plan, StripeEvent
 
 
 @admin.register(Plan)
@@ -82,6 +83,30 @@ class PlanAdmin(admin.ModelAdmin):
     deactivate_plans.short_description = "Deactivate selected plans"
 
 
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    """Admin configuration for the Stripe webhook event ledger"""
+
+    list_display = [
+        'event_id', 'type', 'status', 'attempts', 'created', 'processed_at'
+    ]
+    list_filter = ['status', 'type']
+    search_fields = ['event_id']
+    readonly_fields = [
+        'event_id', 'type', 'payload', 'attempts', 'error', 'created',
+        'received_at', 'processed_at', 'updated_at'
+    ]
+    ordering = ['-created']
+    actions = ['replay_events']
+
+    def replay_events(self, request, queryset):
+        """Admin action to queue events to be applied again"""
+        queued = webhooks.replay_events(queryset)
+        self.message_user(request, f'{queued} events queued for replay.')
+
+    replay_events.short_description = "Replay selected events"
+
+
 # Custom admin site header and title
 admin.site.site_header = 'NeverForgotten Admin'
 admin.site.site_title = 'NeverForgotten Administration'
@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from plans import webhooks
+from plans.models import StripeEvent
+
+
+class Command(BaseCommand):
+    """Apply Stripe webhook events recorded in the StripeEvent ledger."""
+
+    help = (
+        "Process recorded Stripe webhook events in the order Stripe "
+        "created them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help="Number of events claimed per poll.",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help="Seconds to wait when the queue is empty.",
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Drain the queue and exit instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+
+        while True:
+            requeued = webhooks.requeue_stale_events()
+            if requeued:
+                self.stdout.write(f"Requeued {requeued} stale events.")
+
+            claimed = webhooks.claim_events(options['batch_size'])
+            if not claimed:
+                if options['once']:
+                    break
+                # Drop broken or expired connections while idle
+                close_old_connections()
+                time.sleep(options['poll_interval'])
+                continue
+
+            # Events are applied one at a time so they land in order
+            retry = False
+            for pk in claimed:
+                event = webhooks.process_event(pk)
+                if event.status == StripeEvent.STATUS_FAILED:
+                    failed += 1
+                    self.stderr.write(
+                        f"Event {event.event_id} ({event.type}) failed: "
+                        f"{event.error}"
+                    )
+                elif event.status == StripeEvent.STATUS_PENDING:
+                    retry = True
+                else:
+                    processed += 1
+            self.stdout.write(f"Processed {processed} events...")
+
+            if retry:
+                # Give whatever failed a moment before it is claimed again
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} events, {failed} failed."
+        ))
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from plans import webhooks
+from plans.models import StripeEvent
+
+
+class Command(BaseCommand):
+    """Queue recorded Stripe events to be applied again."""
+
+    help = (
+        "Replay Stripe webhook events from the ledger: the given event ids, "
+        "or every failed event with --failed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'event_ids',
+            nargs='*',
+            help="Stripe event ids (evt_...) to replay.",
+        )
+        parser.add_argument(
+            '--failed',
+            action='store_true',
+            help="Replay every event that has failed.",
+        )
+        parser.add_argument(
+            '--type',
+            help="Only replay events of this type.",
+        )
+        parser.add_argument(
+            '--process',
+            action='store_true',
+            help="Apply the replayed events now instead of leaving them "
+                 "to the worker.",
+        )
+
+    def handle(self, *args, **options):
+        if not options['event_ids'] and not options['failed']:
+            raise CommandError("Give event ids or --failed.")
+
+        events = StripeEvent.objects.all()
+        if options['event_ids']:
+            events = events.filter(event_id__in=options['event_ids'])
+            missing = set(options['event_ids']) - set(
+                events.values_list('event_id', flat=True)
+            )
+            if missing:
+                raise CommandError(
+                    f"Unknown events: {', '.join(sorted(missing))}"
+                )
+        if options['failed']:
+            events = events.filter(status=StripeEvent.STATUS_FAILED)
+        if options['type']:
+            events = events.filter(type=options['type'])
+
+        pks = list(
+            events.order_by('created', 'pk').values_list('pk', flat=True)
+        )
+        queued = webhooks.replay_events(StripeEvent.objects.filter(pk__in=pks))
+        self.stdout.write(f"Queued {queued} events for replay.")
+
+        if options['process']:
+            for pk in pks:
+                if webhooks.claim_event(pk):
+                    event = webhooks.process_event(pk)
+                    self.stdout.write(
+                        f"{event.event_id} ({event.type}): {event.status}"
+                    )
+
+        self.stdout.write(self.style.SUCCESS("Replay complete."))
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 # Plans app models
 # This module defines the Plan model which represents different subscription
@@ -39,3 +40,49 @@ class Plan(models.Model):
     def __str__(self):
         cycle = self.billing_cycle if self.billing_cycle else "Free"
         return f"{self.name} ({cycle})"
+
+
+class StripeEvent(models.Model):
+    """
+    Ledger of Stripe webhook deliveries, keyed on Stripe's event id.
+    The webhook only verifies and records events; they are applied by
+    ``manage.py process_stripe_events`` (see plans.webhooks).
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_PROCESSED = 'processed'
+    STATUS_IGNORED = 'ignored'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_PROCESSED, 'Processed'),
+        (STATUS_IGNORED, 'Ignored'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    # When Stripe created the event; events are applied in this order
+    created = models.DateTimeField()
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(
+                fields=['status', 'created'],
+                name='stripeevent_status_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} ({self.event_id})"
@@ -1,3 +1,250 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import time
+from datetime import date
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from memorial.models import GalleryImage, Memorial
+from .models import Plan, StripeEvent
+
+WEBHOOK_SECRET = 'whsec_test'
+
+
+def signed_headers(payload, secret=WEBHOOK_SECRET):
+    """Return a Stripe-Signature header for ``payload``."""
+    timestamp = int(time.time())
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return {'HTTP_STRIPE_SIGNATURE': f"t={timestamp},v1={signature}"}
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET,
+                   STRIPE_EVENTS_ASYNC=True, STRIPE_EVENT_MAX_ATTEMPTS=2)
+class StripeWebhookTests(TestCase):
+    """Webhook deliveries are recorded once and applied by the worker."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com')
+        self.free = Plan.objects.create(name='free', price=0)
+        self.premium = Plan.objects.create(
+            name='premium', price=5, allow_gallery=True
+        )
+        self.memorial = Memorial.objects.create(
+            user=self.user,
+            plan=self.free,
+            first_name='Ada',
+            last_name='Lovelace',
+            date_of_birth=date(1815, 12, 10),
+        )
+        self.url = reverse('plans:stripe_webhook')
+
+    def deliver(self, event_id, event_type, obj):
+        payload = json.dumps({
+            'id': event_id,
+            'object': 'event',
+            'type': event_type,
+            'created': int(time.time()),
+            'data': {'object': obj},
+        })
+        return self.client.post(
+            self.url, payload, content_type='application/json',
+            **signed_headers(payload)
+        )
+
+    def checkout_completed(self, event_id='evt_checkout'):
+        return self.deliver(event_id, 'checkout.session.completed', {
+            'subscription': 'sub_123',
+            'metadata': {
+                'user_id': str(self.user.pk),
+                'plan_id': str(self.premium.pk),
+                'memorial_id': str(self.memorial.pk),
+            },
+        })
+
+    def run_worker(self):
+        call_command(
+            'process_stripe_events', once=True,
+            stdout=StringIO(), stderr=StringIO()
+        )
+
+    def test_event_is_recorded_then_applied_by_worker(self):
+        response = self.checkout_completed()
+        self.assertEqual(response.status_code, 200)
+        event = StripeEvent.objects.get()
+        self.assertEqual(event.status, StripeEvent.STATUS_PENDING)
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.plan, self.free)
+
+        self.run_worker()
+        event.refresh_from_db()
+        self.assertEqual(event.status, StripeEvent.STATUS_PROCESSED)
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.plan, self.premium)
+        self.assertEqual(self.memorial.stripe_subscription_id, 'sub_123')
+
+    def test_duplicate_deliveries_are_no_ops(self):
+        self.checkout_completed()
+        self.run_worker()
+        Memorial.objects.filter(pk=self.memorial.pk).update(plan=self.free)
+
+        response = self.checkout_completed()
+        self.assertEqual(response.status_code, 200)
+        self.run_worker()
+
+        event = StripeEvent.objects.get()
+        self.assertEqual(event.attempts, 1)
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.plan, self.free)
+
+    def test_invalid_signature_is_rejected(self):
+        payload = json.dumps({'id': 'evt_forged', 'type': 'x'})
+        response = self.client.post(
+            self.url, payload, content_type='application/json',
+            **signed_headers(payload, secret='whsec_wrong')
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_unhandled_events_are_ignored(self):
+        self.deliver('evt_other', 'invoice.paid', {})
+        self.run_worker()
+        self.assertEqual(
+            StripeEvent.objects.get().status, StripeEvent.STATUS_IGNORED
+        )
+
+    @override_settings(STRIPE_EVENTS_ASYNC=False)
+    def test_inline_processing(self):
+        self.checkout_completed()
+        self.assertEqual(
+            StripeEvent.objects.get().status, StripeEvent.STATUS_PROCESSED
+        )
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.plan, self.premium)
+
+    def test_subscription_cancel_reverts_plan_and_trims_gallery(self):
+        Memorial.objects.filter(pk=self.memorial.pk).update(
+            plan=self.premium,
+            stripe_subscription_id='sub_123',
+            audio_public_id='memorials/1/audio/song',
+        )
+        images = [
+            GalleryImage.objects.create(
+                memorial=self.memorial, image=f'memorials/1/gallery/{i}'
+            )
+            for i in range(8)
+        ]
+        self.deliver(
+            'evt_cancel', 'customer.subscription.deleted', {'id': 'sub_123'}
+        )
+        with mock.patch('memorial.media.delete') as delete:
+            self.run_worker()
+
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.plan, self.free)
+        self.assertIsNone(self.memorial.stripe_subscription_id)
+        self.assertIsNone(self.memorial.audio_public_id)
+        self.assertEqual(
+            list(self.memorial.gallery.values_list('pk', flat=True)),
+            [images[0].pk, images[1].pk]
+        )
+        delete.assert_any_call('memorials/1/audio/song', resource_type='video')
+        self.assertEqual(delete.call_count, 7)
+
+    def test_failed_events_can_be_replayed(self):
+        self.memorial.delete()
+        self.checkout_completed()
+        self.run_worker()
+        self.run_worker()
+        event = StripeEvent.objects.get()
+        self.assertEqual(event.status, StripeEvent.STATUS_FAILED)
+        self.assertEqual(event.attempts, 2)
+
+        self.memorial = Memorial.objects.create(
+            user=self.user, plan=self.free, first_name='Ada',
+            last_name='Lovelace', date_of_birth=date(1815, 12, 10),
+        )
+        payload = dict(event.payload)
+        payload['data']['object']['metadata']['memorial_id'] = str(
+            self.memorial.pk
+        )
+        StripeEvent.objects.filter(pk=event.pk).update(payload=payload)
+
+        out = StringIO()
+        call_command('replay_stripe_events', failed=True, process=True,
+                     stdout=out)
+        self.assertIn('evt_checkout (checkout.session.completed): processed',
+                      out.getvalue())
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.plan, self.premium)
+
+
+class CheckoutViewTests(TestCase):
+    """Checkout views reach Stripe without blocking the event loop."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com')
+        self.free = Plan.objects.create(name='free', price=0)
+        self.premium = Plan.objects.create(
+            name='premium', price=5, stripe_price_id='price_premium'
+        )
+        self.memorial = Memorial.objects.create(
+            user=self.user,
+            plan=self.premium,
+            first_name='Ada',
+            last_name='Lovelace',
+            date_of_birth=date(1815, 12, 10),
+        )
+        self.client.force_login(self.user)
+
+    def checkout_url(self, plan):
+        return reverse('plans:create_checkout_session',
+                       args=[plan.pk, self.memorial.pk])
+
+    def test_free_plan_is_applied_without_stripe(self):
+        with mock.patch('stripe.checkout.Session.create') as create:
+            response = self.client.get(self.checkout_url(self.free))
+        create.assert_not_called()
+        self.assertRedirects(
+            response,
+            reverse('memorials:memorial_edit', args=[self.memorial.pk]),
+            fetch_redirect_response=False,
+        )
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.plan, self.free)
+
+    def test_paid_plan_redirects_to_stripe(self):
+        session = mock.Mock(url='https://checkout.stripe.com/c/pay/cs_1')
+        with mock.patch('stripe.checkout.Session.create',
+                        return_value=session) as create:
+            response = self.client.get(self.checkout_url(self.premium))
+        self.assertRedirects(response, session.url,
+                             fetch_redirect_response=False)
+        kwargs = create.call_args.kwargs
+        self.assertEqual(kwargs['mode'], 'subscription')
+        self.assertEqual(kwargs['customer_email'], 'owner@example.com')
+        self.assertEqual(kwargs['metadata']['memorial_id'], self.memorial.pk)
+
+    def test_anonymous_checkout_redirects_to_login(self):
+        self.client.logout()
+        response = self.client.get(self.checkout_url(self.premium))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('?next=', response['Location'])
+
+    def test_payment_success_finds_memorial_from_stripe_session(self):
+        session = mock.Mock(metadata={'memorial_id': str(self.memorial.pk)})
+        with mock.patch('stripe.checkout.Session.retrieve',
+                        return_value=session) as retrieve:
+            response = self.client.get(
+                reverse('plans:payment_success'), {'session_id': 'cs_1'}
+            )
+        retrieve.assert_called_once_with('cs_1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['memorial'], self.memorial)
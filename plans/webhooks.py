@@ -0,0 +1,229 @@
+"""
+Stripe webhook event processing.
+
+The webhook view verifies each delivery's signature, records it in the
+``StripeEvent`` ledger and returns 200 straight away, so slow work never
+pushes a response past Stripe's timeout. Events are keyed on Stripe's
+event id: a redelivered event is not recorded twice and is never applied
+twice.
+
+``manage.py process_stripe_events`` claims pending events in the order
+Stripe created them and dispatches each to its handler in ``HANDLERS``.
+Failed events are retried up to STRIPE_EVENT_MAX_ATTEMPTS times and can be
+run again with ``manage.py replay_stripe_events``.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from memorial import media
+from memorial.models import Memorial
+from .models import Plan, StripeEvent
+
+logger = logging.getLogger(__name__)
+
+# Processing events untouched for this long are assumed to belong to a dead
+# worker and are handed out again
+STALE_AFTER = timedelta(minutes=10)
+
+# Most recent gallery images removed when a subscription ends
+CANCELLED_GALLERY_IMAGES = 6
+
+
+# ---------------------------
+# Handlers
+# ---------------------------
+
+def handle_checkout_completed(event):
+    """Assign the purchased plan to the memorial in the session metadata."""
+    session = event['data']['object']
+    metadata = session.get('metadata') or {}
+
+    user = User.objects.get(id=metadata.get('user_id'))
+    plan = Plan.objects.get(id=metadata.get('plan_id'))
+    memorial = Memorial.objects.get(id=metadata.get('memorial_id'), user=user)
+
+    memorial.plan = plan
+    update_fields = ['plan']
+    subscription_id = session.get('subscription')
+    if subscription_id:
+        memorial.stripe_subscription_id = subscription_id
+        update_fields.append('stripe_subscription_id')
+    memorial.save(update_fields=update_fields)
+
+    logger.info(
+        f"Assigned plan '{plan.name}' to Memorial ID {memorial.id} "
+        f"with subscription {subscription_id}"
+    )
+
+
+def _gallery_public_id(image):
+    if image.image and getattr(image.image, 'public_id', None):
+        return image.image.public_id
+    return None
+
+
+def handle_subscription_deleted(event):
+    """Move memorials on a cancelled subscription back to the free plan."""
+    subscription_id = event['data']['object'].get('id')
+    free_plan = Plan.objects.get(name__iexact='free')
+
+    for memorial in Memorial.objects.filter(
+            stripe_subscription_id=subscription_id):
+        if memorial.audio_public_id:
+            media.delete(memorial.audio_public_id, resource_type='video')
+        memorial.plan = free_plan
+        memorial.stripe_subscription_id = None
+        memorial.audio_file = None
+        memorial.audio_public_id = None
+        memorial.save(update_fields=[
+            'plan', 'stripe_subscription_id', 'audio_file',
+            'audio_public_id',
+        ])
+
+        gallery_images = list(
+            memorial.gallery.order_by('-id')[:CANCELLED_GALLERY_IMAGES]
+        )
+        for image in gallery_images:
+            public_id = _gallery_public_id(image)
+            if public_id:
+                media.delete(public_id)
+            image.delete()
+
+        logger.info(
+            f"Set Memorial {memorial.id} to Free plan and removed "
+            f"{len(gallery_images)} gallery images on subscription cancel"
+        )
+
+
+HANDLERS = {
+    'checkout.session.completed': handle_checkout_completed,
+    'customer.subscription.deleted': handle_subscription_deleted,
+}
+
+
+# ---------------------------
+# Ledger
+# ---------------------------
+
+def record_event(event):
+    """
+    Add a verified Stripe event to the ledger.
+
+    Args:
+        event: The event payload as a dict
+
+    Returns:
+        tuple: (StripeEvent, created); ``created`` is False for a duplicate
+        delivery
+    """
+    created_at = datetime.fromtimestamp(
+        event.get('created') or timezone.now().timestamp(), tz=dt_timezone.utc
+    )
+    try:
+        with transaction.atomic():
+            return StripeEvent.objects.create(
+                event_id=event['id'],
+                type=event['type'],
+                payload=event,
+                created=created_at,
+            ), True
+    except IntegrityError:
+        return StripeEvent.objects.get(event_id=event['id']), False
+
+
+def requeue_stale_events(older_than=STALE_AFTER):
+    """Return events stuck in processing by a dead worker to the queue."""
+    return StripeEvent.objects.filter(
+        status=StripeEvent.STATUS_PROCESSING,
+        updated_at__lt=timezone.now() - older_than,
+    ).update(status=StripeEvent.STATUS_PENDING, updated_at=timezone.now())
+
+
+def claim_events(limit):
+    """
+    Claim up to ``limit`` pending events, oldest first.
+
+    Each claim is a conditional UPDATE, so concurrent workers never process
+    the same event twice.
+
+    Returns:
+        list: Ids of the claimed events
+    """
+    candidates = StripeEvent.objects.filter(
+        status=StripeEvent.STATUS_PENDING
+    ).order_by('created', 'pk').values_list('pk', flat=True)[:limit]
+
+    return [pk for pk in candidates if claim_event(pk)]
+
+
+def claim_event(pk):
+    """Claim one pending event; return False if another worker has it."""
+    return bool(StripeEvent.objects.filter(
+        pk=pk, status=StripeEvent.STATUS_PENDING
+    ).update(
+        status=StripeEvent.STATUS_PROCESSING,
+        attempts=F('attempts') + 1,
+        updated_at=timezone.now(),
+    ))
+
+
+def process_event(pk):
+    """
+    Apply a claimed event and record the outcome.
+
+    Failed events go back to the queue until STRIPE_EVENT_MAX_ATTEMPTS is
+    reached; events without a handler are marked ignored.
+
+    Returns:
+        StripeEvent: The event in its new state
+    """
+    event = StripeEvent.objects.get(pk=pk)
+    fields = ['status', 'error', 'processed_at', 'updated_at']
+    handler = HANDLERS.get(event.type)
+
+    if handler is None:
+        event.status = StripeEvent.STATUS_IGNORED
+        event.processed_at = timezone.now()
+        event.save(update_fields=fields)
+        return event
+
+    try:
+        with transaction.atomic():
+            handler(event.payload)
+    except Exception as e:
+        logger.error(f"Stripe event {event.event_id} failed: {e}")
+        event.error = str(e)
+        if event.attempts < settings.STRIPE_EVENT_MAX_ATTEMPTS:
+            event.status = StripeEvent.STATUS_PENDING
+        else:
+            event.status = StripeEvent.STATUS_FAILED
+        event.save(update_fields=fields)
+        return event
+
+    event.status = StripeEvent.STATUS_PROCESSED
+    event.error = ''
+    event.processed_at = timezone.now()
+    event.save(update_fields=fields)
+    return event
+
+
+def replay_events(queryset):
+    """
+    Queue events to be applied again.
+
+    Returns:
+        int: Number of events queued
+    """
+    return queryset.exclude(status=StripeEvent.STATUS_PROCESSING).update(
+        status=StripeEvent.STATUS_PENDING,
+        attempts=0,
+        error='',
+        updated_at=timezone.now(),
+    )